@@ -0,0 +1,189 @@
+"""
+Asyncio client for the hessra_authz extension
+
+Verifies tokens in bulk over a pool of connections, so that throughput is
+bound by the server rather than by one round trip per token:
+
+    async with HessraClient("host=db dbname=app") as client:
+        allowed = await client.verify_many(
+            [(token, subject, resource), ...]
+        )
+
+        async with client.session(token, subject) as session:
+            allowed = await session.authorized_many(["resource1", "resource2"])
+
+`verify_many` sends up to `batch_size` verifications per round trip through
+`verify_hessra_tokens` and runs the batches concurrently on the pool.
+`verify_pipelined` sends individual `verify_hessra_token` calls in pipeline
+mode, for callers that need one statement per check. `session` checks out
+a connection with a session token set by `hessra_set_session_token`; the
+token is cleared before the connection goes back to the pool. Every method
+rejects revoked tokens.
+
+Requires psycopg 3 with the pool extra (`psycopg[binary,pool]`). Pipeline
+mode needs libpq 14 or later, which the binary package includes.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+# (token, subject, resource)
+VerifyRequest = Tuple[str, str, str]
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class HessraSession:
+    """A pooled connection with a session token set"""
+
+    def __init__(self, conn: psycopg.AsyncConnection):
+        self._conn = conn
+
+    async def authorized(self, resource: str) -> bool:
+        """Whether the session token grants access to a resource"""
+        cur = await self._conn.execute("SELECT hessra_authorized(%s)", (resource,))
+        return (await cur.fetchone())[0]
+
+    async def authorized_many(self, resources: Sequence[str]) -> List[bool]:
+        """hessra_authorized for each resource, in one pipelined round trip"""
+        async with self._conn.pipeline():
+            cursors = [
+                await self._conn.execute("SELECT hessra_authorized(%s)", (resource,))
+                for resource in resources
+            ]
+        return [(await cur.fetchone())[0] for cur in cursors]
+
+
+class HessraClient:
+    """
+    Pool of connections for high-volume token verification
+
+    `settings` are applied with set_config to every new connection, e.g.
+    {"hessra.bulk_workers": "8"}. Other keyword arguments are passed to
+    psycopg_pool.AsyncConnectionPool.
+    """
+
+    def __init__(
+        self,
+        conninfo: str = "",
+        *,
+        settings: Optional[Dict[str, str]] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        min_size: int = 1,
+        max_size: int = 10,
+        **pool_kwargs,
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        self.batch_size = batch_size
+        self._settings = dict(settings or {})
+        self._pool = AsyncConnectionPool(
+            conninfo,
+            min_size=min_size,
+            max_size=max_size,
+            kwargs={"autocommit": True},
+            configure=self._configure,
+            reset=self._reset,
+            open=False,
+            **pool_kwargs,
+        )
+
+    async def open(self) -> None:
+        """Open the pool and wait for its first connections"""
+        await self._pool.open(wait=True)
+
+    async def close(self) -> None:
+        """Close the pool and all its connections"""
+        await self._pool.close()
+
+    async def __aenter__(self) -> "HessraClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _configure(self, conn: psycopg.AsyncConnection) -> None:
+        for name, value in self._settings.items():
+            await conn.execute("SELECT set_config(%s, %s, false)", (name, value))
+
+    async def _reset(self, conn: psycopg.AsyncConnection) -> None:
+        # Never hand one caller's session token to the next
+        await conn.execute("SELECT hessra_clear_session_token()")
+
+    async def verify(self, token: str, subject: str, resource: str) -> bool:
+        """Verify a single token"""
+        async with self._pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT verify_hessra_token(%s, %s, %s)", (token, subject, resource)
+            )
+            return (await cur.fetchone())[0]
+
+    async def verify_many(self, requests: Iterable[VerifyRequest]) -> List[Optional[bool]]:
+        """
+        Verify many tokens, each against its own subject and resource
+
+        Requests are sent in batches of batch_size through
+        verify_hessra_tokens, with the batches spread over the pool. Results
+        are in request order; a request with a None field yields None.
+        """
+        requests = list(requests)
+        batches = [
+            requests[start:start + self.batch_size]
+            for start in range(0, len(requests), self.batch_size)
+        ]
+        results = await asyncio.gather(*(self._verify_batch(batch) for batch in batches))
+        return [result for batch in results for result in batch]
+
+    async def _verify_batch(self, batch: List[VerifyRequest]) -> List[Optional[bool]]:
+        tokens, subjects, resources = (list(column) for column in zip(*batch))
+        async with self._pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT verify_hessra_tokens(%s::text[], %s::text[], %s::text[])",
+                (tokens, subjects, resources),
+            )
+            return (await cur.fetchone())[0]
+
+    async def verify_resources(self, token: str, subject: str,
+                               resources: Sequence[str]) -> List[Optional[bool]]:
+        """Verify one token against many resources with verify_hessra_token_many"""
+        async with self._pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT verify_hessra_token_many(%s, %s, %s::text[])",
+                (token, subject, list(resources)),
+            )
+            return (await cur.fetchone())[0]
+
+    async def verify_pipelined(self, requests: Iterable[VerifyRequest]) -> List[bool]:
+        """
+        Verify many tokens with one verify_hessra_token call each, sent in
+        pipeline mode on a single connection
+
+        Unlike verify_many, every check can use the shared result cache.
+        """
+        requests = list(requests)
+        async with self._pool.connection() as conn:
+            async with conn.pipeline():
+                cursors = [
+                    await conn.execute("SELECT verify_hessra_token(%s, %s, %s)", request)
+                    for request in requests
+                ]
+            return [(await cur.fetchone())[0] for cur in cursors]
+
+    @asynccontextmanager
+    async def session(self, token: str, subject: str) -> AsyncIterator[HessraSession]:
+        """
+        Check out a connection with a session token set
+
+        Raises PermissionError if the token's signatures are invalid or it
+        has been revoked.
+        """
+        async with self._pool.connection() as conn:
+            cur = await conn.execute("SELECT hessra_set_session_token(%s, %s)", (token, subject))
+            if not (await cur.fetchone())[0]:
+                raise PermissionError("invalid Hessra token")
+            yield HessraSession(conn)
@@ -50,5 +50,6 @@ fn main() {
 
     println!("cargo:rerun-if-changed=build.rs");
     println!("cargo:rerun-if-changed=src/lib.rs");
+    println!("cargo:rerun-if-changed=include/hessra_ffi_ext.h");
     println!("cargo:rerun-if-changed={}", source_header.display());
 }
@@ -0,0 +1,368 @@
+#ifndef HESSRA_FFI_EXT_H
+#define HESSRA_FFI_EXT_H
+
+/*
+ * Extension entry points implemented in hessra-ffi-wrapper on top of the
+ * upstream hessra-ffi crate. Result codes are HessraResult values and can be
+ * passed to hessra_error_message().
+ */
+
+#include "hessra_ffi.h"
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+/**
+ * Opaque type representing a public key for the extension entry points
+ */
+typedef struct HessraKey HessraKey;
+
+/**
+ * Opaque type representing a deserialized, signature-checked token
+ */
+typedef struct HessraToken HessraToken;
+
+/**
+ * Opaque type representing a parsed service chain configuration
+ */
+typedef struct HessraServiceChain HessraServiceChain;
+
+/**
+ * Opaque type representing the service chain configurations of several
+ * services
+ */
+typedef struct HessraServiceChainSet HessraServiceChainSet;
+
+/**
+ * Opaque type representing the revocation identifiers of a token
+ */
+typedef struct HessraRevocationIds HessraRevocationIds;
+
+/**
+ * Statistics of the authorizer template cache of this process
+ */
+typedef struct HessraAuthorizerCacheStats {
+  uint64_t entries;
+  uint64_t capacity;
+  uint64_t hits;
+  uint64_t misses;
+} HessraAuthorizerCacheStats;
+
+/**
+ * Verdicts of `hessra_token_authorize_detailed`, all from one authorizer run
+ */
+typedef struct HessraDetailedResult {
+  /**
+   * Result of authorizing subject/resource, as `hessra_token_authorize`
+   * would return it
+   */
+  int authorize_result;
+  /**
+   * Result of the service chain checks alone; SUCCESS if no chain was given
+   */
+  int chain_result;
+  /**
+   * Component of the first chain node whose attestation is missing, or
+   * `component` itself if it is not part of the chain; NULL if none. Must
+   * be released with `hessra_string_free`.
+   */
+  char *failing_component;
+} HessraDetailedResult;
+
+/**
+ * Load a public key from a string (PEM or `<algorithm>/<hex>`)
+ */
+enum HessraResult hessra_key_from_string(const char *key_string,
+                                         struct HessraKey **out_key);
+
+/**
+ * Load a public key from a file (PEM or `<algorithm>/<hex>`)
+ */
+enum HessraResult hessra_key_from_file(const char *file_path,
+                                       struct HessraKey **out_key);
+
+/**
+ * Create an empty keyring, to be filled with `hessra_keyring_add` and
+ * `hessra_keyring_set_default`
+ */
+enum HessraResult hessra_keyring_new(struct HessraKey **out_key);
+
+/**
+ * Add a key (PEM or `<algorithm>/<hex>`) to a keyring for tokens whose
+ * root key id is `key_id`, replacing any key with the same id
+ */
+enum HessraResult hessra_keyring_add(struct HessraKey *keyring,
+                                     uint32_t key_id,
+                                     const char *key_string);
+
+/**
+ * Set the key (PEM or `<algorithm>/<hex>`) a keyring uses for tokens
+ * without a root key id, or with an id that is not in the keyring
+ */
+enum HessraResult hessra_keyring_set_default(struct HessraKey *keyring,
+                                             const char *key_string);
+
+/**
+ * Free a key returned by `hessra_key_from_string`, `hessra_key_from_file`
+ * or `hessra_keyring_new`
+ */
+void hessra_key_free(struct HessraKey *key);
+
+/**
+ * Deserialize a token and verify its signatures against `public_key`
+ */
+enum HessraResult hessra_token_parse(const char *token_string,
+                                     const struct HessraKey *public_key,
+                                     struct HessraToken **out_token);
+
+/**
+ * Deserialize a token given as raw bytes, as stored by the `hessra_token`
+ * type, and verify its signatures against `public_key`
+ */
+enum HessraResult hessra_token_parse_bytes(const uint8_t *bytes,
+                                           uintptr_t len,
+                                           const struct HessraKey *public_key,
+                                           struct HessraToken **out_token);
+
+/**
+ * Decode a base64 token into `out_bytes` and check that it is a
+ * well-formed token. Signatures are not verified. A capacity of
+ * `strlen(token_string)` is always sufficient.
+ */
+enum HessraResult hessra_token_decode(const char *token_string,
+                                      uint8_t *out_bytes,
+                                      uintptr_t capacity,
+                                      uintptr_t *out_len);
+
+/**
+ * Check that raw bytes are a well-formed token. Signatures are not verified.
+ */
+enum HessraResult hessra_token_check_bytes(const uint8_t *bytes, uintptr_t len);
+
+/**
+ * Free a token returned by `hessra_token_parse` or `hessra_token_parse_bytes`
+ */
+void hessra_token_free(struct HessraToken *token);
+
+/**
+ * Get the expiry of a parsed token as unix seconds, or 0 if it has none.
+ * Returns `ERROR_UNKNOWN` if the token's time checks do not reduce to an
+ * expiry, in which case its verdicts may change at any time.
+ */
+enum HessraResult hessra_token_expires_at(const struct HessraToken *token,
+                                          int64_t *out_expiration);
+
+/**
+ * Check that a parsed token grants `subject` access to `resource`
+ */
+enum HessraResult hessra_token_authorize(const struct HessraToken *token,
+                                         const char *subject,
+                                         const char *resource);
+
+/**
+ * Check that a parsed token grants `subject` access to `resource` and
+ * carries attestations from every service node preceding `component`
+ */
+enum HessraResult hessra_token_authorize_service_chain(const struct HessraToken *token,
+                                                       const char *subject,
+                                                       const char *resource,
+                                                       const char *service_nodes_json,
+                                                       const char *component);
+
+/**
+ * Parse a service chain configuration once, so it can be used for any
+ * number of `hessra_token_authorize_with_chain` calls
+ */
+enum HessraResult hessra_service_chain_parse(const char *service_nodes_json,
+                                             struct HessraServiceChain **out_chain);
+
+/**
+ * Free a chain returned by `hessra_service_chain_parse`
+ */
+void hessra_service_chain_free(struct HessraServiceChain *chain);
+
+/**
+ * Load a JSON file mapping service names to service chain configurations,
+ * each in either form accepted by `hessra_service_chain_parse`
+ */
+enum HessraResult hessra_service_chain_set_from_file(const char *file_path,
+                                                     struct HessraServiceChainSet **out_set);
+
+/**
+ * Number of services in a set
+ */
+uintptr_t hessra_service_chain_set_len(const struct HessraServiceChainSet *set);
+
+/**
+ * Name of the service at `index`, owned by the set; NULL if out of range
+ */
+const char *hessra_service_chain_set_name(const struct HessraServiceChainSet *set,
+                                          uintptr_t index);
+
+/**
+ * Chain of the service at `index`, owned by the set; NULL if out of range
+ */
+const struct HessraServiceChain *hessra_service_chain_set_chain(const struct HessraServiceChainSet *set,
+                                                                uintptr_t index);
+
+/**
+ * Free a set returned by `hessra_service_chain_set_from_file`, including
+ * its names and chains
+ */
+void hessra_service_chain_set_free(struct HessraServiceChainSet *set);
+
+/**
+ * Check that a parsed token grants `subject` access to `resource` and
+ * carries attestations from every node of a parsed service chain preceding
+ * `component`
+ */
+enum HessraResult hessra_token_authorize_with_chain(const struct HessraToken *token,
+                                                    const char *subject,
+                                                    const char *resource,
+                                                    const struct HessraServiceChain *chain,
+                                                    const char *component);
+
+/**
+ * Verify `count` tokens, each against its own subject and resource, and
+ * store one result code per token in `out_results`. The work is spread
+ * over at most `threads` worker threads; the call returns once all tokens
+ * have been verified. Every string is given as pointer and length, so the
+ * caller can pass text without NUL-terminated copies.
+ *
+ * Revocation is not checked by the worker threads: for every token that
+ * verified, its revocation ids are stored in `out_ids` for the caller to
+ * check; other entries are set to NULL.
+ */
+enum HessraResult hessra_verify_batch_slices(const char *const *tokens,
+                                             const uintptr_t *token_lens,
+                                             const char *const *subjects,
+                                             const uintptr_t *subject_lens,
+                                             const char *const *resources,
+                                             const uintptr_t *resource_lens,
+                                             uintptr_t count,
+                                             const struct HessraKey *public_key,
+                                             int threads,
+                                             int *out_results,
+                                             struct HessraRevocationIds **out_ids);
+
+/**
+ * Get the revocation identifiers of a token without verifying its
+ * signatures, e.g. to revoke a token signed with a key that is not
+ * configured
+ */
+enum HessraResult hessra_revocation_ids_from_string(const char *token_string,
+                                                    struct HessraRevocationIds **out_ids);
+
+/**
+ * Revocation identifiers of a parsed token, owned by the token
+ */
+const struct HessraRevocationIds *hessra_token_revocation_ids(const struct HessraToken *token);
+
+/**
+ * Number of revocation identifiers, one per block
+ */
+uintptr_t hessra_revocation_ids_len(const struct HessraRevocationIds *ids);
+
+/**
+ * Revocation identifier at `index`, owned by `ids`, and its length in
+ * `out_len`; NULL if out of range
+ */
+const uint8_t *hessra_revocation_ids_get(const struct HessraRevocationIds *ids,
+                                         uintptr_t index,
+                                         uintptr_t *out_len);
+
+/**
+ * Free identifiers returned by `hessra_revocation_ids_from_string`
+ */
+void hessra_revocation_ids_free(struct HessraRevocationIds *ids);
+
+/**
+ * Authorize a parsed token for `subject` and `resource` and, if `chain` is
+ * not NULL, check the attestations of the service nodes preceding
+ * `component`, reporting each verdict separately in `out_result`.
+ * `authorize_result` and `chain_result` both being SUCCESS is equivalent to
+ * `hessra_token_authorize_with_chain` succeeding. Strings are given as
+ * pointer and length.
+ */
+enum HessraResult hessra_token_authorize_detailed(const struct HessraToken *token,
+                                                  const char *subject,
+                                                  uintptr_t subject_len,
+                                                  const char *resource,
+                                                  uintptr_t resource_len,
+                                                  const struct HessraServiceChain *chain,
+                                                  const char *component,
+                                                  uintptr_t component_len,
+                                                  struct HessraDetailedResult *out_result);
+
+/**
+ * Deserialize a base64 token given as `len` bytes at `token_string`, which
+ * need not be NUL-terminated, and verify its signatures against
+ * `public_key`
+ */
+enum HessraResult hessra_token_parse_slice(const char *token_string,
+                                           uintptr_t len,
+                                           const struct HessraKey *public_key,
+                                           struct HessraToken **out_token);
+
+/**
+ * `hessra_token_authorize` with `subject` and `resource` given as pointer
+ * and length
+ */
+enum HessraResult hessra_token_authorize_slice(const struct HessraToken *token,
+                                               const char *subject,
+                                               uintptr_t subject_len,
+                                               const char *resource,
+                                               uintptr_t resource_len);
+
+/**
+ * `hessra_token_authorize_service_chain` with every string given as
+ * pointer and length
+ */
+enum HessraResult hessra_token_authorize_service_chain_slice(const struct HessraToken *token,
+                                                             const char *subject,
+                                                             uintptr_t subject_len,
+                                                             const char *resource,
+                                                             uintptr_t resource_len,
+                                                             const char *service_nodes_json,
+                                                             uintptr_t service_nodes_json_len,
+                                                             const char *component,
+                                                             uintptr_t component_len);
+
+/**
+ * `hessra_token_authorize_with_chain` with `subject`, `resource` and
+ * `component` given as pointer and length
+ */
+enum HessraResult hessra_token_authorize_with_chain_slice(const struct HessraToken *token,
+                                                          const char *subject,
+                                                          uintptr_t subject_len,
+                                                          const char *resource,
+                                                          uintptr_t resource_len,
+                                                          const struct HessraServiceChain *chain,
+                                                          const char *component,
+                                                          uintptr_t component_len);
+
+/**
+ * `hessra_service_chain_parse` with the configuration given as `len` bytes
+ * at `service_nodes_json`, which need not be NUL-terminated
+ */
+enum HessraResult hessra_service_chain_parse_slice(const char *service_nodes_json,
+                                                   uintptr_t len,
+                                                   struct HessraServiceChain **out_chain);
+
+/**
+ * Set the number of authorizer templates kept by this process. 0 disables
+ * the cache; shrinking it evicts the least recently used templates.
+ */
+enum HessraResult hessra_authorizer_cache_configure(uintptr_t capacity);
+
+/**
+ * Get the statistics of the authorizer template cache of this process
+ */
+enum HessraResult hessra_authorizer_cache_stats(struct HessraAuthorizerCacheStats *out_stats);
+
+#ifdef __cplusplus
+}  // extern "C"
+#endif
+
+#endif /* HESSRA_FFI_EXT_H */
@@ -0,0 +1,173 @@
+//! Bulk verification of many tokens on a bounded set of worker threads.
+//!
+//! The worker threads only run pure Rust code (decoding, signature checks
+//! and authorization); they never call back into the host process.
+
+use std::os::raw::{c_char, c_int};
+use std::ptr;
+use std::slice;
+use std::thread;
+
+use biscuit_auth::Biscuit;
+
+use crate::key::HessraKey;
+use crate::result::*;
+use crate::revocation::HessraRevocationIds;
+use crate::token::{base_authorizer, decode_token, run_authorizer, slice_arg};
+
+/// Upper bound on the number of worker threads per call
+const MAX_THREADS: usize = 64;
+
+/// Verify one token; on success also return its revocation ids, which the
+/// caller still has to check
+fn verify_one(
+    token: &str,
+    subject: &str,
+    resource: &str,
+    key: &HessraKey,
+) -> (c_int, Option<HessraRevocationIds>) {
+    let bytes = match decode_token(token) {
+        Some(bytes) => bytes,
+        None => return (ERROR_INVALID_TOKEN, None),
+    };
+    let biscuit = match Biscuit::from(&bytes, |key_id| key.root_key(key_id)) {
+        Ok(biscuit) => biscuit,
+        Err(_) => return (ERROR_INVALID_TOKEN, None),
+    };
+
+    match run_authorizer(base_authorizer(subject, resource), &biscuit) {
+        SUCCESS => (SUCCESS, Some(HessraRevocationIds::of(&biscuit))),
+        result => (result, None),
+    }
+}
+
+/// Verify `count` tokens, each against its own subject and resource, and
+/// store one result code per token in `out_results`. The work is spread
+/// over at most `threads` worker threads; the call returns once all tokens
+/// have been verified. Every string is given as pointer and length, so the
+/// caller can pass text without NUL-terminated copies.
+///
+/// Revocation is not checked by the worker threads: for every token that
+/// verified, its revocation ids are stored in `out_ids` for the caller to
+/// check; other entries are set to NULL.
+///
+/// # Safety
+///
+/// `tokens`, `subjects` and `resources` must point to `count` pointers,
+/// each NULL or pointing to as many readable bytes as the matching entry of
+/// `token_lens`, `subject_lens` or `resource_lens`. `public_key` must be a
+/// valid key, `out_results` must have room for `count` results and
+/// `out_ids` for `count` pointers, each to be released with
+/// `hessra_revocation_ids_free`. A NULL entry yields
+/// `ERROR_INVALID_PARAMETER` for that token.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_verify_batch_slices(
+    tokens: *const *const c_char,
+    token_lens: *const usize,
+    subjects: *const *const c_char,
+    subject_lens: *const usize,
+    resources: *const *const c_char,
+    resource_lens: *const usize,
+    count: usize,
+    public_key: *const HessraKey,
+    threads: c_int,
+    out_results: *mut c_int,
+    out_ids: *mut *mut HessraRevocationIds,
+) -> c_int {
+    if count == 0 {
+        return SUCCESS;
+    }
+    if tokens.is_null()
+        || token_lens.is_null()
+        || subjects.is_null()
+        || subject_lens.is_null()
+        || resources.is_null()
+        || resource_lens.is_null()
+        || public_key.is_null()
+        || out_results.is_null()
+        || out_ids.is_null()
+    {
+        return ERROR_INVALID_PARAMETER;
+    }
+
+    let items: Vec<Option<(&str, &str, &str)>> = (0..count)
+        .map(|i| {
+            Some((
+                slice_arg(*tokens.add(i), *token_lens.add(i))?,
+                slice_arg(*subjects.add(i), *subject_lens.add(i))?,
+                slice_arg(*resources.add(i), *resource_lens.add(i))?,
+            ))
+        })
+        .collect();
+
+    let mut ids: Vec<Option<HessraRevocationIds>> = (0..count).map(|_| None).collect();
+    let result = verify_items(
+        &items,
+        &*public_key,
+        threads,
+        slice::from_raw_parts_mut(out_results, count),
+        &mut ids,
+    );
+
+    // Hand the ids over on the calling thread, after every worker joined
+    for (i, ids) in ids.into_iter().enumerate() {
+        *out_ids.add(i) = match ids {
+            Some(ids) if result == SUCCESS => Box::into_raw(Box::new(ids)),
+            _ => ptr::null_mut(),
+        };
+    }
+
+    result
+}
+
+fn verify_items(
+    items: &[Option<(&str, &str, &str)>],
+    key: &HessraKey,
+    threads: c_int,
+    results: &mut [c_int],
+    ids: &mut [Option<HessraRevocationIds>],
+) -> c_int {
+    let count = items.len();
+    let threads = (threads.max(1) as usize).min(MAX_THREADS).min(count);
+    let chunk_size = (count + threads - 1) / threads;
+
+    let verify_chunk = |items: &[Option<(&str, &str, &str)>],
+                        results: &mut [c_int],
+                        ids: &mut [Option<HessraRevocationIds>]| {
+        for ((item, result), ids) in items.iter().zip(results.iter_mut()).zip(ids.iter_mut()) {
+            (*result, *ids) = match item {
+                Some((token, subject, resource)) => verify_one(token, subject, resource, key),
+                None => (ERROR_INVALID_PARAMETER, None),
+            };
+        }
+    };
+
+    if threads == 1 {
+        verify_chunk(items, results, ids);
+        return SUCCESS;
+    }
+
+    let spawned = thread::scope(|scope| {
+        let handles: Vec<_> = items
+            .chunks(chunk_size)
+            .zip(results.chunks_mut(chunk_size))
+            .zip(ids.chunks_mut(chunk_size))
+            .map(|((items, results), ids)| {
+                thread::Builder::new()
+                    .name("hessra-verify".to_string())
+                    .spawn_scoped(scope, move || verify_chunk(items, results, ids))
+            })
+            .collect();
+
+        // Join every worker, even after a failure, so none outlives the scope
+        handles.into_iter().fold(true, |ok, handle| {
+            matches!(handle.map(|h| h.join()), Ok(Ok(()))) && ok
+        })
+    });
+
+    if spawned {
+        SUCCESS
+    } else {
+        ERROR_UNKNOWN
+    }
+}
@@ -0,0 +1,260 @@
+//! Service chain configuration parsing.
+
+use std::ffi::{CStr, CString};
+use std::fs;
+use std::os::raw::{c_char, c_int};
+use std::ptr;
+
+use biscuit_auth::PublicKey;
+use serde_json::Value;
+
+use crate::key::parse_public_key;
+use crate::result::*;
+use crate::template;
+use crate::token::slice_arg;
+
+/// A node of a service chain: the component name and the key it signs its
+/// attestation blocks with.
+pub(crate) struct ServiceNode {
+    pub(crate) component: String,
+    pub(crate) key: PublicKey,
+}
+
+/// Parse a service chain configuration. Both a bare JSON array of
+/// `{"component": ..., "public_key": ...}` objects and the
+/// `{"service_nodes": [...]}` form stored in `hessra_service_chains` are
+/// accepted.
+pub(crate) fn parse_service_nodes(json: &str) -> Option<Vec<ServiceNode>> {
+    let value: Value = serde_json::from_str(json).ok()?;
+
+    service_nodes_from_value(&value)
+}
+
+fn service_nodes_from_value(value: &Value) -> Option<Vec<ServiceNode>> {
+    let nodes = match value {
+        Value::Array(nodes) => nodes,
+        Value::Object(object) => object.get("service_nodes")?.as_array()?,
+        _ => return None,
+    };
+
+    nodes
+        .iter()
+        .map(|node| {
+            Some(ServiceNode {
+                component: node.get("component")?.as_str()?.to_string(),
+                key: parse_public_key(node.get("public_key")?.as_str()?)?,
+            })
+        })
+        .collect()
+}
+
+/// Opaque type representing a parsed service chain configuration
+pub struct HessraServiceChain {
+    pub(crate) nodes: Vec<ServiceNode>,
+    /// Identifies the chain's templates in the authorizer template cache
+    pub(crate) id: u64,
+}
+
+impl HessraServiceChain {
+    fn new(nodes: Vec<ServiceNode>) -> Self {
+        HessraServiceChain {
+            nodes,
+            id: template::next_chain_id(),
+        }
+    }
+}
+
+impl Drop for HessraServiceChain {
+    fn drop(&mut self) {
+        template::forget_chain(self.id);
+    }
+}
+
+/// Parse a service chain configuration once, so it can be used for any
+/// number of `hessra_token_authorize_with_chain` calls
+///
+/// # Safety
+///
+/// `service_nodes_json` must be a valid NUL-terminated string and
+/// `out_chain` a valid pointer. The returned chain must be released with
+/// `hessra_service_chain_free`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_service_chain_parse(
+    service_nodes_json: *const c_char,
+    out_chain: *mut *mut HessraServiceChain,
+) -> c_int {
+    if service_nodes_json.is_null() || out_chain.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    *out_chain = ptr::null_mut();
+
+    let nodes = match CStr::from_ptr(service_nodes_json)
+        .to_str()
+        .ok()
+        .and_then(parse_service_nodes)
+    {
+        Some(nodes) => nodes,
+        None => return ERROR_CONFIG_INVALID,
+    };
+
+    *out_chain = Box::into_raw(Box::new(HessraServiceChain::new(nodes)));
+    SUCCESS
+}
+
+/// `hessra_service_chain_parse` with the configuration given as `len` bytes
+/// at `service_nodes_json`, which need not be NUL-terminated
+///
+/// # Safety
+///
+/// `service_nodes_json` must point to `len` readable bytes and `out_chain`
+/// be a valid pointer. The returned chain must be released with
+/// `hessra_service_chain_free`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_service_chain_parse_slice(
+    service_nodes_json: *const c_char,
+    len: usize,
+    out_chain: *mut *mut HessraServiceChain,
+) -> c_int {
+    if service_nodes_json.is_null() || out_chain.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    *out_chain = ptr::null_mut();
+
+    let nodes = match slice_arg(service_nodes_json, len).and_then(parse_service_nodes) {
+        Some(nodes) => nodes,
+        None => return ERROR_CONFIG_INVALID,
+    };
+
+    *out_chain = Box::into_raw(Box::new(HessraServiceChain::new(nodes)));
+    SUCCESS
+}
+
+/// Free a chain returned by `hessra_service_chain_parse`
+///
+/// # Safety
+///
+/// `chain` must be NULL or a chain that has not been freed before.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_service_chain_free(chain: *mut HessraServiceChain) {
+    if !chain.is_null() {
+        drop(Box::from_raw(chain));
+    }
+}
+
+/// Opaque type representing the service chain configurations of several
+/// services, as loaded by `hessra_service_chain_set_from_file`
+pub struct HessraServiceChainSet {
+    entries: Vec<(CString, HessraServiceChain)>,
+}
+
+/// Load a JSON file mapping service names to service chain configurations,
+/// each in either form accepted by `hessra_service_chain_parse`
+///
+/// # Safety
+///
+/// `file_path` must be a valid NUL-terminated string and `out_set` a valid
+/// pointer. The returned set must be released with
+/// `hessra_service_chain_set_free`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_service_chain_set_from_file(
+    file_path: *const c_char,
+    out_set: *mut *mut HessraServiceChainSet,
+) -> c_int {
+    if file_path.is_null() || out_set.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    *out_set = ptr::null_mut();
+
+    let path = match CStr::from_ptr(file_path).to_str() {
+        Ok(path) => path,
+        Err(_) => return ERROR_INVALID_PARAMETER,
+    };
+    let contents = match fs::read_to_string(path) {
+        Ok(contents) => contents,
+        Err(_) => return ERROR_IO,
+    };
+    let services = match serde_json::from_str::<Value>(&contents) {
+        Ok(Value::Object(services)) => services,
+        _ => return ERROR_CONFIG_INVALID,
+    };
+
+    let mut entries = Vec::with_capacity(services.len());
+    for (name, config) in services {
+        let nodes = match service_nodes_from_value(&config) {
+            Some(nodes) => nodes,
+            None => return ERROR_CONFIG_INVALID,
+        };
+        let name = match CString::new(name) {
+            Ok(name) => name,
+            Err(_) => return ERROR_CONFIG_INVALID,
+        };
+        entries.push((name, HessraServiceChain::new(nodes)));
+    }
+
+    *out_set = Box::into_raw(Box::new(HessraServiceChainSet { entries }));
+    SUCCESS
+}
+
+/// Number of services in a set
+///
+/// # Safety
+///
+/// `set` must be NULL or a set returned by `hessra_service_chain_set_from_file`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_service_chain_set_len(set: *const HessraServiceChainSet) -> usize {
+    if set.is_null() {
+        return 0;
+    }
+    (*set).entries.len()
+}
+
+/// Name of the service at `index`, owned by the set; NULL if out of range
+///
+/// # Safety
+///
+/// `set` must be NULL or a set returned by `hessra_service_chain_set_from_file`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_service_chain_set_name(
+    set: *const HessraServiceChainSet,
+    index: usize,
+) -> *const c_char {
+    if set.is_null() {
+        return ptr::null();
+    }
+    match (*set).entries.get(index) {
+        Some((name, _)) => name.as_ptr(),
+        None => ptr::null(),
+    }
+}
+
+/// Chain of the service at `index`, owned by the set; NULL if out of range
+///
+/// # Safety
+///
+/// `set` must be NULL or a set returned by `hessra_service_chain_set_from_file`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_service_chain_set_chain(
+    set: *const HessraServiceChainSet,
+    index: usize,
+) -> *const HessraServiceChain {
+    if set.is_null() {
+        return ptr::null();
+    }
+    match (*set).entries.get(index) {
+        Some((_, chain)) => chain as *const HessraServiceChain,
+        None => ptr::null(),
+    }
+}
+
+/// Free a set returned by `hessra_service_chain_set_from_file`, including
+/// its names and chains
+///
+/// # Safety
+///
+/// `set` must be NULL or a set that has not been freed before.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_service_chain_set_free(set: *mut HessraServiceChainSet) {
+    if !set.is_null() {
+        drop(Box::from_raw(set));
+    }
+}
@@ -0,0 +1,217 @@
+//! Public keys usable with the parsed-token entry points.
+//!
+//! `HessraPublicKey` from hessra-ffi is opaque to this crate, so the
+//! extension entry points carry their own key handle. A handle is either a
+//! single key or a keyring that picks the key by the token's root key id.
+
+use std::collections::HashMap;
+use std::ffi::CStr;
+use std::fs;
+use std::os::raw::{c_char, c_int};
+use std::ptr;
+
+use biscuit_auth::builder::Algorithm;
+use biscuit_auth::error;
+use biscuit_auth::PublicKey;
+
+use crate::result::*;
+
+/// Opaque type representing a public key for the extension entry points
+pub struct HessraKey {
+    /// Key for tokens without a root key id, or with one not in `keyring`
+    pub(crate) key: Option<PublicKey>,
+    /// Keys selected by the token's root key id
+    pub(crate) keyring: HashMap<u32, PublicKey>,
+}
+
+impl HessraKey {
+    /// Choose the root key for a token, as a biscuit `RootKeyProvider`
+    pub(crate) fn root_key(&self, key_id: Option<u32>) -> Result<PublicKey, error::Format> {
+        key_id
+            .and_then(|id| self.keyring.get(&id))
+            .or(self.key.as_ref())
+            .cloned()
+            .ok_or(error::Format::UnknownPublicKey)
+    }
+}
+
+fn decode_hex(hex: &str) -> Option<Vec<u8>> {
+    if hex.len() % 2 != 0 {
+        return None;
+    }
+    (0..hex.len())
+        .step_by(2)
+        .map(|i| u8::from_str_radix(hex.get(i..i + 2)?, 16).ok())
+        .collect()
+}
+
+/// Parse a public key given either as PEM or in biscuit's
+/// `<algorithm>/<hex>` notation (e.g. `ed25519/e576...`).
+pub(crate) fn parse_public_key(key: &str) -> Option<PublicKey> {
+    let key = key.trim();
+
+    if key.starts_with("-----BEGIN") {
+        return PublicKey::from_pem(key).ok();
+    }
+
+    let (algorithm, hex) = key.split_once('/')?;
+    let algorithm = match algorithm {
+        "ed25519" => Algorithm::Ed25519,
+        "secp256r1" => Algorithm::Secp256r1,
+        _ => return None,
+    };
+
+    PublicKey::from_bytes(&decode_hex(hex)?, algorithm).ok()
+}
+
+unsafe fn key_result(key: Option<PublicKey>, out_key: *mut *mut HessraKey) -> c_int {
+    match key {
+        Some(key) => {
+            *out_key = Box::into_raw(Box::new(HessraKey {
+                key: Some(key),
+                keyring: HashMap::new(),
+            }));
+            SUCCESS
+        }
+        None => ERROR_INVALID_KEY,
+    }
+}
+
+/// Load a public key from a string (PEM or `<algorithm>/<hex>`)
+///
+/// # Safety
+///
+/// `key_string` must be a valid NUL-terminated string and `out_key` a valid
+/// pointer. The returned key must be released with `hessra_key_free`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_key_from_string(
+    key_string: *const c_char,
+    out_key: *mut *mut HessraKey,
+) -> c_int {
+    if key_string.is_null() || out_key.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    *out_key = ptr::null_mut();
+
+    match CStr::from_ptr(key_string).to_str() {
+        Ok(key) => key_result(parse_public_key(key), out_key),
+        Err(_) => ERROR_INVALID_KEY,
+    }
+}
+
+/// Load a public key from a file (PEM or `<algorithm>/<hex>`)
+///
+/// # Safety
+///
+/// `file_path` must be a valid NUL-terminated string and `out_key` a valid
+/// pointer. The returned key must be released with `hessra_key_free`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_key_from_file(
+    file_path: *const c_char,
+    out_key: *mut *mut HessraKey,
+) -> c_int {
+    if file_path.is_null() || out_key.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    *out_key = ptr::null_mut();
+
+    let path = match CStr::from_ptr(file_path).to_str() {
+        Ok(path) => path,
+        Err(_) => return ERROR_INVALID_PARAMETER,
+    };
+
+    match fs::read_to_string(path) {
+        Ok(contents) => key_result(parse_public_key(&contents), out_key),
+        Err(_) => ERROR_IO,
+    }
+}
+
+/// Create an empty keyring, to be filled with `hessra_keyring_add` and
+/// `hessra_keyring_set_default`
+///
+/// # Safety
+///
+/// `out_key` must be a valid pointer. The returned keyring must be released
+/// with `hessra_key_free`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_keyring_new(out_key: *mut *mut HessraKey) -> c_int {
+    if out_key.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+
+    *out_key = Box::into_raw(Box::new(HessraKey {
+        key: None,
+        keyring: HashMap::new(),
+    }));
+    SUCCESS
+}
+
+unsafe fn keyring_arg<'a>(
+    keyring: *mut HessraKey,
+    key_string: *const c_char,
+) -> Result<(&'a mut HessraKey, PublicKey), c_int> {
+    if keyring.is_null() || key_string.is_null() {
+        return Err(ERROR_INVALID_PARAMETER);
+    }
+
+    match CStr::from_ptr(key_string).to_str().ok().and_then(parse_public_key) {
+        Some(key) => Ok((&mut *keyring, key)),
+        None => Err(ERROR_INVALID_KEY),
+    }
+}
+
+/// Add a key (PEM or `<algorithm>/<hex>`) to a keyring for tokens whose
+/// root key id is `key_id`, replacing any key with the same id
+///
+/// # Safety
+///
+/// `keyring` must be a valid key handle and `key_string` a valid
+/// NUL-terminated string.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_keyring_add(
+    keyring: *mut HessraKey,
+    key_id: u32,
+    key_string: *const c_char,
+) -> c_int {
+    match keyring_arg(keyring, key_string) {
+        Ok((keyring, key)) => {
+            keyring.keyring.insert(key_id, key);
+            SUCCESS
+        }
+        Err(code) => code,
+    }
+}
+
+/// Set the key (PEM or `<algorithm>/<hex>`) a keyring uses for tokens
+/// without a root key id, or with an id that is not in the keyring
+///
+/// # Safety
+///
+/// `keyring` must be a valid key handle and `key_string` a valid
+/// NUL-terminated string.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_keyring_set_default(
+    keyring: *mut HessraKey,
+    key_string: *const c_char,
+) -> c_int {
+    match keyring_arg(keyring, key_string) {
+        Ok((keyring, key)) => {
+            keyring.key = Some(key);
+            SUCCESS
+        }
+        Err(code) => code,
+    }
+}
+
+/// Free a key returned by `hessra_key_from_string`, `hessra_key_from_file`
+/// or `hessra_keyring_new`
+///
+/// # Safety
+///
+/// `key` must be NULL or a key that has not been freed before.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_key_free(key: *mut HessraKey) {
+    if !key.is_null() {
+        drop(Box::from_raw(key));
+    }
+}
@@ -2,3 +2,13 @@ extern crate hessra_ffi;
 
 // Re-export all public items from hessra-ffi
 pub use hessra_ffi::*;
+
+// Extension entry points used by the Postgres plugin, declared in
+// include/hessra_ffi_ext.h
+mod batch;
+mod chain;
+mod key;
+mod result;
+mod revocation;
+mod template;
+mod token;
@@ -0,0 +1,16 @@
+//! Result codes shared with the C side.
+//!
+//! The values mirror `HessraResult` in `hessra_ffi.h` so that codes returned
+//! by the extension entry points can be passed to `hessra_error_message`.
+
+use std::os::raw::c_int;
+
+pub const SUCCESS: c_int = 0;
+pub const ERROR_INVALID_TOKEN: c_int = 1;
+pub const ERROR_INVALID_KEY: c_int = 2;
+pub const ERROR_VERIFICATION_FAILED: c_int = 3;
+pub const ERROR_CONFIG_INVALID: c_int = 4;
+pub const ERROR_MEMORY: c_int = 5;
+pub const ERROR_IO: c_int = 6;
+pub const ERROR_INVALID_PARAMETER: c_int = 7;
+pub const ERROR_UNKNOWN: c_int = 999;
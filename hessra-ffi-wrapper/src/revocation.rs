@@ -0,0 +1,128 @@
+//! Revocation identifiers of tokens.
+//!
+//! Every block of a token has a revocation identifier (its signature); a
+//! token is revoked when any of them is.
+
+use std::os::raw::{c_char, c_int};
+use std::ptr;
+
+use biscuit_auth::{Biscuit, UnverifiedBiscuit};
+
+use crate::result::*;
+use crate::token::{decode_token, str_arg, HessraToken};
+
+/// Opaque type representing the revocation identifiers of a token
+pub struct HessraRevocationIds {
+    ids: Vec<Vec<u8>>,
+}
+
+impl HessraRevocationIds {
+    pub(crate) fn of(biscuit: &Biscuit) -> Self {
+        HessraRevocationIds {
+            ids: biscuit.revocation_identifiers(),
+        }
+    }
+}
+
+/// Get the revocation identifiers of a token without verifying its
+/// signatures, e.g. to revoke a token signed with a key that is not
+/// configured
+///
+/// # Safety
+///
+/// `token_string` must be a valid NUL-terminated string and `out_ids` a
+/// valid pointer. The returned identifiers must be released with
+/// `hessra_revocation_ids_free`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_revocation_ids_from_string(
+    token_string: *const c_char,
+    out_ids: *mut *mut HessraRevocationIds,
+) -> c_int {
+    if out_ids.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    *out_ids = ptr::null_mut();
+
+    let bytes = match str_arg(token_string).and_then(decode_token) {
+        Some(bytes) => bytes,
+        None => return ERROR_INVALID_TOKEN,
+    };
+
+    match UnverifiedBiscuit::from(&bytes) {
+        Ok(biscuit) => {
+            *out_ids = Box::into_raw(Box::new(HessraRevocationIds {
+                ids: biscuit.revocation_identifiers(),
+            }));
+            SUCCESS
+        }
+        Err(_) => ERROR_INVALID_TOKEN,
+    }
+}
+
+/// Revocation identifiers of a parsed token, owned by the token
+///
+/// # Safety
+///
+/// `token` must be NULL or a valid token.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_revocation_ids(
+    token: *const HessraToken,
+) -> *const HessraRevocationIds {
+    if token.is_null() {
+        return ptr::null();
+    }
+    &(*token).revocation_ids as *const HessraRevocationIds
+}
+
+/// Number of revocation identifiers, one per block
+///
+/// # Safety
+///
+/// `ids` must be NULL or valid revocation identifiers.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_revocation_ids_len(ids: *const HessraRevocationIds) -> usize {
+    if ids.is_null() {
+        return 0;
+    }
+    (*ids).ids.len()
+}
+
+/// Revocation identifier at `index`, owned by `ids`, and its length in
+/// `out_len`; NULL if out of range
+///
+/// # Safety
+///
+/// `ids` must be NULL or valid revocation identifiers and `out_len` a valid
+/// pointer.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_revocation_ids_get(
+    ids: *const HessraRevocationIds,
+    index: usize,
+    out_len: *mut usize,
+) -> *const u8 {
+    if ids.is_null() || out_len.is_null() {
+        return ptr::null();
+    }
+    match (*ids).ids.get(index) {
+        Some(id) => {
+            *out_len = id.len();
+            id.as_ptr()
+        }
+        None => {
+            *out_len = 0;
+            ptr::null()
+        }
+    }
+}
+
+/// Free identifiers returned by `hessra_revocation_ids_from_string`
+///
+/// # Safety
+///
+/// `ids` must be NULL or identifiers that have not been freed before.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_revocation_ids_free(ids: *mut HessraRevocationIds) {
+    if !ids.is_null() {
+        drop(Box::from_raw(ids));
+    }
+}
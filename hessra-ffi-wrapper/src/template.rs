@@ -0,0 +1,215 @@
+//! Cache of prebuilt authorizer templates.
+//!
+//! A template holds everything an authorization needs except the current
+//! time and the subject: the resource fact, the operations, the allow
+//! policy and the service chain checks. Templates are kept per (resource,
+//! component, chain configuration) in a least recently used cache, so a call
+//! that hits only clones the template and adds two facts. The cache is per
+//! process; each PostgreSQL backend has its own.
+
+use std::collections::HashMap;
+use std::os::raw::c_int;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::sync::{Mutex, MutexGuard, OnceLock};
+
+use biscuit_auth::AuthorizerBuilder;
+use sha2::{Digest, Sha256};
+
+use crate::result::*;
+use crate::token::bind_subject;
+
+/// Number of templates kept until `hessra_authorizer_cache_configure` is
+/// called
+const DEFAULT_CAPACITY: usize = 1000;
+
+/// Source of the ids identifying parsed service chains in template keys
+static NEXT_CHAIN_ID: AtomicU64 = AtomicU64::new(1);
+
+pub(crate) fn next_chain_id() -> u64 {
+    NEXT_CHAIN_ID.fetch_add(1, Ordering::Relaxed)
+}
+
+/// The service chain configuration a template was built for
+#[derive(Clone, Hash, PartialEq, Eq)]
+pub(crate) enum ChainKey {
+    None,
+    /// A `HessraServiceChain`, by id
+    Parsed(u64),
+    /// A JSON configuration, by the SHA-256 digest of its text, so a lookup
+    /// does not copy it
+    Json([u8; 32]),
+}
+
+impl ChainKey {
+    pub(crate) fn json(json: &str) -> Self {
+        ChainKey::Json(Sha256::digest(json.as_bytes()).into())
+    }
+}
+
+#[derive(Clone, Hash, PartialEq, Eq)]
+pub(crate) struct TemplateKey {
+    resource: String,
+    component: Option<String>,
+    chain: ChainKey,
+}
+
+impl TemplateKey {
+    pub(crate) fn new(resource: &str, component: Option<&str>, chain: ChainKey) -> Self {
+        TemplateKey {
+            resource: resource.to_string(),
+            component: component.map(str::to_string),
+            chain,
+        }
+    }
+}
+
+struct Entry {
+    template: AuthorizerBuilder,
+    last_used: u64,
+}
+
+struct TemplateCache {
+    entries: HashMap<TemplateKey, Entry>,
+    capacity: usize,
+    tick: u64,
+    hits: u64,
+    misses: u64,
+}
+
+impl TemplateCache {
+    /// Drop least recently used templates until `room` more fit
+    fn evict(&mut self, room: usize) {
+        while !self.entries.is_empty() && self.entries.len() + room > self.capacity {
+            let oldest = self
+                .entries
+                .iter()
+                .min_by_key(|(_, entry)| entry.last_used)
+                .map(|(key, _)| key.clone());
+            if let Some(key) = oldest {
+                self.entries.remove(&key);
+            }
+        }
+    }
+}
+
+fn cache() -> MutexGuard<'static, TemplateCache> {
+    static CACHE: OnceLock<Mutex<TemplateCache>> = OnceLock::new();
+
+    CACHE
+        .get_or_init(|| {
+            Mutex::new(TemplateCache {
+                entries: HashMap::new(),
+                capacity: DEFAULT_CAPACITY,
+                tick: 0,
+                hits: 0,
+                misses: 0,
+            })
+        })
+        .lock()
+        .unwrap_or_else(|poisoned| poisoned.into_inner())
+}
+
+/// Authorizer for `subject`, from the cached template for `key` or, on a
+/// miss, from the template returned by `build`. Failures of `build` are
+/// returned as is and not cached.
+pub(crate) fn authorizer<F>(
+    key: TemplateKey,
+    subject: &str,
+    build: F,
+) -> Result<AuthorizerBuilder, c_int>
+where
+    F: FnOnce() -> Result<AuthorizerBuilder, c_int>,
+{
+    {
+        let mut cache = cache();
+        if cache.capacity == 0 {
+            drop(cache);
+            return build().map(|template| bind_subject(template, subject));
+        }
+
+        cache.tick += 1;
+        let tick = cache.tick;
+        let hit = cache.entries.get_mut(&key).map(|entry| {
+            entry.last_used = tick;
+            entry.template.clone()
+        });
+        match hit {
+            Some(template) => {
+                cache.hits += 1;
+                drop(cache);
+                return Ok(bind_subject(template, subject));
+            }
+            None => cache.misses += 1,
+        }
+    }
+
+    // Build outside the lock; another thread may insert the same key meanwhile
+    let template = build()?;
+
+    let mut cache = cache();
+    if cache.capacity > 0 {
+        if !cache.entries.contains_key(&key) {
+            cache.evict(1);
+        }
+        let last_used = cache.tick;
+        cache.entries.insert(
+            key,
+            Entry {
+                template: template.clone(),
+                last_used,
+            },
+        );
+    }
+    drop(cache);
+
+    Ok(bind_subject(template, subject))
+}
+
+/// Drop the templates built for a parsed service chain that is being freed
+pub(crate) fn forget_chain(id: u64) {
+    cache()
+        .entries
+        .retain(|key, _| key.chain != ChainKey::Parsed(id));
+}
+
+/// Statistics of the authorizer template cache of this process
+#[repr(C)]
+pub struct HessraAuthorizerCacheStats {
+    pub entries: u64,
+    pub capacity: u64,
+    pub hits: u64,
+    pub misses: u64,
+}
+
+/// Set the number of authorizer templates kept by this process. 0 disables
+/// the cache; shrinking it evicts the least recently used templates.
+#[no_mangle]
+pub extern "C" fn hessra_authorizer_cache_configure(capacity: usize) -> c_int {
+    let mut cache = cache();
+    cache.capacity = capacity;
+    cache.evict(0);
+    SUCCESS
+}
+
+/// Get the statistics of the authorizer template cache of this process
+///
+/// # Safety
+///
+/// `out_stats` must be a valid pointer.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_authorizer_cache_stats(
+    out_stats: *mut HessraAuthorizerCacheStats,
+) -> c_int {
+    if out_stats.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+
+    let cache = cache();
+    *out_stats = HessraAuthorizerCacheStats {
+        entries: cache.entries.len() as u64,
+        capacity: cache.capacity as u64,
+        hits: cache.hits,
+        misses: cache.misses,
+    };
+    SUCCESS
+}
@@ -0,0 +1,1058 @@
+//! Parsed-token entry points.
+//!
+//! `hessra_token_verify` from hessra-ffi deserializes the token and checks
+//! its signatures on every call. These entry points split that work: a token
+//! is parsed and its signatures verified once by `hessra_token_parse`, and the
+//! resulting handle can then be authorized against any number of
+//! subject/resource pairs.
+//!
+//! The authorization policy and the service chain checks mirror those of
+//! hessra-ffi 0.2.0 (hessra-token 0.1.1). The tests below check that both
+//! give the same verdicts for the tokens of the extension's test suite.
+
+use std::ffi::{CStr, CString};
+use std::os::raw::{c_char, c_int};
+use std::ptr;
+use std::slice;
+
+use base64::engine::general_purpose::{STANDARD, URL_SAFE};
+use base64::Engine;
+use biscuit_auth::builder::{Binary, Check, CheckKind, Op, Rule, Term};
+use biscuit_auth::error::{FailedCheck, Logic, MatchedPolicy, Token as TokenError};
+use biscuit_auth::macros::{authorizer, check};
+use biscuit_auth::{AuthorizerBuilder, Biscuit, UnverifiedBiscuit};
+use chrono::Utc;
+
+use crate::chain::{parse_service_nodes, HessraServiceChain, ServiceNode};
+use crate::key::HessraKey;
+use crate::revocation::HessraRevocationIds;
+use crate::result::*;
+use crate::template::{self, ChainKey, TemplateKey};
+
+/// Opaque type representing a deserialized, signature-checked token
+pub struct HessraToken {
+    pub(crate) biscuit: Biscuit,
+    pub(crate) expiration: Expiry,
+    pub(crate) revocation_ids: HessraRevocationIds,
+}
+
+/// Verdicts of `hessra_token_authorize_detailed`, all from one authorizer run
+#[repr(C)]
+pub struct HessraDetailedResult {
+    /// Result of authorizing subject/resource, as `hessra_token_authorize`
+    /// would return it
+    pub authorize_result: c_int,
+    /// Result of the service chain checks alone; SUCCESS if no chain was given
+    pub chain_result: c_int,
+    /// Component of the first chain node whose attestation is missing, or
+    /// `component` itself if it is not part of the chain; NULL if none. Must
+    /// be released with `hessra_string_free`.
+    pub failing_component: *mut c_char,
+}
+
+/// Decode a base64 encoded token. Hessra issues tokens with the standard
+/// alphabet, biscuit tooling uses the URL-safe one, so accept both.
+pub(crate) fn decode_token(token: &str) -> Option<Vec<u8>> {
+    let token = token.trim();
+    STANDARD
+        .decode(token)
+        .or_else(|_| URL_SAFE.decode(token))
+        .ok()
+}
+
+/// Point in time after which a token's verdicts may change because of the
+/// time checks of its blocks
+#[derive(Clone, Copy, PartialEq, Eq)]
+pub(crate) enum Expiry {
+    /// No check depends on the time
+    Never,
+    /// Unix seconds
+    At(i64),
+    /// Some check depends on the time in a way no bound can be read from
+    Unknown,
+}
+
+impl Expiry {
+    /// The expiry of two conditions that must both hold
+    fn earliest(self, other: Expiry) -> Expiry {
+        match (self, other) {
+            (Expiry::Unknown, _) | (_, Expiry::Unknown) => Expiry::Unknown,
+            (Expiry::Never, e) | (e, Expiry::Never) => e,
+            (Expiry::At(a), Expiry::At(b)) => Expiry::At(a.min(b)),
+        }
+    }
+
+    /// The expiry of two conditions of which either suffices
+    fn latest(self, other: Expiry) -> Expiry {
+        match (self, other) {
+            (Expiry::Unknown, _) | (_, Expiry::Unknown) => Expiry::Unknown,
+            (Expiry::Never, _) | (_, Expiry::Never) => Expiry::Never,
+            (Expiry::At(a), Expiry::At(b)) => Expiry::At(a.max(b)),
+        }
+    }
+}
+
+fn reads_time(rule: &Rule) -> bool {
+    rule.body.iter().any(|predicate| predicate.name == "time")
+}
+
+/// Variables bound to the current time by `time($var)` in a rule's body
+fn time_variables(rule: &Rule) -> Vec<&str> {
+    rule.body
+        .iter()
+        .filter(|predicate| predicate.name == "time")
+        .filter_map(|predicate| match predicate.terms.first() {
+            Some(Term::Variable(name)) => Some(name.as_str()),
+            _ => None,
+        })
+        .collect()
+}
+
+fn time_value(term: &Term) -> Option<i64> {
+    match term {
+        Term::Integer(seconds) => Some(*seconds),
+        Term::Date(seconds) => i64::try_from(*seconds).ok(),
+        _ => None,
+    }
+}
+
+/// Expiry of one query of a check: the smallest `$time < bound` or
+/// `$time <= bound` among its expressions. Any other use of the time
+/// variable, such as a not-before bound, makes it unknown.
+fn query_expiry(query: &Rule) -> Expiry {
+    if !reads_time(query) {
+        return Expiry::Never;
+    }
+    let variables = time_variables(query);
+    if variables.len() < query.body.iter().filter(|p| p.name == "time").count() {
+        // e.g. time(<constant>)
+        return Expiry::Unknown;
+    }
+    let is_time =
+        |term: &Term| matches!(term, Term::Variable(name) if variables.contains(&name.as_str()));
+
+    let mut expiry = Expiry::Never;
+    for expression in &query.expressions {
+        let uses_time = expression
+            .ops
+            .iter()
+            .any(|op| matches!(op, Op::Value(term) if is_time(term)));
+        if !uses_time {
+            continue;
+        }
+
+        let bound = match expression.ops.as_slice() {
+            [Op::Value(left), Op::Value(right), Op::Binary(Binary::LessThan | Binary::LessOrEqual)]
+                if is_time(left) =>
+            {
+                time_value(right)
+            }
+            [Op::Value(left), Op::Value(right), Op::Binary(Binary::GreaterThan | Binary::GreaterOrEqual)]
+                if is_time(right) =>
+            {
+                time_value(left)
+            }
+            _ => None,
+        };
+        expiry = expiry.earliest(bound.map_or(Expiry::Unknown, Expiry::At));
+    }
+
+    expiry
+}
+
+/// Expiry of the token, from the checks of all its blocks as parsed by the
+/// authorizer.
+///
+/// Hessra expresses expiry as `check if time($time), $time < <bound>` in the
+/// authority block, and attenuation may only add tighter bounds, so the
+/// earliest bound is the token's expiry. A check holds if any of its queries
+/// matches, so it expires with the latest of them. Rules reading the time,
+/// reject checks on it and time conditions that are not upper bounds make
+/// the expiry unknown.
+pub(crate) fn token_expiry(biscuit: &Biscuit) -> Expiry {
+    let authorizer = match AuthorizerBuilder::new().build(biscuit) {
+        Ok(authorizer) => authorizer,
+        Err(_) => return Expiry::Unknown,
+    };
+    let (_, rules, checks, _) = authorizer.dump();
+
+    if rules.iter().any(reads_time) {
+        return Expiry::Unknown;
+    }
+
+    checks.iter().fold(Expiry::Never, |expiry, check| {
+        let check_expiry = match check.kind {
+            CheckKind::One | CheckKind::All => check
+                .queries
+                .iter()
+                .map(query_expiry)
+                .reduce(Expiry::latest)
+                .unwrap_or(Expiry::Never),
+            _ if !check.queries.iter().any(reads_time) => Expiry::Never,
+            _ => Expiry::Unknown,
+        };
+        expiry.earliest(check_expiry)
+    })
+}
+
+/// Authorizer shared by basic and service chain verification: the token must
+/// grant `right(subject, resource, operation)` for a read or write operation
+/// and its time checks are evaluated against the current time.
+pub(crate) fn base_authorizer(subject: &str, resource: &str) -> AuthorizerBuilder {
+    bind_subject(resource_template(resource), subject)
+}
+
+/// The part of `base_authorizer` that does not depend on the subject or the
+/// current time, which `bind_subject` adds
+pub(crate) fn resource_template(resource: &str) -> AuthorizerBuilder {
+    let resource = resource.to_string();
+
+    authorizer!(
+        r#"
+            resource({resource});
+            operation("read");
+            operation("write");
+            allow if subject($sub), resource($res), operation($op), right($sub, $res, $op);
+        "#
+    )
+}
+
+pub(crate) fn bind_subject(template: AuthorizerBuilder, subject: &str) -> AuthorizerBuilder {
+    let now = Utc::now().timestamp();
+    let subject = subject.to_string();
+
+    template.merge(authorizer!(
+        r#"
+            time({now});
+            subject({subject});
+        "#
+    ))
+}
+
+/// `resource_template` with the checks of `service_chain_checks`
+fn service_chain_template(
+    resource: &str,
+    nodes: &[ServiceNode],
+    component: Option<&str>,
+) -> Result<AuthorizerBuilder, c_int> {
+    let checks =
+        service_chain_checks(resource, nodes, component).ok_or(ERROR_VERIFICATION_FAILED)?;
+
+    checks
+        .into_iter()
+        .try_fold(resource_template(resource), |builder, check| {
+            builder.check(check)
+        })
+        .map_err(|_| ERROR_VERIFICATION_FAILED)
+}
+
+/// Checks requiring an attestation from every node that precedes
+/// `component` in the chain. Returns `None` if the component is not part of
+/// the chain.
+pub(crate) fn service_chain_checks(
+    resource: &str,
+    nodes: &[ServiceNode],
+    component: Option<&str>,
+) -> Option<Vec<Check>> {
+    let mut checks = Vec::new();
+
+    for node in nodes {
+        if component == Some(node.component.as_str()) {
+            return Some(checks);
+        }
+
+        let service = resource.to_string();
+        let node_name = node.component.clone();
+        let node_key = node.key.clone();
+        checks.push(check!(
+            r#"check if node({service}, {node_name}) trusting authority, {node_key};"#
+        ));
+    }
+
+    match component {
+        Some(_) => None,
+        None => Some(checks),
+    }
+}
+
+pub(crate) fn run_authorizer(builder: AuthorizerBuilder, biscuit: &Biscuit) -> c_int {
+    let mut authorizer = match builder.build(biscuit) {
+        Ok(authorizer) => authorizer,
+        Err(_) => return ERROR_VERIFICATION_FAILED,
+    };
+
+    match authorizer.authorize() {
+        Ok(_) => SUCCESS,
+        Err(_) => ERROR_VERIFICATION_FAILED,
+    }
+}
+
+pub(crate) unsafe fn str_arg<'a>(s: *const c_char) -> Option<&'a str> {
+    if s.is_null() {
+        return None;
+    }
+    CStr::from_ptr(s).to_str().ok()
+}
+
+/// Borrow a string given as pointer and length, such as the data of a
+/// PostgreSQL text datum, without copying it or looking for a NUL
+pub(crate) unsafe fn slice_arg<'a>(s: *const c_char, len: usize) -> Option<&'a str> {
+    if s.is_null() {
+        return None;
+    }
+    std::str::from_utf8(slice::from_raw_parts(s as *const u8, len)).ok()
+}
+
+/// Deserialize a token and verify its signatures against `public_key`
+///
+/// # Safety
+///
+/// `token_string` must be a valid NUL-terminated string, `public_key` a valid
+/// key and `out_token` a valid pointer. The returned token must be released
+/// with `hessra_token_free`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_parse(
+    token_string: *const c_char,
+    public_key: *const HessraKey,
+    out_token: *mut *mut HessraToken,
+) -> c_int {
+    if public_key.is_null() || out_token.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    *out_token = ptr::null_mut();
+
+    let bytes = match str_arg(token_string).and_then(decode_token) {
+        Some(bytes) => bytes,
+        None => return ERROR_INVALID_TOKEN,
+    };
+
+    parse_token_bytes(&bytes, &*public_key, out_token)
+}
+
+/// Deserialize a base64 token given as `len` bytes at `token_string`, which
+/// need not be NUL-terminated, and verify its signatures against
+/// `public_key`
+///
+/// # Safety
+///
+/// `token_string` must point to `len` readable bytes, `public_key` be a
+/// valid key and `out_token` a valid pointer. The returned token must be
+/// released with `hessra_token_free`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_parse_slice(
+    token_string: *const c_char,
+    len: usize,
+    public_key: *const HessraKey,
+    out_token: *mut *mut HessraToken,
+) -> c_int {
+    if public_key.is_null() || out_token.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    *out_token = ptr::null_mut();
+
+    let bytes = match slice_arg(token_string, len).and_then(decode_token) {
+        Some(bytes) => bytes,
+        None => return ERROR_INVALID_TOKEN,
+    };
+
+    parse_token_bytes(&bytes, &*public_key, out_token)
+}
+
+/// Deserialize a token given as raw bytes, as stored by the `hessra_token`
+/// type, and verify its signatures against `public_key`
+///
+/// # Safety
+///
+/// `bytes` must point to `len` readable bytes, `public_key` be a valid key
+/// and `out_token` a valid pointer. The returned token must be released
+/// with `hessra_token_free`.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_parse_bytes(
+    bytes: *const u8,
+    len: usize,
+    public_key: *const HessraKey,
+    out_token: *mut *mut HessraToken,
+) -> c_int {
+    if bytes.is_null() || public_key.is_null() || out_token.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    *out_token = ptr::null_mut();
+
+    parse_token_bytes(slice::from_raw_parts(bytes, len), &*public_key, out_token)
+}
+
+unsafe fn parse_token_bytes(
+    bytes: &[u8],
+    public_key: &HessraKey,
+    out_token: *mut *mut HessraToken,
+) -> c_int {
+    match Biscuit::from(bytes, |key_id| public_key.root_key(key_id)) {
+        Ok(biscuit) => {
+            let expiration = token_expiry(&biscuit);
+            let revocation_ids = HessraRevocationIds::of(&biscuit);
+            *out_token = Box::into_raw(Box::new(HessraToken {
+                biscuit,
+                expiration,
+                revocation_ids,
+            }));
+            SUCCESS
+        }
+        Err(_) => ERROR_INVALID_TOKEN,
+    }
+}
+
+/// Decode a base64 token into `out_bytes` and check that it is a
+/// well-formed token. Signatures are not verified.
+///
+/// # Safety
+///
+/// `token_string` must be a valid NUL-terminated string, `out_bytes` point
+/// to `capacity` writable bytes and `out_len` be a valid pointer. A capacity
+/// of `strlen(token_string)` is always sufficient.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_decode(
+    token_string: *const c_char,
+    out_bytes: *mut u8,
+    capacity: usize,
+    out_len: *mut usize,
+) -> c_int {
+    if out_bytes.is_null() || out_len.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    *out_len = 0;
+
+    let bytes = match str_arg(token_string).and_then(decode_token) {
+        Some(bytes) => bytes,
+        None => return ERROR_INVALID_TOKEN,
+    };
+    if UnverifiedBiscuit::from(&bytes).is_err() {
+        return ERROR_INVALID_TOKEN;
+    }
+    if bytes.len() > capacity {
+        return ERROR_INVALID_PARAMETER;
+    }
+
+    ptr::copy_nonoverlapping(bytes.as_ptr(), out_bytes, bytes.len());
+    *out_len = bytes.len();
+    SUCCESS
+}
+
+/// Check that raw bytes are a well-formed token. Signatures are not verified.
+///
+/// # Safety
+///
+/// `bytes` must point to `len` readable bytes.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_check_bytes(bytes: *const u8, len: usize) -> c_int {
+    if bytes.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+
+    match UnverifiedBiscuit::from(slice::from_raw_parts(bytes, len)) {
+        Ok(_) => SUCCESS,
+        Err(_) => ERROR_INVALID_TOKEN,
+    }
+}
+
+/// Free a token returned by `hessra_token_parse` or `hessra_token_parse_bytes`
+///
+/// # Safety
+///
+/// `token` must be NULL or a token that has not been freed before.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_free(token: *mut HessraToken) {
+    if !token.is_null() {
+        drop(Box::from_raw(token));
+    }
+}
+
+/// Get the expiry of a parsed token as unix seconds, or 0 if it has none.
+/// Returns `ERROR_UNKNOWN` if the token's time checks do not reduce to an
+/// expiry, in which case its verdicts may change at any time.
+///
+/// # Safety
+///
+/// `token` must be a valid token and `out_expiration` a valid pointer.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_expires_at(
+    token: *const HessraToken,
+    out_expiration: *mut i64,
+) -> c_int {
+    if token.is_null() || out_expiration.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    *out_expiration = 0;
+    match (*token).expiration {
+        Expiry::Never => SUCCESS,
+        Expiry::At(seconds) => {
+            *out_expiration = seconds;
+            SUCCESS
+        }
+        Expiry::Unknown => ERROR_UNKNOWN,
+    }
+}
+
+/// Check that a parsed token grants `subject` access to `resource`
+///
+/// # Safety
+///
+/// `token` must be a valid token, `subject` and `resource` valid
+/// NUL-terminated strings.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_authorize(
+    token: *const HessraToken,
+    subject: *const c_char,
+    resource: *const c_char,
+) -> c_int {
+    if token.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    let (subject, resource) = match (str_arg(subject), str_arg(resource)) {
+        (Some(subject), Some(resource)) => (subject, resource),
+        _ => return ERROR_INVALID_PARAMETER,
+    };
+
+    authorize_resource(&(*token).biscuit, subject, resource)
+}
+
+/// `hessra_token_authorize` with `subject` and `resource` given as pointer
+/// and length
+///
+/// # Safety
+///
+/// `token` must be a valid token; `subject` and `resource` must point to
+/// `subject_len` and `resource_len` readable bytes.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_authorize_slice(
+    token: *const HessraToken,
+    subject: *const c_char,
+    subject_len: usize,
+    resource: *const c_char,
+    resource_len: usize,
+) -> c_int {
+    if token.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    let (subject, resource) = match (
+        slice_arg(subject, subject_len),
+        slice_arg(resource, resource_len),
+    ) {
+        (Some(subject), Some(resource)) => (subject, resource),
+        _ => return ERROR_INVALID_PARAMETER,
+    };
+
+    authorize_resource(&(*token).biscuit, subject, resource)
+}
+
+/// Check that a parsed token grants `subject` access to `resource` and
+/// carries attestations from every service node preceding `component`
+///
+/// # Safety
+///
+/// `token` must be a valid token; `subject`, `resource` and
+/// `service_nodes_json` valid NUL-terminated strings; `component` NULL or a
+/// valid NUL-terminated string.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_authorize_service_chain(
+    token: *const HessraToken,
+    subject: *const c_char,
+    resource: *const c_char,
+    service_nodes_json: *const c_char,
+    component: *const c_char,
+) -> c_int {
+    if token.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    let (subject, resource) = match (str_arg(subject), str_arg(resource)) {
+        (Some(subject), Some(resource)) => (subject, resource),
+        _ => return ERROR_INVALID_PARAMETER,
+    };
+    let json = match str_arg(service_nodes_json) {
+        Some(json) => json,
+        None => return ERROR_CONFIG_INVALID,
+    };
+
+    authorize_service_chain(
+        &(*token).biscuit,
+        subject,
+        resource,
+        ChainSource::Json(json),
+        str_arg(component),
+    )
+}
+
+/// `hessra_token_authorize_service_chain` with every string given as
+/// pointer and length
+///
+/// # Safety
+///
+/// `token` must be a valid token; `subject`, `resource` and
+/// `service_nodes_json` must point to as many readable bytes as their
+/// lengths; `component` must be NULL or point to `component_len` readable
+/// bytes.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_authorize_service_chain_slice(
+    token: *const HessraToken,
+    subject: *const c_char,
+    subject_len: usize,
+    resource: *const c_char,
+    resource_len: usize,
+    service_nodes_json: *const c_char,
+    service_nodes_json_len: usize,
+    component: *const c_char,
+    component_len: usize,
+) -> c_int {
+    if token.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    let (subject, resource) = match (
+        slice_arg(subject, subject_len),
+        slice_arg(resource, resource_len),
+    ) {
+        (Some(subject), Some(resource)) => (subject, resource),
+        _ => return ERROR_INVALID_PARAMETER,
+    };
+    let json = match slice_arg(service_nodes_json, service_nodes_json_len) {
+        Some(json) => json,
+        None => return ERROR_CONFIG_INVALID,
+    };
+
+    authorize_service_chain(
+        &(*token).biscuit,
+        subject,
+        resource,
+        ChainSource::Json(json),
+        slice_arg(component, component_len),
+    )
+}
+
+/// Check that a parsed token grants `subject` access to `resource` and
+/// carries attestations from every node of a parsed service chain preceding
+/// `component`
+///
+/// # Safety
+///
+/// `token` must be a valid token and `chain` a valid chain; `subject` and
+/// `resource` valid NUL-terminated strings; `component` NULL or a valid
+/// NUL-terminated string.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_authorize_with_chain(
+    token: *const HessraToken,
+    subject: *const c_char,
+    resource: *const c_char,
+    chain: *const HessraServiceChain,
+    component: *const c_char,
+) -> c_int {
+    if token.is_null() || chain.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    let (subject, resource) = match (str_arg(subject), str_arg(resource)) {
+        (Some(subject), Some(resource)) => (subject, resource),
+        _ => return ERROR_INVALID_PARAMETER,
+    };
+
+    authorize_service_chain(
+        &(*token).biscuit,
+        subject,
+        resource,
+        ChainSource::Parsed(&*chain),
+        str_arg(component),
+    )
+}
+
+/// `hessra_token_authorize_with_chain` with `subject`, `resource` and
+/// `component` given as pointer and length
+///
+/// # Safety
+///
+/// `token` must be a valid token and `chain` a valid chain; `subject` and
+/// `resource` must point to `subject_len` and `resource_len` readable bytes;
+/// `component` must be NULL or point to `component_len` readable bytes.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_authorize_with_chain_slice(
+    token: *const HessraToken,
+    subject: *const c_char,
+    subject_len: usize,
+    resource: *const c_char,
+    resource_len: usize,
+    chain: *const HessraServiceChain,
+    component: *const c_char,
+    component_len: usize,
+) -> c_int {
+    if token.is_null() || chain.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    let (subject, resource) = match (
+        slice_arg(subject, subject_len),
+        slice_arg(resource, resource_len),
+    ) {
+        (Some(subject), Some(resource)) => (subject, resource),
+        _ => return ERROR_INVALID_PARAMETER,
+    };
+
+    authorize_service_chain(
+        &(*token).biscuit,
+        subject,
+        resource,
+        ChainSource::Parsed(&*chain),
+        slice_arg(component, component_len),
+    )
+}
+
+fn authorize_resource(biscuit: &Biscuit, subject: &str, resource: &str) -> c_int {
+    let key = TemplateKey::new(resource, None, ChainKey::None);
+
+    match template::authorizer(key, subject, || Ok(resource_template(resource))) {
+        Ok(builder) => run_authorizer(builder, biscuit),
+        Err(code) => code,
+    }
+}
+
+/// A service chain configuration, as JSON text or already parsed
+#[derive(Clone, Copy)]
+enum ChainSource<'a> {
+    Json(&'a str),
+    Parsed(&'a HessraServiceChain),
+}
+
+fn authorize_service_chain(
+    biscuit: &Biscuit,
+    subject: &str,
+    resource: &str,
+    chain: ChainSource,
+    component: Option<&str>,
+) -> c_int {
+    let chain_key = match chain {
+        ChainSource::Json(json) => ChainKey::json(json),
+        ChainSource::Parsed(chain) => ChainKey::Parsed(chain.id),
+    };
+    let key = TemplateKey::new(resource, component, chain_key);
+
+    // The JSON is only parsed when its template is not cached
+    let build = || -> Result<AuthorizerBuilder, c_int> {
+        match chain {
+            ChainSource::Json(json) => {
+                let nodes = parse_service_nodes(json).ok_or(ERROR_CONFIG_INVALID)?;
+                service_chain_template(resource, &nodes, component)
+            }
+            ChainSource::Parsed(chain) => service_chain_template(resource, &chain.nodes, component),
+        }
+    };
+
+    match template::authorizer(key, subject, build) {
+        Ok(builder) => run_authorizer(builder, biscuit),
+        Err(code) => code,
+    }
+}
+
+/// Authorize a parsed token for `subject` and `resource` and, if `chain` is
+/// not NULL, check the attestations of the service nodes preceding
+/// `component`, reporting each verdict separately in `out_result`.
+/// `authorize_result` and `chain_result` both being SUCCESS is equivalent to
+/// `hessra_token_authorize_with_chain` succeeding. Strings are given as
+/// pointer and length.
+///
+/// # Safety
+///
+/// `token` must be a valid token and `chain` NULL or a valid chain;
+/// `subject` and `resource` must point to `subject_len` and `resource_len`
+/// readable bytes; `component` must be NULL or point to `component_len`
+/// readable bytes; `out_result` must be a valid pointer.
+#[no_mangle]
+pub unsafe extern "C" fn hessra_token_authorize_detailed(
+    token: *const HessraToken,
+    subject: *const c_char,
+    subject_len: usize,
+    resource: *const c_char,
+    resource_len: usize,
+    chain: *const HessraServiceChain,
+    component: *const c_char,
+    component_len: usize,
+    out_result: *mut HessraDetailedResult,
+) -> c_int {
+    if token.is_null() || out_result.is_null() {
+        return ERROR_INVALID_PARAMETER;
+    }
+    let (subject, resource) = match (
+        slice_arg(subject, subject_len),
+        slice_arg(resource, resource_len),
+    ) {
+        (Some(subject), Some(resource)) => (subject, resource),
+        _ => return ERROR_INVALID_PARAMETER,
+    };
+    let nodes = if chain.is_null() {
+        None
+    } else {
+        Some((*chain).nodes.as_slice())
+    };
+
+    *out_result = authorize_detailed(
+        &(*token).biscuit,
+        subject,
+        resource,
+        nodes,
+        slice_arg(component, component_len),
+    );
+    SUCCESS
+}
+
+fn authorize_detailed(
+    biscuit: &Biscuit,
+    subject: &str,
+    resource: &str,
+    nodes: Option<&[ServiceNode]>,
+    component: Option<&str>,
+) -> HessraDetailedResult {
+    let mut result = HessraDetailedResult {
+        authorize_result: ERROR_VERIFICATION_FAILED,
+        chain_result: SUCCESS,
+        failing_component: ptr::null_mut(),
+    };
+
+    // The chain checks are the authorizer's only checks, so a failed
+    // authorizer check's id is the index of the node it requires
+    let mut builder = base_authorizer(subject, resource);
+    if let Some(nodes) = nodes {
+        match service_chain_checks(resource, nodes, component) {
+            Some(checks) => {
+                for check in checks {
+                    builder = match builder.check(check) {
+                        Ok(builder) => builder,
+                        Err(_) => {
+                            result.chain_result = ERROR_VERIFICATION_FAILED;
+                            return result;
+                        }
+                    };
+                }
+            }
+            None => {
+                result.chain_result = ERROR_VERIFICATION_FAILED;
+                result.failing_component = component.map_or(ptr::null_mut(), component_string);
+            }
+        }
+    }
+
+    let mut authorizer = match builder.build(biscuit) {
+        Ok(authorizer) => authorizer,
+        Err(_) => {
+            if nodes.is_some() {
+                result.chain_result = ERROR_VERIFICATION_FAILED;
+            }
+            return result;
+        }
+    };
+
+    let (allowed, failed_checks) = match authorizer.authorize() {
+        Ok(_) => (true, Vec::new()),
+        Err(TokenError::FailedLogic(Logic::Unauthorized { policy, checks })) => {
+            (matches!(policy, MatchedPolicy::Allow(_)), checks)
+        }
+        Err(TokenError::FailedLogic(Logic::NoMatchingPolicy { checks })) => (false, checks),
+        Err(_) => {
+            if nodes.is_some() {
+                result.chain_result = ERROR_VERIFICATION_FAILED;
+            }
+            return result;
+        }
+    };
+
+    // Checks of the token's own blocks (expiry, attenuation) fail the
+    // authorization itself
+    if allowed && !failed_checks.iter().any(|c| matches!(c, FailedCheck::Block(_))) {
+        result.authorize_result = SUCCESS;
+    }
+
+    if let Some(check_id) = failed_checks
+        .iter()
+        .filter_map(|c| match c {
+            FailedCheck::Authorizer(check) => Some(check.check_id as usize),
+            _ => None,
+        })
+        .min()
+    {
+        result.chain_result = ERROR_VERIFICATION_FAILED;
+        result.failing_component = nodes
+            .and_then(|nodes| nodes.get(check_id))
+            .map_or(ptr::null_mut(), |node| component_string(&node.component));
+    }
+
+    result
+}
+
+fn component_string(component: &str) -> *mut c_char {
+    CString::new(component).map_or(ptr::null_mut(), CString::into_raw)
+}
+
+#[cfg(test)]
+mod tests {
+    use std::ffi::CString;
+    use std::ptr;
+
+    use serde_json::Value;
+
+    use super::*;
+    use crate::key::{hessra_key_free, hessra_key_from_string};
+    use crate::{
+        hessra_public_key_free, hessra_public_key_from_string, hessra_token_verify,
+        hessra_token_verify_service_chain, HessraPublicKey,
+    };
+
+    const KEY: &str = include_str!("../../test/hessra_key.pem");
+    const TEST_TOKENS: &str = include_str!("../../test/test_tokens.json");
+    const SERVICE_CHAIN_TOKENS: &str = include_str!("../../test/service_chain_tokens.json");
+
+    /// The same public key, loaded by hessra-ffi and by this crate
+    struct Keys {
+        upstream: *mut HessraPublicKey,
+        key: *mut HessraKey,
+    }
+
+    impl Keys {
+        fn load() -> Keys {
+            let pem = CString::new(KEY).unwrap();
+            let mut keys = Keys {
+                upstream: ptr::null_mut(),
+                key: ptr::null_mut(),
+            };
+            unsafe {
+                assert_eq!(
+                    hessra_public_key_from_string(pem.as_ptr(), &mut keys.upstream) as c_int,
+                    SUCCESS
+                );
+                assert_eq!(hessra_key_from_string(pem.as_ptr(), &mut keys.key), SUCCESS);
+            }
+            keys
+        }
+    }
+
+    impl Drop for Keys {
+        fn drop(&mut self) {
+            unsafe {
+                hessra_public_key_free(self.upstream);
+                hessra_key_free(self.key);
+            }
+        }
+    }
+
+    fn tokens(json: &str) -> Vec<Value> {
+        let data: Value = serde_json::from_str(json).unwrap();
+        data["tokens"].as_array().unwrap().clone()
+    }
+
+    fn cstring(value: &Value) -> CString {
+        CString::new(value.as_str().unwrap()).unwrap()
+    }
+
+    /// Parse `token` with this crate and run `authorize` on it, as the
+    /// extension does
+    unsafe fn parse_and<F>(keys: &Keys, token: &CString, authorize: F) -> c_int
+    where
+        F: FnOnce(*const HessraToken) -> c_int,
+    {
+        let mut parsed = ptr::null_mut();
+        let result = hessra_token_parse(token.as_ptr(), keys.key, &mut parsed);
+        if result != SUCCESS {
+            return result;
+        }
+        let result = authorize(parsed);
+        hessra_token_free(parsed);
+        result
+    }
+
+    #[test]
+    fn authorize_matches_hessra_token_verify() {
+        let keys = Keys::load();
+
+        for token in tokens(TEST_TOKENS)
+            .iter()
+            .chain(tokens(SERVICE_CHAIN_TOKENS).iter())
+        {
+            let name = token["name"].as_str().unwrap();
+            let token_string = cstring(&token["token"]);
+            let metadata = &token["metadata"];
+            let subject = cstring(&metadata["subject"]);
+            let resource = cstring(&metadata["resource"]);
+            let other = CString::new("no_such_value").unwrap();
+
+            for (subject, resource) in [
+                (&subject, &resource),
+                (&other, &resource),
+                (&subject, &other),
+            ] {
+                let (upstream, ours) = unsafe {
+                    (
+                        hessra_token_verify(
+                            token_string.as_ptr(),
+                            keys.upstream,
+                            subject.as_ptr(),
+                            resource.as_ptr(),
+                        ) as c_int,
+                        parse_and(&keys, &token_string, |parsed| {
+                            hessra_token_authorize(parsed, subject.as_ptr(), resource.as_ptr())
+                        }),
+                    )
+                };
+                assert_eq!(
+                    upstream == SUCCESS,
+                    ours == SUCCESS,
+                    "{name}: subject {subject:?}, resource {resource:?}: \
+                     hessra_token_verify returned {upstream}, hessra_token_authorize {ours}"
+                );
+            }
+        }
+    }
+
+    #[test]
+    fn authorize_service_chain_matches_hessra_token_verify_service_chain() {
+        let keys = Keys::load();
+
+        for token in tokens(SERVICE_CHAIN_TOKENS) {
+            let name = token["name"].as_str().unwrap();
+            let token_string = cstring(&token["token"]);
+            let metadata = &token["metadata"];
+            let subject = cstring(&metadata["subject"]);
+            let resource = cstring(&metadata["resource"]);
+            let nodes = metadata["service_nodes"]
+                .as_array()
+                .cloned()
+                .unwrap_or_default();
+            let json = serde_json::json!({ "service_nodes": nodes }).to_string();
+            let json = CString::new(json).unwrap();
+
+            let components = nodes
+                .iter()
+                .map(|node| cstring(&node["component"]))
+                .chain([CString::new("nonexistent_service").unwrap()]);
+
+            for component in components {
+                let (upstream, ours) = unsafe {
+                    (
+                        hessra_token_verify_service_chain(
+                            token_string.as_ptr(),
+                            keys.upstream,
+                            subject.as_ptr(),
+                            resource.as_ptr(),
+                            json.as_ptr(),
+                            component.as_ptr(),
+                        ) as c_int,
+                        parse_and(&keys, &token_string, |parsed| {
+                            hessra_token_authorize_service_chain(
+                                parsed,
+                                subject.as_ptr(),
+                                resource.as_ptr(),
+                                json.as_ptr(),
+                                component.as_ptr(),
+                            )
+                        }),
+                    )
+                };
+                assert_eq!(
+                    upstream == SUCCESS,
+                    ours == SUCCESS,
+                    "{name}: component {component:?}: hessra_token_verify_service_chain \
+                     returned {upstream}, hessra_token_authorize_service_chain {ours}"
+                );
+            }
+        }
+    }
+}
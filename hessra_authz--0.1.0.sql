@@ -12,6 +12,8 @@ CREATE TABLE IF NOT EXISTS hessra_public_keys (
     id SERIAL PRIMARY KEY,
     key_name TEXT NOT NULL UNIQUE,
     public_key TEXT NOT NULL,
+    -- Root key id of the tokens signed with this key
+    key_id BIGINT UNIQUE CHECK (key_id BETWEEN 0 AND 4294967295),
     description TEXT,
     is_default BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
@@ -34,6 +36,16 @@ FOR EACH ROW
 WHEN (NEW.is_default)
 EXECUTE FUNCTION update_default_public_key();
 
+-- Tell every backend to reload its cached configuration after a change
+CREATE FUNCTION hessra_config_changed() RETURNS TRIGGER
+AS '$libdir/hessra_authz', 'pg_hessra_config_changed'
+LANGUAGE C;
+
+CREATE TRIGGER hessra_public_keys_changed
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON hessra_public_keys
+FOR EACH STATEMENT
+EXECUTE FUNCTION hessra_config_changed();
+
 -- Table to store service chain configurations
 CREATE TABLE IF NOT EXISTS hessra_service_chains (
     id SERIAL PRIMARY KEY,
@@ -44,17 +56,260 @@ CREATE TABLE IF NOT EXISTS hessra_service_chains (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TRIGGER hessra_service_chains_changed
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON hessra_service_chains
+FOR EACH STATEMENT
+EXECUTE FUNCTION hessra_config_changed();
+
+-- Revoked tokens, by the hex revocation id of any of their blocks. Revoking the
+-- authority block's id revokes the token and every token attenuated from it.
+-- With hessra_authz in shared_preload_libraries, the ids are also kept in
+-- shared memory: inserts take effect at once, other changes when they commit.
+CREATE TABLE IF NOT EXISTS hessra_revoked_tokens (
+    revocation_id TEXT PRIMARY KEY CHECK (revocation_id ~ '^([0-9a-f]{2})+$'),
+    reason TEXT,
+    revoked_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Every verification reads this table, whatever role runs it
+GRANT SELECT ON hessra_revoked_tokens TO PUBLIC;
+
+CREATE FUNCTION hessra_revocations_changed() RETURNS TRIGGER
+AS '$libdir/hessra_authz', 'pg_hessra_revocations_changed'
+LANGUAGE C;
+
+CREATE TRIGGER hessra_revoked_tokens_added
+AFTER INSERT OR UPDATE ON hessra_revoked_tokens
+FOR EACH ROW
+EXECUTE FUNCTION hessra_revocations_changed();
+
+CREATE TRIGGER hessra_revoked_tokens_changed
+AFTER UPDATE OR DELETE OR TRUNCATE ON hessra_revoked_tokens
+FOR EACH STATEMENT
+EXECUTE FUNCTION hessra_revocations_changed();
+
+-- Planner support for the verification functions: cheaper per-row cost when
+-- the token is the same for every row
+CREATE FUNCTION hessra_verify_support(internal)
+RETURNS internal
+AS '$libdir/hessra_authz', 'pg_hessra_verify_support'
+LANGUAGE C STRICT;
+
+-- Token type storing the decoded token bytes instead of base64 text.
+-- Input checks the token's structure; signatures are checked on verification.
+CREATE TYPE hessra_token;
+
+CREATE FUNCTION hessra_token_in(cstring)
+RETURNS hessra_token
+AS '$libdir/hessra_authz', 'pg_hessra_token_in'
+LANGUAGE C STRICT IMMUTABLE PARALLEL SAFE;
+
+CREATE FUNCTION hessra_token_out(hessra_token)
+RETURNS cstring
+AS '$libdir/hessra_authz', 'pg_hessra_token_out'
+LANGUAGE C STRICT IMMUTABLE PARALLEL SAFE;
+
+CREATE FUNCTION hessra_token_recv(internal)
+RETURNS hessra_token
+AS '$libdir/hessra_authz', 'pg_hessra_token_recv'
+LANGUAGE C STRICT IMMUTABLE PARALLEL SAFE;
+
+CREATE FUNCTION hessra_token_send(hessra_token)
+RETURNS bytea
+AS '$libdir/hessra_authz', 'pg_hessra_token_send'
+LANGUAGE C STRICT IMMUTABLE PARALLEL SAFE;
+
+CREATE TYPE hessra_token (
+    INPUT = hessra_token_in,
+    OUTPUT = hessra_token_out,
+    RECEIVE = hessra_token_recv,
+    SEND = hessra_token_send,
+    INTERNALLENGTH = VARIABLE,
+    STORAGE = extended
+);
+
+CREATE CAST (text AS hessra_token) WITH INOUT AS ASSIGNMENT;
+CREATE CAST (hessra_token AS text) WITH INOUT AS ASSIGNMENT;
+CREATE CAST (hessra_token AS bytea) WITHOUT FUNCTION;
+
 -- Function to verify Hessra token with mandatory subject and resource
 CREATE FUNCTION verify_hessra_token(token TEXT, subject TEXT, resource TEXT)
 RETURNS BOOLEAN
 AS '$libdir/hessra_authz', 'pg_verify_hessra_token'
-LANGUAGE C STRICT IMMUTABLE;
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 1000 SUPPORT hessra_verify_support;
+
+CREATE FUNCTION verify_hessra_token(token hessra_token, subject TEXT, resource TEXT)
+RETURNS BOOLEAN
+AS '$libdir/hessra_authz', 'pg_verify_hessra_token_binary'
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 1000 SUPPORT hessra_verify_support;
 
 -- Function to verify Hessra service chain token with mandatory service_nodes_json and component
 CREATE FUNCTION verify_hessra_service_chain(token TEXT, subject TEXT, resource TEXT, service_nodes_json TEXT, component TEXT)
 RETURNS BOOLEAN
 AS '$libdir/hessra_authz', 'pg_verify_hessra_service_chain'
-LANGUAGE C STRICT IMMUTABLE;
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 2000 SUPPORT hessra_verify_support;
+
+CREATE FUNCTION verify_hessra_service_chain(token hessra_token, subject TEXT, resource TEXT, service_nodes_json TEXT, component TEXT)
+RETURNS BOOLEAN
+AS '$libdir/hessra_authz', 'pg_verify_hessra_service_chain_binary'
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 2000 SUPPORT hessra_verify_support;
+
+-- Function to verify a token, its authorization and optionally a service chain
+-- in one pass, with every verdict reported separately. error_code is the
+-- HessraResult code of the first failed step (0 if none); chain_valid is NULL
+-- without service_nodes_json.
+CREATE FUNCTION hessra_verify_detailed(
+    token TEXT,
+    subject TEXT,
+    resource TEXT,
+    service_nodes_json TEXT DEFAULT NULL,
+    component TEXT DEFAULT NULL,
+    OUT signature_valid BOOLEAN,
+    OUT authorized BOOLEAN,
+    OUT chain_valid BOOLEAN,
+    OUT failing_component TEXT,
+    OUT error_code INTEGER,
+    OUT expires_at TIMESTAMP WITH TIME ZONE
+)
+RETURNS record
+AS '$libdir/hessra_authz', 'pg_hessra_verify_detailed'
+LANGUAGE C STABLE PARALLEL SAFE
+COST 2000;
+
+CREATE FUNCTION hessra_verify_detailed(
+    token hessra_token,
+    subject TEXT,
+    resource TEXT,
+    service_nodes_json TEXT DEFAULT NULL,
+    component TEXT DEFAULT NULL,
+    OUT signature_valid BOOLEAN,
+    OUT authorized BOOLEAN,
+    OUT chain_valid BOOLEAN,
+    OUT failing_component TEXT,
+    OUT error_code INTEGER,
+    OUT expires_at TIMESTAMP WITH TIME ZONE
+)
+RETURNS record
+AS '$libdir/hessra_authz', 'pg_hessra_verify_detailed_binary'
+LANGUAGE C STABLE PARALLEL SAFE
+COST 2000;
+
+-- Function to verify one Hessra token against many resources, parsing the token once
+CREATE FUNCTION verify_hessra_token_many(token TEXT, subject TEXT, resources TEXT[])
+RETURNS BOOLEAN[]
+AS '$libdir/hessra_authz', 'pg_verify_hessra_token_many'
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 5000;
+
+-- Function to verify one Hessra service chain token against many resources
+CREATE FUNCTION verify_hessra_service_chain_many(token TEXT, subject TEXT, resources TEXT[], service_nodes_json TEXT, component TEXT)
+RETURNS BOOLEAN[]
+AS '$libdir/hessra_authz', 'pg_verify_hessra_service_chain_many'
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 10000;
+
+-- Function to verify many Hessra tokens at once on hessra.bulk_workers threads
+CREATE FUNCTION verify_hessra_tokens(tokens TEXT[], subjects TEXT[], resources TEXT[])
+RETURNS BOOLEAN[]
+AS '$libdir/hessra_authz', 'pg_verify_hessra_tokens'
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 100000;
+
+-- Verify a token once and keep it for hessra_authorized for the rest of the session
+-- (cleared by RESET ALL / DISCARD ALL), or of the transaction if is_local
+CREATE FUNCTION hessra_set_session_token(token TEXT, subject TEXT, is_local BOOLEAN DEFAULT FALSE)
+RETURNS BOOLEAN
+AS '$libdir/hessra_authz', 'pg_hessra_set_session_token'
+LANGUAGE C STRICT VOLATILE PARALLEL UNSAFE;
+
+CREATE FUNCTION hessra_clear_session_token()
+RETURNS VOID
+AS '$libdir/hessra_authz', 'pg_hessra_clear_session_token'
+LANGUAGE C VOLATILE PARALLEL UNSAFE;
+
+-- Check the session token against a resource; false if no session token is set.
+-- The token lives in the session's backend, so parallel workers cannot run this.
+CREATE FUNCTION hessra_authorized(resource TEXT)
+RETURNS BOOLEAN
+AS '$libdir/hessra_authz', 'pg_hessra_authorized'
+LANGUAGE C STRICT STABLE PARALLEL RESTRICTED
+COST 100;
+
+-- Statistics of the shared verification result cache
+-- (only populated when hessra_authz is listed in shared_preload_libraries)
+CREATE FUNCTION hessra_result_cache_stats(
+    OUT entries BIGINT,
+    OUT hits BIGINT,
+    OUT misses BIGINT,
+    OUT hit_rate DOUBLE PRECISION
+)
+RETURNS record
+AS '$libdir/hessra_authz', 'pg_hessra_result_cache_stats'
+LANGUAGE C STRICT VOLATILE;
+
+-- Remove all entries from the shared verification result cache
+CREATE FUNCTION hessra_result_cache_flush()
+RETURNS BIGINT
+AS '$libdir/hessra_authz', 'pg_hessra_result_cache_flush'
+LANGUAGE C STRICT VOLATILE;
+
+REVOKE ALL ON FUNCTION hessra_result_cache_flush() FROM PUBLIC;
+
+-- Statistics of this backend's authorizer template cache
+CREATE FUNCTION hessra_authorizer_cache_stats(
+    OUT entries BIGINT,
+    OUT capacity BIGINT,
+    OUT hits BIGINT,
+    OUT misses BIGINT,
+    OUT hit_rate DOUBLE PRECISION
+)
+RETURNS record
+AS '$libdir/hessra_authz', 'pg_hessra_authorizer_cache_stats'
+LANGUAGE C STRICT VOLATILE;
+
+-- Per-function verification statistics
+-- (only populated when hessra_authz is listed in shared_preload_libraries).
+-- Times are in milliseconds; latency_histogram[n] counts calls that took
+-- 2^(n-1) to 2^n microseconds, the first element starting at 0 and the last
+-- one open-ended.
+CREATE FUNCTION hessra_stat_functions(
+    OUT function TEXT,
+    OUT calls BIGINT,
+    OUT success BIGINT,
+    OUT invalid_token BIGINT,
+    OUT invalid_key BIGINT,
+    OUT verification_failed BIGINT,
+    OUT config_invalid BIGINT,
+    OUT memory_error BIGINT,
+    OUT io_error BIGINT,
+    OUT invalid_parameter BIGINT,
+    OUT unknown_error BIGINT,
+    OUT cache_hits BIGINT,
+    OUT cache_misses BIGINT,
+    OUT total_time DOUBLE PRECISION,
+    OUT key_load_time DOUBLE PRECISION,
+    OUT verify_time DOUBLE PRECISION,
+    OUT latency_histogram BIGINT[],
+    OUT stats_reset TIMESTAMPTZ
+)
+RETURNS SETOF record
+AS '$libdir/hessra_authz', 'pg_hessra_stat_functions'
+LANGUAGE C STRICT VOLATILE;
+
+CREATE VIEW pg_stat_hessra AS
+    SELECT * FROM hessra_stat_functions();
+
+-- Reset the statistics shown by pg_stat_hessra
+CREATE FUNCTION hessra_stat_reset()
+RETURNS VOID
+AS '$libdir/hessra_authz', 'pg_hessra_stat_reset'
+LANGUAGE C STRICT VOLATILE;
+
+REVOKE ALL ON FUNCTION hessra_stat_reset() FROM PUBLIC;
 
 -- Function to set the public key path for Hessra authentication
 -- This will set the custom configuration parameter that the C functions will check
@@ -141,35 +396,25 @@ END;
 $$ LANGUAGE plpgsql STRICT;
 
 -- Function to verify a service chain token using the stored configuration
-CREATE OR REPLACE FUNCTION verify_hessra_service_chain_by_name(
+CREATE FUNCTION verify_hessra_service_chain_by_name(
     token TEXT, 
     subject TEXT, 
     resource TEXT, 
     component TEXT
-) RETURNS BOOLEAN AS $$
-DECLARE
-    service_nodes_json TEXT;
-BEGIN
-    -- Get the service chain JSON for the resource
-    SELECT service_chain::TEXT INTO service_nodes_json 
-    FROM hessra_service_chains 
-    WHERE service_name = resource;
-    
-    IF service_nodes_json IS NULL THEN
-        RAISE WARNING 'No service chain configuration found for service: %', resource;
-        RETURN FALSE;
-    END IF;
-    
-    -- Call the C function with the retrieved JSON
-    RETURN verify_hessra_service_chain(
-        token, 
-        subject, 
-        resource, 
-        service_nodes_json, 
-        component
-    );
-END;
-$$ LANGUAGE plpgsql STRICT;
+) RETURNS BOOLEAN
+AS '$libdir/hessra_authz', 'pg_verify_hessra_service_chain_by_name'
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 2000 SUPPORT hessra_verify_support;
+
+CREATE FUNCTION verify_hessra_service_chain_by_name(
+    token hessra_token,
+    subject TEXT,
+    resource TEXT,
+    component TEXT
+) RETURNS BOOLEAN
+AS '$libdir/hessra_authz', 'pg_verify_hessra_service_chain_by_name_binary'
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 2000 SUPPORT hessra_verify_support;
 
 -- Helper functions for managing configuration tables
 
@@ -228,41 +473,42 @@ EXCEPTION
 END;
 $$ LANGUAGE plpgsql STRICT;
 
--- Function to verify a token using the default public key
-CREATE OR REPLACE FUNCTION verify_hessra_token_default(token TEXT, subject TEXT, resource TEXT)
-RETURNS BOOLEAN AS $$
+-- Function to get the revocation ids of a token, one per block, the authority
+-- block's first (the token's signatures are not verified)
+CREATE FUNCTION hessra_token_revocation_ids(token TEXT)
+RETURNS TEXT[]
+AS '$libdir/hessra_authz', 'pg_hessra_token_revocation_ids'
+LANGUAGE C STRICT IMMUTABLE PARALLEL SAFE;
+
+-- Function to revoke a token and every token attenuated from it
+CREATE OR REPLACE FUNCTION hessra_revoke_token(token TEXT, reason TEXT DEFAULT NULL)
+RETURNS INTEGER AS $$
 DECLARE
-    default_key TEXT;
-    key_path TEXT;
-    result BOOLEAN;
+    revoked INTEGER;
 BEGIN
-    -- First try to get key from the database
-    SELECT public_key INTO default_key FROM hessra_public_keys WHERE is_default = TRUE LIMIT 1;
-    
-    IF default_key IS NOT NULL THEN
-        -- Write key to temporary file
-        key_path := '/tmp/hessra_temp_key_' || md5(random()::text) || '.pem';
-        PERFORM pg_catalog.pg_file_write(key_path, default_key, false);
-        
-        -- Set path for verification
-        PERFORM set_hessra_public_key_path(key_path);
-        
-        -- Verify token
-        result := verify_hessra_token(token, subject, resource);
-        
-        -- Clean up temp file
-        PERFORM pg_catalog.pg_file_unlink(key_path);
-        
-        RETURN result;
-    ELSE
-        -- Fall back to configured key path
-        RETURN verify_hessra_token(token, subject, resource);
-    END IF;
-EXCEPTION
-    WHEN OTHERS THEN
-        RAISE WARNING 'Error in verify_hessra_token_default: %', SQLERRM;
-        RETURN FALSE;
+    INSERT INTO hessra_revoked_tokens (revocation_id, reason)
+    SELECT id, hessra_revoke_token.reason
+    FROM unnest(hessra_token_revocation_ids(hessra_revoke_token.token)) AS id
+    ON CONFLICT (revocation_id) DO NOTHING;
+
+    GET DIAGNOSTICS revoked = ROW_COUNT;
+    RETURN revoked;
 END;
-$$ LANGUAGE plpgsql STRICT;
+$$ LANGUAGE plpgsql;
+
+-- Function to verify a token using the key matching its root key id or else
+-- the default public key, falling back to the configured key path when no key
+-- is marked as default or has a key_id
+CREATE FUNCTION verify_hessra_token_default(token TEXT, subject TEXT, resource TEXT)
+RETURNS BOOLEAN
+AS '$libdir/hessra_authz', 'pg_verify_hessra_token_default'
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 1000 SUPPORT hessra_verify_support;
+
+CREATE FUNCTION verify_hessra_token_default(token hessra_token, subject TEXT, resource TEXT)
+RETURNS BOOLEAN
+AS '$libdir/hessra_authz', 'pg_verify_hessra_token_default_binary'
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 1000 SUPPORT hessra_verify_support;
 
 -- Add more functions, types, operators etc. as needed 
\ No newline at end of file
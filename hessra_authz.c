@@ -1,7 +1,9 @@
 /*-------------------------------------------------------------------------
- * postgres-plugin.c
+ * hessra_authz.c
  *
- * C source code for the Hessra Postgres authorization plugin.
+ * The hessra_authz extension: SQL functions verifying Hessra tokens and
+ * service chains through the hessra-ffi wrapper, the hessra_token type,
+ * token revocation, and the key, token and result caches behind them.
  *-------------------------------------------------------------------------
  */
 
@@ -11,11 +13,49 @@
 #include "miscadmin.h" // For GetConfigOptionByName, etc. (Needed for GUC later)
 #include "utils/elog.h" // For ereport, ERROR, NOTICE, etc.
 #include "utils/guc.h" // For GetConfigOptionByName
+#include "access/htup_details.h"
+#include "access/xact.h"
+#include "catalog/pg_type.h"
+#include "commands/trigger.h"
+#include "common/base64.h"
+#include "common/cryptohash.h"
+#include "common/hashfn.h"
+#include "common/sha2.h"
+#include "executor/spi.h"
+#include "funcapi.h"
+#include "libpq/pqformat.h"
+#include "nodes/supportnodes.h"
+#include "optimizer/optimizer.h"
+#include "port/atomics.h"
+#include "port/pg_bitutils.h"
+#include "portability/instr_time.h"
+#include "postmaster/bgworker.h"
+#include "postmaster/interrupt.h"
+#include "storage/fd.h"
+#include "storage/ipc.h"
+#include "storage/latch.h"
+#include "storage/lwlock.h"
+#include "storage/shmem.h"
+#include "utils/array.h"
+#include "utils/hsearch.h"
+#include "utils/inval.h"
+#include "utils/lsyscache.h"
+#include "utils/rel.h"
+#include "utils/resowner.h"
+#include "utils/snapmgr.h"
+#include "utils/timestamp.h"
+#include "utils/wait_event.h"
+
+#include <fcntl.h>
+#include <signal.h>
+#include <sys/stat.h>
+#include <unistd.h>
 
 // Include the header generated by cbindgen from the Rust FFI crate
 // The actual path might need adjustment in the Makefile depending on build steps
 // hessra-ffi.h includes hessra_token_verify, hessra_public_key_from_file, HessraResult, etc.
-#include "hessra_ffi.h"
+// hessra_ffi_ext.h includes it and adds the wrapper crate's own entry points.
+#include "hessra_ffi_ext.h"
 
 PG_MODULE_MAGIC;
 
@@ -27,11 +67,536 @@ PG_MODULE_MAGIC;
 // Global variable to hold the configured path
 char *hessra_public_key_path = NULL;
 
+// Identity of a key file; a file replaced or rewritten gets a new one
+typedef struct HessraKeyFileId
+{
+    dev_t       dev;
+    ino_t       ino;
+    time_t      mtime;
+    off_t       size;
+} HessraKeyFileId;
+
+/*
+ * Per-backend cache of the parsed public key.
+ *
+ * The key is identified by the resolved path plus the identity of the file
+ * behind it, so a policy that checks a million rows parses the PEM file once
+ * instead of once per row, while a key rotated in place on disk is still
+ * picked up on the next call.
+ *
+ * When the key watcher watches the same path, the cache is also tied to the
+ * watcher's generation counter: as long as it has not moved, the key is used
+ * without looking at the file at all.
+ */
+typedef struct HessraKeyCache
+{
+    bool        valid;
+    char        path[MAXPGPATH];
+    HessraKeyFileId file;
+    uint64      watch_generation;   /* key_generation of the watcher when checked, 0 if not watched */
+    HessraKey  *key;
+    uint8       fingerprint[PG_SHA256_DIGEST_LENGTH];   /* identifies the key in result cache keys */
+} HessraKeyCache;
+
+static HessraKeyCache hessra_key_cache = {false};
+
+/*
+ * Per-backend cache of the keyring built from the hessra_public_keys table.
+ *
+ * Rows with a key_id are looked up by the root key id a token carries; the
+ * row marked is_default verifies tokens without a (known) key id. The
+ * keyring is loaded through SPI on first use and dropped by a relcache
+ * invalidation callback. The hessra_config_changed trigger on
+ * hessra_public_keys issues that invalidation for every write, so all
+ * backends reload the keyring once the writing transaction commits.
+ */
+#define HESSRA_PUBLIC_KEYS_TABLE "hessra_public_keys"
+
+typedef struct HessraDefaultKeyCache
+{
+    bool        valid;
+    Oid         relid;              /* hessra_public_keys, once resolved */
+    HessraKey  *key;                /* NULL if no row is default or has a key_id */
+    uint8       fingerprint[PG_SHA256_DIGEST_LENGTH];
+} HessraDefaultKeyCache;
+
+static HessraDefaultKeyCache hessra_default_key_cache = {false, InvalidOid, NULL};
+
+/*
+ * Per-backend cache of parsed service chain configurations from the
+ * hessra_service_chains table, keyed by a digest of the service name. Misses
+ * are cached as well. The whole cache is dropped when the table is
+ * invalidated, like the default key above.
+ */
+#define HESSRA_SERVICE_CHAINS_TABLE "hessra_service_chains"
+
+typedef struct HessraServiceChainEntry
+{
+    uint8       name_digest[PG_SHA256_DIGEST_LENGTH];  /* hash key */
+    bool        found;              /* a row exists for the service */
+    HessraResult parse_result;
+    HessraServiceChain *chain;      /* NULL unless found and parsed */
+    uint8       fingerprint[PG_SHA256_DIGEST_LENGTH];   /* digest of the stored configuration */
+    bool        preloaded;          /* chain belongs to hessra_preloaded_chains */
+} HessraServiceChainEntry;
+
+static HTAB *hessra_service_chain_cache = NULL;
+static bool hessra_service_chain_cache_valid = false;
+static Oid hessra_service_chains_relid = InvalidOid;
+
+// Saved query looking up revocation ids in hessra_revoked_tokens, prepared again when the table changes
+static SPIPlanPtr hessra_revoked_tokens_plan = NULL;
+static bool hessra_revoked_tokens_plan_valid = false;
+static Oid hessra_revoked_tokens_relid = InvalidOid;
+
+/*
+ * Service chains read from hessra.service_chains_file by the postmaster and
+ * inherited by every backend on fork. They are used for services without a
+ * row in hessra_service_chains and are never released.
+ */
+static char *hessra_service_chains_file = NULL;
+static HessraServiceChainSet *hessra_preloaded_chain_set = NULL;
+static HTAB *hessra_preloaded_chains = NULL;
+
+static bool hessra_relcache_callback_registered = false;
+
+/*
+ * Token verified once per session by hessra_set_session_token, for cheap
+ * per-row checks with hessra_authorized. Lives in TopMemoryContext.
+ *
+ * The state is tied to the hidden hessra.session_token_id setting: whenever
+ * the setting changes to a value other than the state's id (RESET, RESET
+ * ALL, DISCARD ALL, or a rolled back transaction) the state is released, so
+ * a pooled connection never leaks one client's token to the next.
+ */
+typedef struct HessraSessionToken
+{
+    char        id[32];             /* hessra.session_token_id while the state is current */
+    char       *subject;
+    HessraToken *parsed;            /* NULL if no token is set */
+} HessraSessionToken;
+
+static HessraSessionToken hessra_session_token = {""};
+static char *hessra_session_token_id = NULL;
+static uint64 hessra_session_token_counter = 0;
+
+// Bumped whenever the cached key is replaced, so parsed tokens can be tied to it
+static uint64 hessra_key_generation = 0;
+
+/*
+ * Statement-level cache of the parsed token, kept in flinfo->fn_extra.
+ *
+ * In an RLS policy the token argument (e.g. current_setting('app.current_token'))
+ * is the same for every row. Deserializing the token and checking its
+ * signatures is done once per statement; for each row only the datalog
+ * authorization for the row's subject/resource runs. The Rust-owned token is
+ * released by a reset callback on fn_mcxt, so it cannot leak on ERROR.
+ */
+typedef struct HessraTokenCache
+{
+    HessraKey  *key;                /* key the token was verified with */
+    uint64      key_generation;     /* hessra_key_generation at parse time */
+    char       *token;              /* copy of the token text, in fn_mcxt */
+    int         token_len;
+    HessraResult parse_result;      /* outcome of hessra_token_parse */
+    HessraToken *parsed;            /* NULL unless parse_result == SUCCESS */
+    bool        revoked_known;      /* revoked holds for the command below */
+    bool        revoked;
+    TimestampTz revoked_statement;  /* statement start the verdict was found in */
+    CommandId   revoked_command;
+    MemoryContextCallback cleanup;
+} HessraTokenCache;
+
+/*
+ * A Rust-owned handle held for the duration of one call.
+ *
+ * The guard is allocated in, and registered as a reset callback on, the
+ * current memory context, so the handle is released when that context goes
+ * away even if an ERROR unwinds past the code that created it. Calling
+ * hessra_handle_release releases it early; setting handle to NULL hands
+ * ownership elsewhere. A guard made by hessra_handle_guard_array holds an
+ * array of handles instead, each of which may be NULL.
+ */
+typedef enum HessraHandleKind
+{
+    HESSRA_HANDLE_KEY,
+    HESSRA_HANDLE_TOKEN,
+    HESSRA_HANDLE_SERVICE_CHAIN,
+    HESSRA_HANDLE_REVOCATION_IDS,
+    HESSRA_HANDLE_STRING
+} HessraHandleKind;
+
+typedef struct HessraHandleGuard
+{
+    MemoryContextCallback callback;
+    HessraHandleKind kind;
+    void       *handle;             /* NULL once released or handed over */
+    void      **handles;            /* array guards only */
+    uintptr_t   nhandles;
+} HessraHandleGuard;
+
+/*
+ * Shared-memory verification result cache.
+ *
+ * When the library is loaded through shared_preload_libraries, verdicts of
+ * verify_hessra_token / verify_hessra_service_chain are shared by all
+ * backends. Entries are keyed by a SHA-256 digest over the function arguments
+ * and the identity of the public key used, expire after
+ * hessra.result_cache_ttl seconds or at the token's own expiry, whichever
+ * comes first, and the least recently used entries are evicted when the cache
+ * is full.
+ */
+#define HESSRA_SHMEM_NAME "hessra_authz"
+#define HESSRA_RESULT_CACHE_NAME "hessra_authz result cache"
+
+// Share of the cache evicted at once when it is full
+#define HESSRA_RESULT_CACHE_EVICT_PERCENT 5
+
+// Digest domain separators for the different verification functions
+#define HESSRA_CACHE_KIND_TOKEN 't'
+#define HESSRA_CACHE_KIND_SERVICE_CHAIN 'c'
+#define HESSRA_CACHE_KIND_NAMED_SERVICE_CHAIN 'n'
+// The same, with the token given as hessra_token
+#define HESSRA_CACHE_KIND_BINARY_TOKEN 'T'
+#define HESSRA_CACHE_KIND_BINARY_SERVICE_CHAIN 'C'
+#define HESSRA_CACHE_KIND_BINARY_NAMED_SERVICE_CHAIN 'N'
+
+typedef struct HessraResultCacheKey
+{
+    uint8       digest[PG_SHA256_DIGEST_LENGTH];
+} HessraResultCacheKey;
+
+typedef struct HessraResultCacheEntry
+{
+    HessraResultCacheKey key;       /* hash key, must be first */
+    HessraResult result;
+    TimestampTz expires_at;
+    uint64      revocation_changes; /* revocation_changes before the verdict was computed */
+    pg_atomic_uint64 last_used;     /* access_clock value at the last hit */
+} HessraResultCacheEntry;
+
+/*
+ * Shared-memory revocation set.
+ *
+ * Mirrors the hessra_revoked_tokens table of each database: an exact hash
+ * set of the revoked ids, behind a Bloom filter so that a token that is not
+ * revoked costs a few bit tests. Ids are identified by two 64-bit hashes;
+ * a collision can only make a token look revoked, never the reverse.
+ *
+ * Rows inserted into the table are added by a trigger right away. Any other
+ * change (and a rolled back insert) bumps revocation_generation when the
+ * transaction ends, and the next verification in the database reloads its
+ * ids from the table. A marker entry per database records the generation
+ * its ids were loaded at. When the set is full, the marker is flagged
+ * incomplete and the table is queried instead. A database for which no
+ * marker fits is never loaded again by the backends that found so; they
+ * query the table.
+ */
+#define HESSRA_REVOKED_TOKENS_TABLE "hessra_revoked_tokens"
+#define HESSRA_REVOCATION_SET_NAME "hessra_authz revocation set"
+#define HESSRA_REVOCATION_FILTER_NAME "hessra_authz revocation filter"
+
+// Room for the markers of this many databases, on top of hessra.revocation_capacity
+#define HESSRA_REVOCATION_MAX_DATABASES 64
+
+// Bloom filter bits per revoked id and bits tested per id (about 1% false positives)
+#define HESSRA_REVOCATION_FILTER_BITS_PER_ID 10
+#define HESSRA_REVOCATION_FILTER_PROBES 7
+
+#define HESSRA_REVOCATION_HASH_SEED_1 UINT64CONST(0x6865737372612d31)
+#define HESSRA_REVOCATION_HASH_SEED_2 UINT64CONST(0x6865737372612d32)
+
+typedef struct HessraRevocationKey
+{
+    Oid         dboid;
+    uint32      is_marker;          /* the database's marker rather than an id */
+    uint64      hash[2];            /* of the revocation id; zero for markers */
+} HessraRevocationKey;
+
+typedef struct HessraRevocationEntry
+{
+    HessraRevocationKey key;        /* hash key, must be first */
+    /* The fields below are only used by markers */
+    uint64      generation;         /* revocation_generation the ids were loaded at */
+    uint64      count;              /* ids of the database in the set */
+    bool        complete;           /* every revoked id of the database is in the set */
+} HessraRevocationEntry;
+
+// Maximum number of revoked ids kept in shared memory, over all databases
+static int hessra_revocation_capacity = 10000;
+
+static HTAB *hessra_revocation_set = NULL;
+static uint64 *hessra_revocation_filter = NULL;
+
+// No marker fits in the revocation set for the current database
+static bool hessra_revocation_untracked = false;
+
+/*
+ * Changes to hessra_revoked_tokens made by the current transaction, set by
+ * its triggers and handled when the transaction ends.
+ */
+static bool hessra_revocations_inserted = false;
+static bool hessra_revocations_changed = false;
+// revocation_reloads_done when the transaction first inserted an id
+static uint64 hessra_revocation_reloads_seen = 0;
+
+/*
+ * Per-function verification statistics, shown by the pg_stat_hessra view.
+ *
+ * Kept in shared memory next to the result cache, so only available when
+ * preloaded. Each backend counts into hessra_pending_stats and adds its
+ * counts to the shared counters at the end of every transaction, or once
+ * HESSRA_STATS_FLUSH_CALLS calls are pending, so that verifying a row does
+ * not touch cache lines shared by every backend.
+ */
+typedef enum HessraStatFunction
+{
+    HESSRA_STAT_VERIFY_TOKEN,
+    HESSRA_STAT_VERIFY_TOKEN_DEFAULT,
+    HESSRA_STAT_VERIFY_SERVICE_CHAIN,
+    HESSRA_STAT_VERIFY_SERVICE_CHAIN_BY_NAME,
+    HESSRA_STAT_VERIFY_TOKEN_MANY,
+    HESSRA_STAT_VERIFY_SERVICE_CHAIN_MANY,
+    HESSRA_STAT_VERIFY_TOKENS,
+    HESSRA_STAT_SET_SESSION_TOKEN,
+    HESSRA_STAT_AUTHORIZED,
+    HESSRA_STAT_VERIFY_DETAILED,
+    HESSRA_STAT_NUM_FUNCTIONS
+} HessraStatFunction;
+
+static const char *const hessra_stat_function_names[HESSRA_STAT_NUM_FUNCTIONS] = {
+    "verify_hessra_token",
+    "verify_hessra_token_default",
+    "verify_hessra_service_chain",
+    "verify_hessra_service_chain_by_name",
+    "verify_hessra_token_many",
+    "verify_hessra_service_chain_many",
+    "verify_hessra_tokens",
+    "hessra_set_session_token",
+    "hessra_authorized",
+    "hessra_verify_detailed",
+};
+
+// Results SUCCESS .. ERROR_INVALID_PARAMETER are counted by code, anything else as unknown
+#define HESSRA_STAT_RESULT_UNKNOWN (ERROR_INVALID_PARAMETER + 1)
+#define HESSRA_STAT_NUM_RESULTS (HESSRA_STAT_RESULT_UNKNOWN + 1)
+
+// Bucket i counts calls taking [2^i, 2^(i+1)) microseconds; the first bucket
+// starts at 0 and the last one is open-ended
+#define HESSRA_STAT_HISTOGRAM_BUCKETS 24
+
+#define HESSRA_STATS_FLUSH_CALLS 1000
+
+// Columns of hessra_stat_functions(): function, calls, the results, cache
+// hits and misses, three times, the histogram and stats_reset
+#define HESSRA_STAT_COLUMNS (HESSRA_STAT_NUM_RESULTS + 9)
+
+// All members are uint64, so the struct can be added to the shared counters as an array
+typedef struct HessraFunctionCounters
+{
+    uint64      calls;
+    uint64      results[HESSRA_STAT_NUM_RESULTS];
+    uint64      cache_hits;
+    uint64      cache_misses;
+    uint64      key_load_time_us;   /* loading keys and service chain configuration */
+    uint64      verify_time_us;     /* everything after that */
+    uint64      latency_histogram[HESSRA_STAT_HISTOGRAM_BUCKETS];
+} HessraFunctionCounters;
+
+#define HESSRA_STAT_NUM_COUNTERS (sizeof(HessraFunctionCounters) / sizeof(uint64))
+
+// The call being timed, if any
+typedef struct HessraCallStats
+{
+    int         function;           /* HessraStatFunction, -1 outside a call */
+    instr_time  start;
+    instr_time  key_loaded;
+} HessraCallStats;
+
+static HessraFunctionCounters hessra_pending_stats[HESSRA_STAT_NUM_FUNCTIONS];
+static uint64 hessra_pending_calls = 0;
+static HessraCallStats hessra_current_call = {-1};
+
+/*
+ * Key watcher.
+ *
+ * When preloaded, a background worker checks the key file of the server's
+ * hessra.public_key_path every hessra.key_check_interval milliseconds and
+ * keeps a copy of its contents in shared memory. Backends using the same
+ * path compare the watcher's generation counter instead of calling stat()
+ * on every verification, and parse a rotated key from the shared copy.
+ * Keys in the hessra_public_keys table and service chains need no watcher:
+ * the hessra_config_changed trigger already invalidates them in every
+ * backend when the changing transaction commits.
+ */
+#define HESSRA_KEY_WATCHER_NAME "hessra key watcher"
+
+// Largest key file kept in shared memory; PEM public keys are far smaller
+#define HESSRA_KEY_PEM_MAX 8192
+
+// Milliseconds between checks of the key file
+static int hessra_key_check_interval = 1000;
+
+typedef struct HessraSharedState
+{
+    LWLock     *lock;               /* protects the result cache hash table */
+    pg_atomic_uint64 access_clock;  /* monotonic counter driving the LRU */
+    pg_atomic_uint64 cache_hits;
+    pg_atomic_uint64 cache_misses;
+    pg_atomic_uint64 stats_reset;   /* TimestampTz of the last hessra_stat_reset */
+    pg_atomic_uint64 function_stats[HESSRA_STAT_NUM_FUNCTIONS][HESSRA_STAT_NUM_COUNTERS];
+    LWLock     *revocation_lock;    /* protects the revocation set and filter */
+    uint64      revocation_count;   /* ids in the revocation set */
+    pg_atomic_uint64 revocation_generation;     /* bumped when ids must be reloaded */
+    pg_atomic_uint64 revocation_changes;        /* bumped whenever revocations change */
+    pg_atomic_uint64 revocation_reloads_started;
+    pg_atomic_uint64 revocation_reloads_done;
+    LWLock     *key_lock;           /* protects the key watcher state below */
+    pg_atomic_uint64 key_generation;    /* bumped whenever the watched key file changes */
+    char        key_path[MAXPGPATH];    /* file watched by the key watcher, "" if none */
+    bool        key_loaded;         /* key_pem holds a valid key read from key_path */
+    HessraKeyFileId key_file;
+    char        key_pem[HESSRA_KEY_PEM_MAX];
+} HessraSharedState;
+
+// Result cache size in entries, 0 disables the cache
+static int hessra_result_cache_size = 8192;
+// Upper bound on the lifetime of a cached verdict, in seconds
+static int hessra_result_cache_ttl = 60;
+
+// Worker threads used by verify_hessra_tokens
+static int hessra_bulk_workers = 4;
+
+// Authorizer templates kept by the token library of each backend, 0 disables the cache
+static int hessra_authorizer_cache_size = 1000;
+
+// Number of tokens handed to the worker threads at a time; interrupts are
+// checked between chunks
+#define HESSRA_BULK_CHUNK_SIZE 4096
+
+// Share of a verification's declared COST spent in the authorization step.
+// The rest is deserialization and signature checks, paid once per statement
+// when the token does not change from row to row.
+#define HESSRA_AUTHORIZE_COST_FRACTION 0.1
+
+static HessraSharedState *hessra_shared = NULL;
+static HTAB *hessra_result_cache = NULL;
+
+#if PG_VERSION_NUM >= 150000
+static shmem_request_hook_type prev_shmem_request_hook = NULL;
+#endif
+static shmem_startup_hook_type prev_shmem_startup_hook = NULL;
+
 // --- Function Prototypes ---
 
 PG_FUNCTION_INFO_V1(pg_verify_hessra_token);
 PG_FUNCTION_INFO_V1(pg_verify_hessra_service_chain);
+PG_FUNCTION_INFO_V1(pg_verify_hessra_token_default);
+PG_FUNCTION_INFO_V1(pg_verify_hessra_service_chain_by_name);
+PG_FUNCTION_INFO_V1(pg_verify_hessra_token_binary);
+PG_FUNCTION_INFO_V1(pg_verify_hessra_service_chain_binary);
+PG_FUNCTION_INFO_V1(pg_verify_hessra_token_default_binary);
+PG_FUNCTION_INFO_V1(pg_verify_hessra_service_chain_by_name_binary);
+PG_FUNCTION_INFO_V1(pg_hessra_verify_detailed);
+PG_FUNCTION_INFO_V1(pg_hessra_verify_detailed_binary);
+PG_FUNCTION_INFO_V1(pg_verify_hessra_token_many);
+PG_FUNCTION_INFO_V1(pg_verify_hessra_service_chain_many);
+PG_FUNCTION_INFO_V1(pg_verify_hessra_tokens);
+PG_FUNCTION_INFO_V1(pg_hessra_set_session_token);
+PG_FUNCTION_INFO_V1(pg_hessra_clear_session_token);
+PG_FUNCTION_INFO_V1(pg_hessra_authorized);
+PG_FUNCTION_INFO_V1(pg_hessra_verify_support);
+PG_FUNCTION_INFO_V1(pg_hessra_config_changed);
+PG_FUNCTION_INFO_V1(pg_hessra_revocations_changed);
+PG_FUNCTION_INFO_V1(pg_hessra_token_revocation_ids);
+PG_FUNCTION_INFO_V1(pg_hessra_result_cache_stats);
+PG_FUNCTION_INFO_V1(pg_hessra_result_cache_flush);
+PG_FUNCTION_INFO_V1(pg_hessra_authorizer_cache_stats);
+PG_FUNCTION_INFO_V1(pg_hessra_stat_functions);
+PG_FUNCTION_INFO_V1(pg_hessra_stat_reset);
+PG_FUNCTION_INFO_V1(pg_hessra_token_in);
+PG_FUNCTION_INFO_V1(pg_hessra_token_out);
+PG_FUNCTION_INFO_V1(pg_hessra_token_recv);
+PG_FUNCTION_INFO_V1(pg_hessra_token_send);
 void _PG_init(void);
+PGDLLEXPORT void hessra_key_watcher_main(Datum main_arg);
+
+static void hessra_public_key_path_assign(const char *newval, void *extra);
+static const char *hessra_resolve_key_path(void);
+static HessraKey *hessra_get_public_key(void);
+static void hessra_key_file_id(const struct stat *st, HessraKeyFileId *id);
+static HessraKey *hessra_get_watched_key(const char *key_path);
+static char *hessra_read_key_file(const char *key_path, HessraKeyFileId *file);
+static void hessra_key_cache_install(const char *key_path, const HessraKeyFileId *file, const char *pem,
+                                     HessraKey *public_key, uint64 watch_generation);
+static void hessra_key_load_failed(const char *key_path, HessraResult key_load_result);
+static void hessra_key_watcher_check(void);
+static HessraKey *hessra_get_default_key(FunctionCallInfo fcinfo);
+static void hessra_relcache_callback(Datum arg, Oid relid);
+static char *hessra_config_table(FunctionCallInfo fcinfo, const char *relname, Oid *relid);
+static HessraServiceChainEntry *hessra_get_service_chain(FunctionCallInfo fcinfo, text *service_name_text);
+static void hessra_service_chain_cache_reset(void);
+static HessraHandleGuard *hessra_handle_guard(HessraHandleKind kind);
+static HessraHandleGuard *hessra_handle_guard_array(HessraHandleKind kind, uintptr_t nhandles);
+static void hessra_handle_free(HessraHandleKind kind, void *handle);
+static void hessra_handle_release(void *arg);
+static void hessra_preload(void);
+static void hessra_preload_service_chains(const char *path);
+static void hessra_preload_failed(MemoryContext context, const char *what);
+static void hessra_session_token_id_assign(const char *newval, void *extra);
+static void hessra_authorizer_cache_size_assign(int newval, void *extra);
+static void hessra_session_token_reset(void);
+static bool hessra_is_row_independent(Node *arg);
+static ArrayType *hessra_build_bool_array(ArrayType *source, Datum *values, bool *nulls, int nelems);
+static pg_cryptohash_ctx *hessra_digest_begin(void);
+static void hessra_digest_update(pg_cryptohash_ctx *ctx, const void *data, size_t len);
+static void hessra_digest_finish(pg_cryptohash_ctx *ctx, uint8 *digest);
+static HessraResult hessra_get_parsed_token(FunctionCallInfo fcinfo, text *token_text, bool binary_token,
+                                            HessraKey *public_key, HessraToken **parsed);
+
+static Size hessra_shmem_size(void);
+static void hessra_shmem_request(void);
+static void hessra_shmem_startup(void);
+static void hessra_result_cache_key(HessraResultCacheKey *key, char kind, const uint8 *key_fingerprint,
+                                    text **args, int nargs);
+static bool hessra_result_cache_lookup(const HessraResultCacheKey *key, HessraResult *result);
+static void hessra_result_cache_store(const HessraResultCacheKey *key, HessraResult result, const HessraToken *parsed,
+                                      uint64 revocation_changes);
+static void hessra_result_cache_evict(TimestampTz now);
+static uint64 hessra_revocation_changes(void);
+static void hessra_revocation_key(HessraRevocationKey *key, const uint8 *id, size_t len);
+static void hessra_revocation_marker_key(HessraRevocationKey *key);
+static bool hessra_revocation_add(const HessraRevocationKey *key);
+static void hessra_revocation_filter_set(const HessraRevocationKey *key);
+static bool hessra_revocation_filter_test(const HessraRevocationKey *key);
+static void hessra_revocation_set_load(FunctionCallInfo fcinfo);
+static bool hessra_revoked_in_table(FunctionCallInfo fcinfo, const HessraRevocationIds *ids);
+static bool hessra_ids_are_revoked(FunctionCallInfo fcinfo, const HessraRevocationIds *ids);
+static bool hessra_token_is_revoked(FunctionCallInfo fcinfo, const HessraToken *token);
+static void hessra_revocation_xact_callback(XactEvent event, void *arg);
+static void hessra_revocation_subxact_callback(SubXactEvent event, SubTransactionId subid,
+                                               SubTransactionId parent_subid, void *arg);
+static void hessra_stats_begin(HessraStatFunction function);
+static void hessra_stats_key_loaded(void);
+static void hessra_stats_result(HessraResult result);
+static void hessra_stats_cache(bool hit);
+static void hessra_stats_end(void);
+static void hessra_stats_abort(HessraResult result);
+static void hessra_stats_flush(void);
+static void hessra_stats_xact_callback(XactEvent event, void *arg);
+static Datum hessra_verify_token(FunctionCallInfo fcinfo, bool binary_token);
+static Datum hessra_verify_token_default(FunctionCallInfo fcinfo, bool binary_token);
+static Datum hessra_verify_service_chain(FunctionCallInfo fcinfo, bool binary_token);
+static Datum hessra_verify_service_chain_by_name(FunctionCallInfo fcinfo, bool binary_token);
+static bool hessra_verify_token_with_key(FunctionCallInfo fcinfo, HessraKey *public_key,
+                                         const uint8 *key_fingerprint, text *token_text, bool binary_token,
+                                         text *subject_text, text *resource_text);
+static bool hessra_verify_service_chain_with_key(FunctionCallInfo fcinfo, HessraKey *public_key,
+                                                 const uint8 *key_fingerprint, text *token_text, bool binary_token,
+                                                 text *subject_text, text *resource_text,
+                                                 text *service_nodes_json_text,
+                                                 const HessraServiceChain *service_chain,
+                                                 text *component_text);
 
 // --- Module Init Function ---
 
@@ -44,6 +609,13 @@ void _PG_init(void);
 void
 _PG_init(void)
 {
+    BackgroundWorker worker;
+
+    if (hessra_init() != SUCCESS)
+        ereport(ERROR,
+                (errcode(ERRCODE_EXTERNAL_ROUTINE_INVOCATION_EXCEPTION),
+                 errmsg("Failed to initialize the Hessra library")));
+
     /* Define custom GUC variables */
     DefineCustomStringVariable(
         "hessra.public_key_path",                  /* name */
@@ -54,224 +626,3651 @@ _PG_init(void)
         PGC_USERSET,                               /* context */
         0,                                         /* flags */
         NULL,                                      /* check_hook */
-        NULL,                                      /* assign_hook */
+        hessra_public_key_path_assign,             /* assign_hook */
         NULL                                       /* show_hook */
     );
 
+    DefineCustomIntVariable(
+        "hessra.result_cache_size",
+        "Number of verification results kept in the shared result cache",
+        "Only used when hessra_authz is loaded via shared_preload_libraries. 0 disables the cache.",
+        &hessra_result_cache_size,
+        8192,
+        0,
+        INT_MAX / 2,
+        PGC_POSTMASTER,
+        0,
+        NULL,
+        NULL,
+        NULL
+    );
+
+    DefineCustomIntVariable(
+        "hessra.result_cache_ttl",
+        "Maximum lifetime of a cached verification result",
+        "Cached results never outlive the expiry of the token they were computed for. 0 disables caching of new results.",
+        &hessra_result_cache_ttl,
+        60,
+        0,
+        INT_MAX / 1000,
+        PGC_SIGHUP,
+        GUC_UNIT_S,
+        NULL,
+        NULL,
+        NULL
+    );
+
+    DefineCustomIntVariable(
+        "hessra.revocation_capacity",
+        "Number of revoked token ids kept in shared memory",
+        "Only used when hessra_authz is loaded via shared_preload_libraries. When more tokens are revoked, or with 0, hessra_revoked_tokens is queried on every verification.",
+        &hessra_revocation_capacity,
+        10000,
+        0,
+        INT_MAX / (2 * HESSRA_REVOCATION_FILTER_BITS_PER_ID),
+        PGC_POSTMASTER,
+        0,
+        NULL,
+        NULL,
+        NULL
+    );
+
+    DefineCustomStringVariable(
+        "hessra.session_token_id",
+        "Identifies the token set by hessra_set_session_token",
+        "Managed by hessra_set_session_token; resetting it clears the session token.",
+        &hessra_session_token_id,
+        "",
+        PGC_USERSET,
+        GUC_NO_SHOW_ALL | GUC_NOT_IN_SAMPLE | GUC_DISALLOW_IN_FILE,
+        NULL,
+        hessra_session_token_id_assign,
+        NULL
+    );
+
+    DefineCustomIntVariable(
+        "hessra.bulk_workers",
+        "Number of threads verify_hessra_tokens verifies tokens on",
+        "The threads only run the token library; they never call into PostgreSQL.",
+        &hessra_bulk_workers,
+        4,
+        1,
+        64,
+        PGC_USERSET,
+        0,
+        NULL,
+        NULL,
+        NULL
+    );
+
+    DefineCustomIntVariable(
+        "hessra.authorizer_cache_size",
+        "Number of authorizer templates cached per backend",
+        "Templates are kept per resource, component and service chain; only the subject and the current time are added per check. 0 disables the cache.",
+        &hessra_authorizer_cache_size,
+        1000,
+        0,
+        INT_MAX,
+        PGC_USERSET,
+        0,
+        NULL,
+        hessra_authorizer_cache_size_assign,
+        NULL
+    );
+
+    DefineCustomIntVariable(
+        "hessra.key_check_interval",
+        "Time between checks of the public key file by the key watcher",
+        "Only used when hessra_authz is loaded via shared_preload_libraries. A rotated key file is picked up within this time.",
+        &hessra_key_check_interval,
+        1000,
+        100,
+        3600 * 1000,
+        PGC_SIGHUP,
+        GUC_UNIT_MS,
+        NULL,
+        NULL,
+        NULL
+    );
+
+    DefineCustomStringVariable(
+        "hessra.service_chains_file",
+        "File with service chain configurations loaded at server start",
+        "A JSON object mapping service names to service chain configurations. Only read when hessra_authz is preloaded; used for services without a row in hessra_service_chains.",
+        &hessra_service_chains_file,
+        "",
+        PGC_POSTMASTER,
+        0,
+        NULL,
+        NULL,
+        NULL
+    );
+
     ereport(DEBUG1,
             (errmsg("Hessra PostgreSQL extension initialized. Default public key path: %s", 
                     HESSRA_PUBLIC_KEY_PATH)));
+
+    // Shared memory can only be requested when preloaded by the postmaster
+    if (!process_shared_preload_libraries_in_progress)
+        return;
+
+#if PG_VERSION_NUM >= 150000
+    prev_shmem_request_hook = shmem_request_hook;
+    shmem_request_hook = hessra_shmem_request;
+#else
+    hessra_shmem_request();
+#endif
+    prev_shmem_startup_hook = shmem_startup_hook;
+    shmem_startup_hook = hessra_shmem_startup;
+
+    RegisterXactCallback(hessra_stats_xact_callback, NULL);
+    RegisterXactCallback(hessra_revocation_xact_callback, NULL);
+    RegisterSubXactCallback(hessra_revocation_subxact_callback, NULL);
+
+    memset(&worker, 0, sizeof(worker));
+    worker.bgw_flags = BGWORKER_SHMEM_ACCESS;
+    worker.bgw_start_time = BgWorkerStart_PostmasterStart;
+    worker.bgw_restart_time = 10;
+    strlcpy(worker.bgw_library_name, "hessra_authz", sizeof(worker.bgw_library_name));
+    strlcpy(worker.bgw_function_name, "hessra_key_watcher_main", sizeof(worker.bgw_function_name));
+    strlcpy(worker.bgw_name, HESSRA_KEY_WATCHER_NAME, sizeof(worker.bgw_name));
+    strlcpy(worker.bgw_type, HESSRA_KEY_WATCHER_NAME, sizeof(worker.bgw_type));
+    RegisterBackgroundWorker(&worker);
+
+    // Backends forked from the postmaster inherit whatever it loads here
+    if (!IsUnderPostmaster)
+        hessra_preload();
 }
 
-// --- Function Definitions ---
+// --- Preloading ---
 
-/**
- * SQL-callable function to verify a Hessra token.
- *
- * Args:
- *   PG_GETARG_TEXT_PP(0): The Hessra token string.
- *   PG_GETARG_TEXT_PP(1): The required subject string.
- *   PG_GETARG_TEXT_PP(2): The required resource string.
+/*
+ * hessra_preload
  *
- * Returns:
- *   Boolean indicating if the token is valid and grants the permission.
+ * Runs in the postmaster when preloaded. Loads the public key from
+ * hessra.public_key_path and the service chains from
+ * hessra.service_chains_file once, so that new backends start with warm
+ * caches instead of loading them on first use. Failures are logged and
+ * leave loading to the backends.
  */
-Datum
-pg_verify_hessra_token(PG_FUNCTION_ARGS)
+static void
+hessra_preload(void)
 {
-    text *token_text = PG_GETARG_TEXT_PP(0);
-    text *subject_text = PG_GETARG_TEXT_PP(1);
-    text *resource_text = PG_GETARG_TEXT_PP(2);
-
-    char *token_cstr = text_to_cstring(token_text);
-    char *subject_cstr = text_to_cstring(subject_text);
-    char *resource_cstr = text_to_cstring(resource_text);
+    MemoryContext context = CurrentMemoryContext;
+    ResourceOwner owner;
 
-    HessraPublicKey *public_key = NULL;
-    HessraResult key_load_result;
-    HessraResult verify_result;
-    bool is_valid = false;
-    char *key_path_cstr = NULL;
+    // Digests are tracked by the current resource owner, which the postmaster does not have
+    owner = ResourceOwnerCreate(NULL, "hessra_authz preload");
+    CurrentResourceOwner = owner;
 
-    // TODO: Implement proper initialization (e.g., via _PG_init)
-    // hessra_init(); // Consider where/how often to call this
+    PG_TRY();
+    {
+        (void) hessra_get_public_key();
+    }
+    PG_CATCH();
+    {
+        hessra_preload_failed(context, "public key");
+    }
+    PG_END_TRY();
 
-    // 1. First check if there's a custom path configured in PostgreSQL settings
-    if (hessra_public_key_path != NULL && hessra_public_key_path[0] != '\0') {
-        // Use the config-specified path
-        key_path_cstr = hessra_public_key_path;
-        ereport(DEBUG1,
-                (errcode(ERRCODE_SUCCESSFUL_COMPLETION),
-                 errmsg("Using configured key path: %s", key_path_cstr)));
-    } else {
-        // Fall back to the default path
-        key_path_cstr = HESSRA_PUBLIC_KEY_PATH;
-        ereport(DEBUG1,
-                (errcode(ERRCODE_SUCCESSFUL_COMPLETION),
-                 errmsg("Using default key path: %s", key_path_cstr)));
+    if (hessra_service_chains_file != NULL && hessra_service_chains_file[0] != '\0') {
+        PG_TRY();
+        {
+            hessra_preload_service_chains(hessra_service_chains_file);
+        }
+        PG_CATCH();
+        {
+            hessra_preload_failed(context, "service chains");
+        }
+        PG_END_TRY();
     }
 
-    // 2. Load the public key from the determined path
-    key_load_result = hessra_public_key_from_file(key_path_cstr, &public_key);
+    CurrentResourceOwner = NULL;
+    ResourceOwnerRelease(owner, RESOURCE_RELEASE_BEFORE_LOCKS, false, true);
+    ResourceOwnerRelease(owner, RESOURCE_RELEASE_LOCKS, false, true);
+    ResourceOwnerRelease(owner, RESOURCE_RELEASE_AFTER_LOCKS, false, true);
+    ResourceOwnerDelete(owner);
+}
 
-    if (key_load_result != SUCCESS || public_key == NULL) {
-        char *err_msg = hessra_error_message(key_load_result);
-        char *safe_err_msg = (err_msg != NULL) ? err_msg : "Unknown key loading error";
+/*
+ * hessra_preload_failed
+ *
+ * Error handler of hessra_preload: logs the error and carries on.
+ */
+static void
+hessra_preload_failed(MemoryContext context, const char *what)
+{
+    ErrorData *edata;
+
+    MemoryContextSwitchTo(context);
+    edata = CopyErrorData();
+    FlushErrorState();
+
+    ereport(LOG,
+            (errmsg("Hessra %s not preloaded: %s", what, edata->message)));
+
+    FreeErrorData(edata);
+}
+
+/*
+ * hessra_preload_service_chains
+ *
+ * Loads the service chains of path into hessra_preloaded_chains. A chain's
+ * fingerprint identifies the file version and the service, like the
+ * fingerprint of a key file.
+ */
+static void
+hessra_preload_service_chains(const char *path)
+{
+    struct stat st;
+    HessraResult load_result;
+    HASHCTL ctl;
+    size_t nchains;
+    size_t i;
+
+    if (stat(path, &st) != 0)
         ereport(ERROR,
-                (errcode(ERRCODE_EXTERNAL_ROUTINE_INVOCATION_EXCEPTION),
-                 errmsg("Failed to load Hessra public key from %s: %s", key_path_cstr, safe_err_msg)));
+                (errcode_for_file_access(),
+                 errmsg("Failed to load Hessra service chains from %s: %m", path)));
+
+    load_result = hessra_service_chain_set_from_file(path, &hessra_preloaded_chain_set);
+    if (load_result != SUCCESS) {
+        char *err_msg = hessra_error_message(load_result);
+        char *safe_err_msg = pstrdup((err_msg != NULL) ? err_msg : "Unknown configuration error");
+
         if (err_msg != NULL) {
             hessra_string_free(err_msg);
         }
-        // Cleanup arguments even on error before returning
-        pfree(token_cstr);
-        pfree(subject_cstr);
-        pfree(resource_cstr);
-        PG_RETURN_BOOL(false); // Or throw error
+        ereport(ERROR,
+                (errcode(ERRCODE_CONFIG_FILE_ERROR),
+                 errmsg("Failed to load Hessra service chains from %s: %s", path, safe_err_msg)));
     }
 
-    // 3. Call the Rust FFI verification function
-    verify_result = hessra_token_verify(token_cstr, public_key, subject_cstr, resource_cstr);
+    nchains = hessra_service_chain_set_len(hessra_preloaded_chain_set);
 
-    // 4. Process the result
-    if (verify_result == SUCCESS) {
-        is_valid = true;
-    } else {
-        is_valid = false;
-        // Optional: Log specific verification failures as NOTICE or WARNING instead of ERROR?
-        // char *err_msg = hessra_error_message(verify_result);
-        // char *safe_err_msg = (err_msg != NULL) ? err_msg : "Unknown verification error";
-        // ereport(NOTICE, (errmsg("Hessra token verification failed: %s", safe_err_msg)));
-        // if (err_msg != NULL) {
-        //     hessra_string_free(err_msg);
-        // }
-    }
+    memset(&ctl, 0, sizeof(ctl));
+    ctl.keysize = PG_SHA256_DIGEST_LENGTH;
+    ctl.entrysize = sizeof(HessraServiceChainEntry);
+    hessra_preloaded_chains = hash_create("Hessra preloaded service chains", Max(nchains, 16),
+                                          &ctl, HASH_ELEM | HASH_BLOBS);
+
+    for (i = 0; i < nchains; i++) {
+        const char *name = hessra_service_chain_set_name(hessra_preloaded_chain_set, i);
+        uint8 name_digest[PG_SHA256_DIGEST_LENGTH];
+        HessraServiceChainEntry *entry;
+        pg_cryptohash_ctx *ctx;
+
+        ctx = hessra_digest_begin();
+        hessra_digest_update(ctx, name, strlen(name));
+        hessra_digest_finish(ctx, name_digest);
 
-    // 5. Clean up allocated resources
-    if (public_key != NULL) {
-        hessra_public_key_free(public_key);
+        entry = hash_search(hessra_preloaded_chains, name_digest, HASH_ENTER, NULL);
+        entry->found = true;
+        entry->parse_result = SUCCESS;
+        // Owned by hessra_preloaded_chain_set, which is never freed
+        entry->chain = (HessraServiceChain *) hessra_service_chain_set_chain(hessra_preloaded_chain_set, i);
+        entry->preloaded = true;
+
+        ctx = hessra_digest_begin();
+        hessra_digest_update(ctx, "file", 4);
+        hessra_digest_update(ctx, path, strlen(path));
+        hessra_digest_update(ctx, &st.st_dev, sizeof(st.st_dev));
+        hessra_digest_update(ctx, &st.st_ino, sizeof(st.st_ino));
+        hessra_digest_update(ctx, &st.st_mtime, sizeof(st.st_mtime));
+        hessra_digest_update(ctx, &st.st_size, sizeof(st.st_size));
+        hessra_digest_update(ctx, name, strlen(name));
+        hessra_digest_finish(ctx, entry->fingerprint);
     }
-    pfree(token_cstr);
-    pfree(subject_cstr);
-    pfree(resource_cstr);
 
-    // 6. Return the boolean result
-    PG_RETURN_BOOL(is_valid);
+    ereport(LOG,
+            (errmsg("Hessra preloaded %zu service chains from %s", nchains, path)));
 }
 
-/**
- * SQL-callable function to verify a Hessra service chain token.
+// --- Public Key Cache ---
+
+/*
+ * hessra_public_key_path_assign
  *
- * Args:
- *   PG_GETARG_TEXT_PP(0): The Hessra token string.
- *   PG_GETARG_TEXT_PP(1): The required subject string.
- *   PG_GETARG_TEXT_PP(2): The required resource string.
- *   PG_GETARG_TEXT_PP(3): JSON array of service node objects with component and public_key fields.
- *   PG_GETARG_TEXT_PP(4): The component name to check in the service chain.
+ * Assign hook for hessra.public_key_path. Any change of the setting (SET,
+ * RESET, ALTER SYSTEM + reload) drops the cached key so the next verification
+ * loads the key from the new location. The key itself is released lazily by
+ * hessra_get_public_key, since assign hooks must not fail.
+ */
+static void
+hessra_public_key_path_assign(const char *newval, void *extra)
+{
+    hessra_key_cache.valid = false;
+}
+
+/*
+ * hessra_resolve_key_path
  *
- * Returns:
- *   Boolean indicating if the token is valid and grants the permission for the service chain.
+ * Returns the configured public key path, falling back to the default path
+ * when the setting is empty.
  */
-Datum
-pg_verify_hessra_service_chain(PG_FUNCTION_ARGS)
+static const char *
+hessra_resolve_key_path(void)
 {
-    text *token_text = PG_GETARG_TEXT_PP(0);
-    text *subject_text = PG_GETARG_TEXT_PP(1);
-    text *resource_text = PG_GETARG_TEXT_PP(2);
-    text *service_nodes_json_text = PG_GETARG_TEXT_PP(3);
-    text *component_text = PG_GETARG_TEXT_PP(4);
+    if (hessra_public_key_path != NULL && hessra_public_key_path[0] != '\0')
+        return hessra_public_key_path;
 
-    char *token_cstr = text_to_cstring(token_text);
-    char *subject_cstr = text_to_cstring(subject_text);
-    char *resource_cstr = text_to_cstring(resource_text);
-    char *service_nodes_json_cstr = text_to_cstring(service_nodes_json_text);
-    char *component_cstr = text_to_cstring(component_text);
+    return HESSRA_PUBLIC_KEY_PATH;
+}
 
-    HessraPublicKey *public_key = NULL;
+/*
+ * hessra_get_public_key
+ *
+ * Returns the public key for the current hessra.public_key_path, loading and
+ * parsing the PEM file only when the path or the file itself has changed since
+ * the last call. When the key watcher watches the path, its shared copy of
+ * the file is used instead of the file. The returned key is owned by the cache
+ * and must not be freed by the caller. Raises an ERROR if the key cannot be
+ * loaded.
+ */
+static HessraKey *
+hessra_get_public_key(void)
+{
+    const char *key_path;
+    struct stat st;
+    HessraKeyFileId file;
+    HessraKey *public_key = NULL;
     HessraResult key_load_result;
-    HessraResult verify_result;
-    bool is_valid = false;
-    char *key_path_cstr = NULL;
-    char *err_msg = NULL;
-    char *safe_err_msg = NULL;
+    char *pem;
 
-    // 1. First check if there's a custom path configured in PostgreSQL settings
-    if (hessra_public_key_path != NULL && hessra_public_key_path[0] != '\0') {
-        // Use the config-specified path
-        key_path_cstr = hessra_public_key_path;
-        ereport(DEBUG1,
-                (errcode(ERRCODE_SUCCESSFUL_COMPLETION),
-                 errmsg("Using configured key path: %s", key_path_cstr)));
-    } else {
-        // Fall back to the default path
-        key_path_cstr = HESSRA_PUBLIC_KEY_PATH;
-        ereport(DEBUG1,
-                (errcode(ERRCODE_SUCCESSFUL_COMPLETION),
-                 errmsg("Using default key path: %s", key_path_cstr)));
-    }
+    // Nothing changed since the key watcher last checked the file
+    if (hessra_key_cache.valid &&
+        hessra_key_cache.key != NULL &&
+        hessra_key_cache.watch_generation != 0 &&
+        hessra_key_cache.watch_generation == pg_atomic_read_u64(&hessra_shared->key_generation))
+        return hessra_key_cache.key;
 
-    // 2. Load the public key from the determined path
-    key_load_result = hessra_public_key_from_file(key_path_cstr, &public_key);
+    key_path = hessra_resolve_key_path();
 
-    if (key_load_result != SUCCESS || public_key == NULL) {
-        char *err_msg = hessra_error_message(key_load_result);
-        char *safe_err_msg = (err_msg != NULL) ? err_msg : "Unknown key loading error";
+    if (hessra_shared != NULL) {
+        public_key = hessra_get_watched_key(key_path);
+        if (public_key != NULL)
+            return public_key;
+    }
+
+    if (stat(key_path, &st) != 0) {
+        hessra_stats_abort(ERROR_IO);
         ereport(ERROR,
-                (errcode(ERRCODE_EXTERNAL_ROUTINE_INVOCATION_EXCEPTION),
-                 errmsg("Failed to load Hessra public key from %s: %s", key_path_cstr, safe_err_msg)));
-        if (err_msg != NULL) {
-            hessra_string_free(err_msg);
-        }
-        // Cleanup arguments even on error before returning
-        pfree(token_cstr);
-        pfree(subject_cstr);
-        pfree(resource_cstr);
-        pfree(service_nodes_json_cstr);
-        pfree(component_cstr);
-        PG_RETURN_BOOL(false);
+                (errcode_for_file_access(),
+                 errmsg("Failed to load Hessra public key from %s: %m", key_path)));
     }
+    hessra_key_file_id(&st, &file);
 
-    // 3. Call the Rust FFI service chain verification function
-    verify_result = hessra_token_verify_service_chain(
-        token_cstr,
-        public_key,
-        subject_cstr,
-        resource_cstr,
-        service_nodes_json_cstr,
-        component_cstr
-    );
+    if (hessra_key_cache.valid &&
+        hessra_key_cache.key != NULL &&
+        strcmp(hessra_key_cache.path, key_path) == 0 &&
+        memcmp(&hessra_key_cache.file, &file, sizeof(file)) == 0) {
+        hessra_key_cache.watch_generation = 0;
+        return hessra_key_cache.key;
+    }
 
-    // 4. Process the result
-    if (verify_result == SUCCESS) {
-        is_valid = true;
-    } else {
-        is_valid = false;
-        // Log specific verification failures for debugging
-        err_msg = hessra_error_message(verify_result);
-        safe_err_msg = (err_msg != NULL) ? err_msg : "Unknown verification error";
+    ereport(DEBUG1,
+            (errmsg("Loading Hessra public key from %s", key_path)));
 
-        // Only log at DEBUG level in production; can use NOTICE during development
-        ereport(DEBUG1,
-                (errmsg("Hessra service chain verification failed: %s", safe_err_msg)));
+    pem = hessra_read_key_file(key_path, &file);
+    key_load_result = hessra_key_from_string(pem, &public_key);
+
+    if (key_load_result != SUCCESS || public_key == NULL)
+        hessra_key_load_failed(key_path, key_load_result);
+
+    hessra_key_cache_install(key_path, &file, pem, public_key, 0);
+    pfree(pem);
+
+    return public_key;
+}
+
+/*
+ * hessra_read_key_file
+ *
+ * Returns the contents of the key file as a palloc'd string and fills in
+ * the identity of the file read. Raises an ERROR if it cannot be read.
+ */
+static char *
+hessra_read_key_file(const char *key_path, HessraKeyFileId *file)
+{
+    struct stat st;
+    char *pem = NULL;
+    ssize_t nread = -1;
+    int save_errno;
+    int fd;
+
+    fd = OpenTransientFile(key_path, O_RDONLY | PG_BINARY);
+    if (fd >= 0 && fstat(fd, &st) == 0) {
+        pem = palloc(st.st_size + 1);
+        nread = read(fd, pem, st.st_size);
+    }
+    save_errno = errno;
+    if (fd >= 0)
+        CloseTransientFile(fd);
+
+    if (pem == NULL || nread != st.st_size) {
+        errno = save_errno;
+        hessra_stats_abort(ERROR_IO);
+        ereport(ERROR,
+                (errcode_for_file_access(),
+                 errmsg("Failed to load Hessra public key from %s: %m", key_path)));
+    }
+
+    hessra_key_file_id(&st, file);
+    pem[nread] = '\0';
+
+    return pem;
+}
+
+/*
+ * hessra_key_file_id
+ *
+ * Fills in the identity of a key file from its stat() result. Padding is
+ * zeroed so identities can be compared with memcmp.
+ */
+static void
+hessra_key_file_id(const struct stat *st, HessraKeyFileId *id)
+{
+    memset(id, 0, sizeof(*id));
+    id->dev = st->st_dev;
+    id->ino = st->st_ino;
+    id->mtime = st->st_mtime;
+    id->size = st->st_size;
+}
+
+/*
+ * hessra_get_watched_key
+ *
+ * Returns the key from the key watcher's shared copy of key_path, parsing it
+ * only if the cached key came from another file. Returns NULL if the watcher
+ * watches another path or could not read a valid key from it, in which case
+ * the caller loads the file itself.
+ */
+static HessraKey *
+hessra_get_watched_key(const char *key_path)
+{
+    HessraKeyFileId file;
+    uint64 generation;
+    char *pem;
+    HessraKey *public_key = NULL;
+    HessraResult key_load_result;
+
+    LWLockAcquire(hessra_shared->key_lock, LW_SHARED);
+
+    if (!hessra_shared->key_loaded || strcmp(hessra_shared->key_path, key_path) != 0) {
+        LWLockRelease(hessra_shared->key_lock);
+        return NULL;
+    }
+
+    generation = pg_atomic_read_u64(&hessra_shared->key_generation);
+    file = hessra_shared->key_file;
+
+    // Still the file the cached key was loaded from, e.g. by the postmaster
+    if (hessra_key_cache.valid &&
+        hessra_key_cache.key != NULL &&
+        strcmp(hessra_key_cache.path, key_path) == 0 &&
+        memcmp(&hessra_key_cache.file, &file, sizeof(file)) == 0) {
+        LWLockRelease(hessra_shared->key_lock);
+        hessra_key_cache.watch_generation = generation;
+        return hessra_key_cache.key;
+    }
+
+    pem = pstrdup(hessra_shared->key_pem);
+    LWLockRelease(hessra_shared->key_lock);
+
+    ereport(DEBUG1,
+            (errmsg("Loading Hessra public key from %s via the key watcher", key_path)));
+
+    key_load_result = hessra_key_from_string(pem, &public_key);
+
+    if (key_load_result != SUCCESS || public_key == NULL)
+        hessra_key_load_failed(key_path, key_load_result);
+
+    hessra_key_cache_install(key_path, &file, pem, public_key, generation);
+    pfree(pem);
+
+    return public_key;
+}
+
+/*
+ * hessra_key_cache_install
+ *
+ * Replaces the cached key with public_key, parsed from pem as read from
+ * key_path with the given identity. The fingerprint is a digest of the PEM
+ * itself: the file identity only tells this backend when to reload, and
+ * could stay the same across a rewrite of the file.
+ */
+static void
+hessra_key_cache_install(const char *key_path, const HessraKeyFileId *file, const char *pem,
+                         HessraKey *public_key, uint64 watch_generation)
+{
+    pg_cryptohash_ctx *ctx;
+
+    // Replace the previously cached key, if any
+    if (hessra_key_cache.key != NULL) {
+        hessra_key_free(hessra_key_cache.key);
+        hessra_key_cache.key = NULL;
+    }
+    hessra_key_generation++;
+
+    strlcpy(hessra_key_cache.path, key_path, MAXPGPATH);
+    hessra_key_cache.file = *file;
+    hessra_key_cache.watch_generation = watch_generation;
+    hessra_key_cache.key = public_key;
+    hessra_key_cache.valid = true;
+
+    ctx = hessra_digest_begin();
+    hessra_digest_update(ctx, "file", 4);
+    hessra_digest_update(ctx, pem, strlen(pem));
+    hessra_digest_finish(ctx, hessra_key_cache.fingerprint);
+}
+
+/*
+ * hessra_key_load_failed
+ *
+ * Raises the ERROR for a key that could not be parsed.
+ */
+static void
+hessra_key_load_failed(const char *key_path, HessraResult key_load_result)
+{
+    char *err_msg = hessra_error_message(key_load_result);
+    char *safe_err_msg = pstrdup((err_msg != NULL) ? err_msg : "Unknown key loading error");
+
+    // Release the Rust-owned string before ereport longjmps out
+    if (err_msg != NULL) {
+        hessra_string_free(err_msg);
+    }
+    hessra_stats_abort(key_load_result);
+    ereport(ERROR,
+            (errcode(ERRCODE_EXTERNAL_ROUTINE_INVOCATION_EXCEPTION),
+             errmsg("Failed to load Hessra public key from %s: %s", key_path, safe_err_msg)));
+}
+
+// --- Key Watcher ---
+
+/*
+ * hessra_key_watcher_main
+ *
+ * Entry point of the key watcher background worker. Checks the key file of
+ * the server's hessra.public_key_path every hessra.key_check_interval
+ * milliseconds and picks up a changed path on SIGHUP.
+ */
+void
+hessra_key_watcher_main(Datum main_arg)
+{
+    pqsignal(SIGHUP, SignalHandlerForConfigReload);
+    BackgroundWorkerUnblockSignals();
+
+    for (;;) {
+        if (ConfigReloadPending) {
+            ConfigReloadPending = false;
+            ProcessConfigFile(PGC_SIGHUP);
+        }
+
+        hessra_key_watcher_check();
+
+        (void) WaitLatch(MyLatch,
+                         WL_LATCH_SET | WL_TIMEOUT | WL_EXIT_ON_PM_DEATH,
+                         hessra_key_check_interval,
+                         PG_WAIT_EXTENSION);
+        ResetLatch(MyLatch);
+        CHECK_FOR_INTERRUPTS();
+    }
+}
+
+/*
+ * hessra_key_watcher_check
+ *
+ * Reads the key file into shared memory and bumps the key generation if
+ * the path or the file changed since the last check. A file that is
+ * missing, too large or holds no valid key is published as not loaded, so
+ * backends load it themselves and report the error. Never raises an ERROR.
+ */
+static void
+hessra_key_watcher_check(void)
+{
+    const char *key_path = hessra_resolve_key_path();
+    struct stat st;
+    HessraKeyFileId file;
+    bool loaded = false;
+    char *pem = NULL;
+    int fd;
+
+    memset(&file, 0, sizeof(file));
+
+    fd = OpenTransientFile(key_path, O_RDONLY | PG_BINARY);
+    if (fd >= 0 && fstat(fd, &st) == 0) {
+        hessra_key_file_id(&st, &file);
+
+        // Only the watcher writes the state, so it can read it without the lock
+        if (strcmp(hessra_shared->key_path, key_path) == 0 &&
+            memcmp(&hessra_shared->key_file, &file, sizeof(file)) == 0) {
+            CloseTransientFile(fd);
+            return;
+        }
+
+        if (st.st_size < HESSRA_KEY_PEM_MAX) {
+            HessraKey *public_key = NULL;
+            ssize_t nread;
+
+            pem = palloc(st.st_size + 1);
+            nread = read(fd, pem, st.st_size);
+            if (nread == st.st_size) {
+                pem[nread] = '\0';
+                if (hessra_key_from_string(pem, &public_key) == SUCCESS && public_key != NULL) {
+                    hessra_key_free(public_key);
+                    loaded = true;
+                }
+            }
+        }
+    }
+    if (fd >= 0)
+        CloseTransientFile(fd);
+
+    if (strcmp(hessra_shared->key_path, key_path) == 0 &&
+        memcmp(&hessra_shared->key_file, &file, sizeof(file)) == 0 &&
+        hessra_shared->key_loaded == loaded) {
+        if (pem != NULL)
+            pfree(pem);
+        return;
+    }
+
+    LWLockAcquire(hessra_shared->key_lock, LW_EXCLUSIVE);
+    strlcpy(hessra_shared->key_path, key_path, MAXPGPATH);
+    hessra_shared->key_file = file;
+    hessra_shared->key_loaded = loaded;
+    if (loaded)
+        strlcpy(hessra_shared->key_pem, pem, HESSRA_KEY_PEM_MAX);
+    else
+        hessra_shared->key_pem[0] = '\0';
+    pg_atomic_fetch_add_u64(&hessra_shared->key_generation, 1);
+    LWLockRelease(hessra_shared->key_lock);
+
+    if (loaded)
+        ereport(LOG,
+                (errmsg("Hessra key watcher loaded the public key from %s", key_path)));
+    else
+        ereport(LOG,
+                (errmsg("Hessra key watcher could not load a public key from %s", key_path)));
+
+    if (pem != NULL)
+        pfree(pem);
+}
+
+/*
+ * hessra_relcache_callback
+ *
+ * Marks the cached default key and service chains stale when their table is
+ * invalidated. They are released on next use, never from within the
+ * callback.
+ */
+static void
+hessra_relcache_callback(Datum arg, Oid relid)
+{
+    if (relid == InvalidOid || relid == hessra_default_key_cache.relid)
+        hessra_default_key_cache.valid = false;
+    if (relid == InvalidOid || relid == hessra_service_chains_relid)
+        hessra_service_chain_cache_valid = false;
+    if (relid == InvalidOid || relid == hessra_revoked_tokens_relid)
+        hessra_revoked_tokens_plan_valid = false;
+}
+
+/*
+ * hessra_config_table
+ *
+ * Returns the quoted, schema-qualified name of a configuration table and
+ * sets *relid. The table is looked up in the schema the calling function
+ * lives in, i.e. the extension's schema. Also makes sure the relcache
+ * callback is registered before anything is read from the table.
+ */
+static char *
+hessra_config_table(FunctionCallInfo fcinfo, const char *relname, Oid *relid)
+{
+    Oid namespace_oid = get_func_namespace(fcinfo->flinfo->fn_oid);
+
+    if (!hessra_relcache_callback_registered) {
+        CacheRegisterRelcacheCallback(hessra_relcache_callback, (Datum) 0);
+        hessra_relcache_callback_registered = true;
+    }
+
+    *relid = get_relname_relid(relname, namespace_oid);
+
+    return quote_qualified_identifier(get_namespace_name(namespace_oid), relname);
+}
+
+/*
+ * hessra_get_default_key
+ *
+ * Returns the keyring of hessra_public_keys: the keys with a key_id, looked
+ * up by the token's root key id, and the key marked is_default for all other
+ * tokens. Returns NULL if no row is marked is_default or has a key_id. The
+ * table is read and the keys parsed only after the table changed; otherwise
+ * the cached keyring is returned. Raises an ERROR if a stored key cannot be
+ * parsed.
+ */
+static HessraKey *
+hessra_get_default_key(FunctionCallInfo fcinfo)
+{
+    char *table;
+    char *query;
+    int ret;
+    uint64 row;
+    HessraKey *keyring = NULL;
+    HessraHandleGuard *guard;
+    HessraResult key_load_result = SUCCESS;
+    char *failed_key_name = NULL;
+    MemoryContext caller_context = CurrentMemoryContext;
+    pg_cryptohash_ctx *ctx;
+
+    if (hessra_default_key_cache.valid)
+        return hessra_default_key_cache.key;
+
+    table = hessra_config_table(fcinfo, HESSRA_PUBLIC_KEYS_TABLE, &hessra_default_key_cache.relid);
+    query = psprintf("SELECT key_name, public_key, key_id, is_default FROM %s "
+                     "WHERE is_default OR key_id IS NOT NULL ORDER BY id", table);
+
+    ereport(DEBUG1,
+            (errmsg("Loading Hessra public keys from %s", HESSRA_PUBLIC_KEYS_TABLE)));
+
+    // Frees the keyring if reading the table errors out part way
+    guard = hessra_handle_guard(HESSRA_HANDLE_KEY);
+
+    if ((ret = SPI_connect()) != SPI_OK_CONNECT)
+        elog(ERROR, "SPI_connect failed: %s", SPI_result_code_string(ret));
+
+    if ((ret = SPI_execute(query, true, 0)) != SPI_OK_SELECT)
+        elog(ERROR, "SPI_execute failed: %s", SPI_result_code_string(ret));
+
+    ctx = hessra_digest_begin();
+    hessra_digest_update(ctx, "table", 5);
+
+    if (SPI_processed > 0) {
+        key_load_result = hessra_keyring_new(&keyring);
+        guard->handle = keyring;
+    }
+
+    for (row = 0; row < SPI_processed && key_load_result == SUCCESS; row++) {
+        HeapTuple tuple = SPI_tuptable->vals[row];
+        TupleDesc tupdesc = SPI_tuptable->tupdesc;
+        char *key_string = SPI_getvalue(tuple, tupdesc, 2);
+        bool key_id_null;
+        bool is_default_null;
+        Datum key_id = SPI_getbinval(tuple, tupdesc, 3, &key_id_null);
+        Datum is_default = SPI_getbinval(tuple, tupdesc, 4, &is_default_null);
+
+        if (!key_id_null) {
+            uint32 id = (uint32) DatumGetInt64(key_id);
+
+            key_load_result = hessra_keyring_add(keyring, id, key_string);
+            hessra_digest_update(ctx, &id, sizeof(id));
+        }
+        if (key_load_result == SUCCESS && !is_default_null && DatumGetBool(is_default)) {
+            key_load_result = hessra_keyring_set_default(keyring, key_string);
+            hessra_digest_update(ctx, "default", 7);
+        }
+        hessra_digest_update(ctx, key_string, strlen(key_string) + 1);
+
+        if (key_load_result != SUCCESS)
+            failed_key_name = MemoryContextStrdup(caller_context, SPI_getvalue(tuple, tupdesc, 1));
+    }
+
+    SPI_finish();
+
+    if (key_load_result != SUCCESS) {
+        char *err_msg = hessra_error_message(key_load_result);
+        char *safe_err_msg = pstrdup((err_msg != NULL) ? err_msg : "Unknown key loading error");
 
         if (err_msg != NULL) {
             hessra_string_free(err_msg);
         }
+        hessra_handle_release(guard);
+        hessra_stats_abort(key_load_result);
+        ereport(ERROR,
+                (errcode(ERRCODE_EXTERNAL_ROUTINE_INVOCATION_EXCEPTION),
+                 errmsg("Failed to load Hessra public key \"%s\" from %s: %s",
+                        (failed_key_name != NULL) ? failed_key_name : "", HESSRA_PUBLIC_KEYS_TABLE,
+                        safe_err_msg)));
     }
 
-    // 5. Clean up allocated resources
-    if (public_key != NULL) {
-        hessra_public_key_free(public_key);
+    // Replace the previously cached keyring, if any
+    if (hessra_default_key_cache.key != NULL) {
+        hessra_key_free(hessra_default_key_cache.key);
+        hessra_default_key_cache.key = NULL;
     }
-    pfree(token_cstr);
-    pfree(subject_cstr);
-    pfree(resource_cstr);
-    pfree(service_nodes_json_cstr);
-    pfree(component_cstr);
+    hessra_key_generation++;
 
-    // 6. Return the boolean result
-    PG_RETURN_BOOL(is_valid);
+    hessra_default_key_cache.key = keyring;
+    guard->handle = NULL;
+    hessra_digest_finish(ctx, hessra_default_key_cache.fingerprint);
+    hessra_default_key_cache.valid = true;
+
+    return keyring;
+}
+
+// --- Service Chain Cache ---
+
+/*
+ * hessra_service_chain_cache_reset
+ *
+ * Releases all cached service chains.
+ */
+static void
+hessra_service_chain_cache_reset(void)
+{
+    HASH_SEQ_STATUS hash_seq;
+    HessraServiceChainEntry *entry;
+
+    hash_seq_init(&hash_seq, hessra_service_chain_cache);
+    while ((entry = hash_seq_search(&hash_seq)) != NULL) {
+        if (entry->chain != NULL && !entry->preloaded)
+            hessra_service_chain_free(entry->chain);
+        hash_search(hessra_service_chain_cache, entry->name_digest, HASH_REMOVE, NULL);
+    }
+
+    hessra_service_chain_cache_valid = true;
+}
+
+/*
+ * hessra_get_service_chain
+ *
+ * Returns the cache entry for a service, reading and parsing its
+ * configuration from hessra_service_chains on first use after the table
+ * changed, or taking the preloaded chain if the table has no row for it.
+ * The entry stays valid until the next call.
+ */
+static HessraServiceChainEntry *
+hessra_get_service_chain(FunctionCallInfo fcinfo, text *service_name_text)
+{
+    uint8 name_digest[PG_SHA256_DIGEST_LENGTH];
+    HessraServiceChainEntry loaded;
+    HessraServiceChainEntry *entry;
+    HessraHandleGuard *guard;
+    pg_cryptohash_ctx *ctx;
+    char *table;
+    char *query;
+    Oid argtypes[1] = {TEXTOID};
+    Datum values[1];
+    int ret;
+
+    if (hessra_service_chain_cache == NULL) {
+        HASHCTL ctl;
+
+        memset(&ctl, 0, sizeof(ctl));
+        ctl.keysize = PG_SHA256_DIGEST_LENGTH;
+        ctl.entrysize = sizeof(HessraServiceChainEntry);
+        hessra_service_chain_cache = hash_create("Hessra service chain cache", 16,
+                                                 &ctl, HASH_ELEM | HASH_BLOBS);
+        hessra_service_chain_cache_valid = true;
+    } else if (!hessra_service_chain_cache_valid) {
+        hessra_service_chain_cache_reset();
+    }
+
+    ctx = hessra_digest_begin();
+    hessra_digest_update(ctx, VARDATA_ANY(service_name_text), VARSIZE_ANY_EXHDR(service_name_text));
+    hessra_digest_finish(ctx, name_digest);
+
+    entry = hash_search(hessra_service_chain_cache, name_digest, HASH_FIND, NULL);
+    if (entry != NULL)
+        return entry;
+
+    // Load the configuration before entering it, so an error leaves no partial entry
+    memset(&loaded, 0, sizeof(loaded));
+    loaded.parse_result = SUCCESS;
+
+    // Resolved only here: a hit must not pay for the catalog lookups
+    table = hessra_config_table(fcinfo, HESSRA_SERVICE_CHAINS_TABLE, &hessra_service_chains_relid);
+    query = psprintf("SELECT service_chain::text FROM %s WHERE service_name = $1", table);
+    values[0] = PointerGetDatum(service_name_text);
+
+    ereport(DEBUG1,
+            (errmsg("Loading Hessra service chain \"%s\" from %s",
+                    text_to_cstring(service_name_text), HESSRA_SERVICE_CHAINS_TABLE)));
+
+    // Frees the parsed chain if anything errors out before it is entered
+    guard = hessra_handle_guard(HESSRA_HANDLE_SERVICE_CHAIN);
+
+    if ((ret = SPI_connect()) != SPI_OK_CONNECT)
+        elog(ERROR, "SPI_connect failed: %s", SPI_result_code_string(ret));
+
+    if ((ret = SPI_execute_with_args(query, 1, argtypes, values, NULL, true, 1)) != SPI_OK_SELECT)
+        elog(ERROR, "SPI_execute_with_args failed: %s", SPI_result_code_string(ret));
+
+    if (SPI_processed > 0) {
+        char *chain_json = SPI_getvalue(SPI_tuptable->vals[0], SPI_tuptable->tupdesc, 1);
+
+        ctx = hessra_digest_begin();
+        hessra_digest_update(ctx, chain_json, strlen(chain_json));
+        hessra_digest_finish(ctx, loaded.fingerprint);
+
+        loaded.found = true;
+        loaded.parse_result = hessra_service_chain_parse(chain_json, &loaded.chain);
+        if (loaded.parse_result != SUCCESS)
+            loaded.chain = NULL;
+        guard->handle = loaded.chain;
+    }
+
+    SPI_finish();
+
+    // Services without a row fall back to the chains preloaded from hessra.service_chains_file
+    if (!loaded.found && hessra_preloaded_chains != NULL) {
+        HessraServiceChainEntry *preloaded = hash_search(hessra_preloaded_chains, name_digest,
+                                                         HASH_FIND, NULL);
+
+        if (preloaded != NULL)
+            memcpy(&loaded, preloaded, sizeof(loaded));
+    }
+
+    entry = hash_search(hessra_service_chain_cache, name_digest, HASH_ENTER, NULL);
+    memcpy(entry, &loaded, sizeof(loaded));
+    memcpy(entry->name_digest, name_digest, sizeof(name_digest));
+    guard->handle = NULL;
+
+    return entry;
+}
+
+// --- Parsed Token Cache ---
+
+/*
+ * hessra_token_cache_cleanup
+ *
+ * Memory context reset callback releasing the Rust-owned parsed token.
+ */
+static void
+hessra_token_cache_cleanup(void *arg)
+{
+    HessraTokenCache *cache = (HessraTokenCache *) arg;
+
+    if (cache->parsed != NULL) {
+        hessra_token_free(cache->parsed);
+        cache->parsed = NULL;
+    }
+}
+
+/*
+ * hessra_get_parsed_token
+ *
+ * Returns the deserialized, signature-checked token for token_text, parsing
+ * it only if it differs from the token seen by the previous call through the
+ * same FmgrInfo (or if a different or reloaded public key is in use). Failed parses are
+ * remembered as well, so an invalid token is not re-parsed for every row.
+ * With binary_token, token_text is a hessra_token holding the decoded bytes
+ * rather than base64 text. The returned token is owned by the cache and
+ * must not be freed.
+ */
+static HessraResult
+hessra_get_parsed_token(FunctionCallInfo fcinfo, text *token_text, bool binary_token,
+                        HessraKey *public_key, HessraToken **parsed)
+{
+    FmgrInfo *flinfo = fcinfo->flinfo;
+    HessraTokenCache *cache = (HessraTokenCache *) flinfo->fn_extra;
+    const char *token_data = VARDATA_ANY(token_text);
+    int token_len = VARSIZE_ANY_EXHDR(token_text);
+    char *token_cstr;
+
+    if (cache == NULL) {
+        cache = MemoryContextAllocZero(flinfo->fn_mcxt, sizeof(HessraTokenCache));
+        cache->cleanup.func = hessra_token_cache_cleanup;
+        cache->cleanup.arg = cache;
+        MemoryContextRegisterResetCallback(flinfo->fn_mcxt, &cache->cleanup);
+        flinfo->fn_extra = cache;
+    } else if (cache->token != NULL &&
+               cache->key == public_key &&
+               cache->key_generation == hessra_key_generation &&
+               cache->token_len == token_len &&
+               memcmp(cache->token, token_data, token_len) == 0) {
+        *parsed = cache->parsed;
+        return cache->parse_result;
+    }
+
+    // Forget the previous token before anything below can fail
+    hessra_token_cache_cleanup(cache);
+    if (cache->token != NULL) {
+        pfree(cache->token);
+        cache->token = NULL;
+    }
+
+    cache->token = MemoryContextAlloc(flinfo->fn_mcxt, token_len);
+    memcpy(cache->token, token_data, token_len);
+    cache->token_len = token_len;
+    cache->key = public_key;
+    cache->key_generation = hessra_key_generation;
+    cache->revoked_known = false;
+
+    if (binary_token) {
+        cache->parse_result = hessra_token_parse_bytes((const uint8 *) token_data, token_len,
+                                                       public_key, &cache->parsed);
+    } else {
+        cache->parse_result = hessra_token_parse_slice(token_data, token_len, public_key, &cache->parsed);
+    }
+
+    if (cache->parse_result != SUCCESS)
+        cache->parsed = NULL;
+
+    *parsed = cache->parsed;
+    return cache->parse_result;
+}
+
+// --- Shared Memory ---
+
+/*
+ * hessra_revocation_filter_bits
+ *
+ * Size of the revocation Bloom filter in bits, a power of two.
+ */
+static uint64
+hessra_revocation_filter_bits(void)
+{
+    return pg_nextpower2_64(Max((uint64) hessra_revocation_capacity * HESSRA_REVOCATION_FILTER_BITS_PER_ID,
+                                64));
+}
+
+/*
+ * hessra_shmem_size
+ *
+ * Estimates the shared memory needed for the shared state, the result cache
+ * and the revocation set.
+ */
+static Size
+hessra_shmem_size(void)
+{
+    Size size = MAXALIGN(sizeof(HessraSharedState));
+
+    if (hessra_result_cache_size > 0)
+        size = add_size(size, hash_estimate_size(hessra_result_cache_size,
+                                                 sizeof(HessraResultCacheEntry)));
+
+    if (hessra_revocation_capacity > 0) {
+        size = add_size(size, hash_estimate_size(hessra_revocation_capacity + HESSRA_REVOCATION_MAX_DATABASES,
+                                                 sizeof(HessraRevocationEntry)));
+        size = add_size(size, MAXALIGN(hessra_revocation_filter_bits() / 8));
+    }
+
+    return size;
+}
+
+/*
+ * hessra_shmem_request
+ *
+ * Requests shared memory and the LWLock tranche. Runs as shmem_request_hook
+ * on PostgreSQL 15+, directly from _PG_init on older versions.
+ */
+static void
+hessra_shmem_request(void)
+{
+#if PG_VERSION_NUM >= 150000
+    if (prev_shmem_request_hook)
+        prev_shmem_request_hook();
+#endif
+
+    RequestAddinShmemSpace(hessra_shmem_size());
+    // One lock each for the result cache, the revocation set and the key watcher
+    RequestNamedLWLockTranche(HESSRA_SHMEM_NAME, 3);
+}
+
+/*
+ * hessra_shmem_startup
+ *
+ * Attaches to (or initializes) the shared state, result cache,
+ * revocation set and key watcher state.
+ */
+static void
+hessra_shmem_startup(void)
+{
+    bool found;
+    HASHCTL info;
+    int f;
+    int c;
+
+    if (prev_shmem_startup_hook)
+        prev_shmem_startup_hook();
+
+    hessra_shared = NULL;
+    hessra_result_cache = NULL;
+    hessra_revocation_set = NULL;
+    hessra_revocation_filter = NULL;
+
+    LWLockAcquire(AddinShmemInitLock, LW_EXCLUSIVE);
+
+    hessra_shared = ShmemInitStruct(HESSRA_SHMEM_NAME, sizeof(HessraSharedState), &found);
+    if (!found) {
+        hessra_shared->lock = &(GetNamedLWLockTranche(HESSRA_SHMEM_NAME))[0].lock;
+        hessra_shared->revocation_lock = &(GetNamedLWLockTranche(HESSRA_SHMEM_NAME))[1].lock;
+        pg_atomic_init_u64(&hessra_shared->access_clock, 0);
+        pg_atomic_init_u64(&hessra_shared->cache_hits, 0);
+        pg_atomic_init_u64(&hessra_shared->cache_misses, 0);
+        pg_atomic_init_u64(&hessra_shared->stats_reset, (uint64) GetCurrentTimestamp());
+        for (f = 0; f < HESSRA_STAT_NUM_FUNCTIONS; f++)
+            for (c = 0; c < HESSRA_STAT_NUM_COUNTERS; c++)
+                pg_atomic_init_u64(&hessra_shared->function_stats[f][c], 0);
+        hessra_shared->revocation_count = 0;
+        pg_atomic_init_u64(&hessra_shared->revocation_generation, 1);
+        pg_atomic_init_u64(&hessra_shared->revocation_changes, 0);
+        pg_atomic_init_u64(&hessra_shared->revocation_reloads_started, 0);
+        pg_atomic_init_u64(&hessra_shared->revocation_reloads_done, 0);
+        hessra_shared->key_lock = &(GetNamedLWLockTranche(HESSRA_SHMEM_NAME))[2].lock;
+        // Generation 0 marks keys not loaded via the watcher
+        pg_atomic_init_u64(&hessra_shared->key_generation, 1);
+        hessra_shared->key_path[0] = '\0';
+        hessra_shared->key_loaded = false;
+        memset(&hessra_shared->key_file, 0, sizeof(hessra_shared->key_file));
+        hessra_shared->key_pem[0] = '\0';
+    }
+
+    if (hessra_result_cache_size > 0) {
+        memset(&info, 0, sizeof(info));
+        info.keysize = sizeof(HessraResultCacheKey);
+        info.entrysize = sizeof(HessraResultCacheEntry);
+        hessra_result_cache = ShmemInitHash(HESSRA_RESULT_CACHE_NAME,
+                                            hessra_result_cache_size,
+                                            hessra_result_cache_size,
+                                            &info,
+                                            HASH_ELEM | HASH_BLOBS);
+    }
+
+    if (hessra_revocation_capacity > 0) {
+        memset(&info, 0, sizeof(info));
+        info.keysize = sizeof(HessraRevocationKey);
+        info.entrysize = sizeof(HessraRevocationEntry);
+        hessra_revocation_set = ShmemInitHash(HESSRA_REVOCATION_SET_NAME,
+                                              hessra_revocation_capacity + HESSRA_REVOCATION_MAX_DATABASES,
+                                              hessra_revocation_capacity + HESSRA_REVOCATION_MAX_DATABASES,
+                                              &info,
+                                              HASH_ELEM | HASH_BLOBS);
+
+        hessra_revocation_filter = ShmemInitStruct(HESSRA_REVOCATION_FILTER_NAME,
+                                                   hessra_revocation_filter_bits() / 8, &found);
+        if (!found)
+            memset(hessra_revocation_filter, 0, hessra_revocation_filter_bits() / 8);
+    }
+
+    LWLockRelease(AddinShmemInitLock);
+}
+
+// --- Digests ---
+
+/*
+ * hessra_digest_begin
+ *
+ * Starts a SHA-256 digest, used for key fingerprints and result cache keys.
+ */
+static pg_cryptohash_ctx *
+hessra_digest_begin(void)
+{
+    pg_cryptohash_ctx *ctx = pg_cryptohash_create(PG_SHA256);
+
+    if (ctx == NULL || pg_cryptohash_init(ctx) < 0)
+        ereport(ERROR,
+                (errcode(ERRCODE_OUT_OF_MEMORY),
+                 errmsg("could not compute Hessra digest")));
+
+    return ctx;
 }
 
-// TODO: Add _PG_init and _PG_fini functions if needed for global setup/teardown
-// (e.g., calling hessra_init, managing GUCs) 
\ No newline at end of file
+/*
+ * hessra_digest_update
+ *
+ * Feeds one length-prefixed field into the digest, so that field boundaries
+ * cannot be shifted to produce colliding digests.
+ */
+static void
+hessra_digest_update(pg_cryptohash_ctx *ctx, const void *data, size_t len)
+{
+    uint32 len32 = (uint32) len;
+
+    if (pg_cryptohash_update(ctx, (const uint8 *) &len32, sizeof(len32)) < 0 ||
+        pg_cryptohash_update(ctx, (const uint8 *) data, len) < 0)
+        ereport(ERROR,
+                (errcode(ERRCODE_INTERNAL_ERROR),
+                 errmsg("could not compute Hessra digest")));
+}
+
+/*
+ * hessra_digest_finish
+ *
+ * Writes the PG_SHA256_DIGEST_LENGTH byte digest and releases the context.
+ */
+static void
+hessra_digest_finish(pg_cryptohash_ctx *ctx, uint8 *digest)
+{
+#if PG_VERSION_NUM >= 150000
+    if (pg_cryptohash_final(ctx, digest, PG_SHA256_DIGEST_LENGTH) < 0)
+#else
+    if (pg_cryptohash_final(ctx, digest) < 0)
+#endif
+        ereport(ERROR,
+                (errcode(ERRCODE_INTERNAL_ERROR),
+                 errmsg("could not compute Hessra digest")));
+
+    pg_cryptohash_free(ctx);
+}
+
+// --- Result Cache ---
+
+/*
+ * hessra_result_cache_key
+ *
+ * Computes the cache key for a verification call: a SHA-256 digest over the
+ * function kind, the current database, the fingerprint of the public key in
+ * use and the arguments.
+ */
+static void
+hessra_result_cache_key(HessraResultCacheKey *key, char kind, const uint8 *key_fingerprint,
+                        text **args, int nargs)
+{
+    pg_cryptohash_ctx *ctx;
+    int i;
+
+    ctx = hessra_digest_begin();
+
+    hessra_digest_update(ctx, &kind, sizeof(kind));
+
+    // Revoked tokens are per database, and so are the verdicts that checked them
+    hessra_digest_update(ctx, &MyDatabaseId, sizeof(MyDatabaseId));
+
+    // Verdicts are only valid for the key they were computed with
+    hessra_digest_update(ctx, key_fingerprint, PG_SHA256_DIGEST_LENGTH);
+
+    for (i = 0; i < nargs; i++)
+        hessra_digest_update(ctx, VARDATA_ANY(args[i]), VARSIZE_ANY_EXHDR(args[i]));
+
+    hessra_digest_finish(ctx, key->digest);
+}
+
+/*
+ * hessra_result_cache_lookup
+ *
+ * Looks up a cached verdict. Returns true and sets *result on a hit.
+ * Verdicts computed before the last change to the revoked tokens are
+ * ignored. Only a shared lock is taken; the LRU position is tracked with an atomic
+ * access stamp so concurrent readers do not serialize.
+ */
+static bool
+hessra_result_cache_lookup(const HessraResultCacheKey *key, HessraResult *result)
+{
+    HessraResultCacheEntry *entry;
+    bool hit = false;
+
+    if (hessra_result_cache == NULL)
+        return false;
+
+    LWLockAcquire(hessra_shared->lock, LW_SHARED);
+
+    entry = (HessraResultCacheEntry *) hash_search(hessra_result_cache, key, HASH_FIND, NULL);
+    if (entry != NULL && entry->expires_at > GetCurrentTimestamp() &&
+        entry->revocation_changes == pg_atomic_read_u64(&hessra_shared->revocation_changes)) {
+        *result = entry->result;
+        pg_atomic_write_u64(&entry->last_used,
+                            pg_atomic_fetch_add_u64(&hessra_shared->access_clock, 1));
+        hit = true;
+    }
+
+    LWLockRelease(hessra_shared->lock);
+
+    if (hit)
+        pg_atomic_fetch_add_u64(&hessra_shared->cache_hits, 1);
+    else
+        pg_atomic_fetch_add_u64(&hessra_shared->cache_misses, 1);
+    hessra_stats_cache(hit);
+
+    return hit;
+}
+
+/*
+ * hessra_result_cache_store
+ *
+ * Stores the result of a fresh verification. The entry lives for at most
+ * hessra.result_cache_ttl seconds and never past the token's expiry; it is
+ * not stored when the expiry cannot be determined. revocation_changes must be read before the token's revocation was
+ * checked, so that a revocation racing with the verification voids it.
+ */
+static void
+hessra_result_cache_store(const HessraResultCacheKey *key, HessraResult result, const HessraToken *parsed,
+                          uint64 revocation_changes)
+{
+    HessraResultCacheEntry *entry;
+    TimestampTz now;
+    TimestampTz expires_at;
+    int64_t token_expiration = 0;
+    bool found;
+
+    if (hessra_result_cache == NULL || hessra_result_cache_ttl <= 0)
+        return;
+
+    now = GetCurrentTimestamp();
+    expires_at = TimestampTzPlusMilliseconds(now, (int64) hessra_result_cache_ttl * 1000);
+
+    if (parsed != NULL && hessra_token_expires_at(parsed, &token_expiration) != SUCCESS)
+        return;
+
+    if (token_expiration > 0) {
+        TimestampTz token_expires_at = time_t_to_timestamptz((pg_time_t) token_expiration);
+
+        if (token_expires_at <= now)
+            return;
+        expires_at = Min(expires_at, token_expires_at);
+    }
+
+    LWLockAcquire(hessra_shared->lock, LW_EXCLUSIVE);
+
+    if (hash_get_num_entries(hessra_result_cache) >= hessra_result_cache_size)
+        hessra_result_cache_evict(now);
+
+    entry = (HessraResultCacheEntry *) hash_search(hessra_result_cache, key, HASH_ENTER_NULL, &found);
+    if (entry != NULL) {
+        if (!found)
+            pg_atomic_init_u64(&entry->last_used, 0);
+        entry->result = result;
+        entry->expires_at = expires_at;
+        entry->revocation_changes = revocation_changes;
+        pg_atomic_write_u64(&entry->last_used,
+                            pg_atomic_fetch_add_u64(&hessra_shared->access_clock, 1));
+    }
+
+    LWLockRelease(hessra_shared->lock);
+}
+
+static int
+hessra_result_cache_entry_cmp(const void *lhs, const void *rhs)
+{
+    uint64 l = pg_atomic_read_u64(&(*(HessraResultCacheEntry *const *) lhs)->last_used);
+    uint64 r = pg_atomic_read_u64(&(*(HessraResultCacheEntry *const *) rhs)->last_used);
+
+    if (l < r)
+        return -1;
+    if (l > r)
+        return 1;
+    return 0;
+}
+
+/*
+ * hessra_result_cache_evict
+ *
+ * Drops expired entries and, if that is not enough, the least recently used
+ * HESSRA_RESULT_CACHE_EVICT_PERCENT of the cache. Caller must hold the lock
+ * exclusively.
+ */
+static void
+hessra_result_cache_evict(TimestampTz now)
+{
+    HASH_SEQ_STATUS hash_seq;
+    HessraResultCacheEntry *entry;
+    HessraResultCacheEntry **entries;
+    long nentries = 0;
+    long nvictims;
+    long i;
+
+    entries = palloc(hash_get_num_entries(hessra_result_cache) * sizeof(HessraResultCacheEntry *));
+
+    hash_seq_init(&hash_seq, hessra_result_cache);
+    while ((entry = hash_seq_search(&hash_seq)) != NULL) {
+        if (entry->expires_at <= now)
+            hash_search(hessra_result_cache, &entry->key, HASH_REMOVE, NULL);
+        else
+            entries[nentries++] = entry;
+    }
+
+    if (nentries >= hessra_result_cache_size) {
+        qsort(entries, nentries, sizeof(HessraResultCacheEntry *), hessra_result_cache_entry_cmp);
+
+        nvictims = Max(1, nentries * HESSRA_RESULT_CACHE_EVICT_PERCENT / 100);
+        for (i = 0; i < nvictims; i++)
+            hash_search(hessra_result_cache, &entries[i]->key, HASH_REMOVE, NULL);
+    }
+
+    pfree(entries);
+}
+
+// --- Rust Handles ---
+
+/*
+ * hessra_handle_guard
+ *
+ * Returns an empty guard for a handle of the given kind, released with
+ * CurrentMemoryContext. Store the handle in guard->handle as soon as the
+ * FFI call returns it.
+ */
+static HessraHandleGuard *
+hessra_handle_guard(HessraHandleKind kind)
+{
+    HessraHandleGuard *guard = palloc0(sizeof(HessraHandleGuard));
+
+    guard->kind = kind;
+    guard->callback.func = hessra_handle_release;
+    guard->callback.arg = guard;
+    MemoryContextRegisterResetCallback(CurrentMemoryContext, &guard->callback);
+
+    return guard;
+}
+
+/*
+ * hessra_handle_guard_array
+ *
+ * Returns a guard for an array of nhandles handles of the given kind, all
+ * NULL, released with CurrentMemoryContext. The FFI call fills
+ * guard->handles.
+ */
+static HessraHandleGuard *
+hessra_handle_guard_array(HessraHandleKind kind, uintptr_t nhandles)
+{
+    HessraHandleGuard *guard = hessra_handle_guard(kind);
+
+    guard->handles = palloc0(Max(nhandles, 1) * sizeof(void *));
+    guard->nhandles = nhandles;
+
+    return guard;
+}
+
+/*
+ * hessra_handle_free
+ *
+ * Frees a non-NULL handle of the given kind.
+ */
+static void
+hessra_handle_free(HessraHandleKind kind, void *handle)
+{
+    switch (kind) {
+        case HESSRA_HANDLE_KEY:
+            hessra_key_free((HessraKey *) handle);
+            break;
+        case HESSRA_HANDLE_TOKEN:
+            hessra_token_free((HessraToken *) handle);
+            break;
+        case HESSRA_HANDLE_SERVICE_CHAIN:
+            hessra_service_chain_free((HessraServiceChain *) handle);
+            break;
+        case HESSRA_HANDLE_REVOCATION_IDS:
+            hessra_revocation_ids_free((HessraRevocationIds *) handle);
+            break;
+        case HESSRA_HANDLE_STRING:
+            hessra_string_free((char *) handle);
+            break;
+    }
+}
+
+/*
+ * hessra_handle_release
+ *
+ * Releases the handles of a guard it still holds. Also the memory context
+ * reset callback of the guard.
+ */
+static void
+hessra_handle_release(void *arg)
+{
+    HessraHandleGuard *guard = (HessraHandleGuard *) arg;
+    uintptr_t i;
+
+    if (guard->handle != NULL) {
+        hessra_handle_free(guard->kind, guard->handle);
+        guard->handle = NULL;
+    }
+
+    for (i = 0; i < guard->nhandles; i++) {
+        if (guard->handles[i] != NULL) {
+            hessra_handle_free(guard->kind, guard->handles[i]);
+            guard->handles[i] = NULL;
+        }
+    }
+}
+
+// --- Revocation ---
+
+/*
+ * hessra_revocation_changes
+ *
+ * Returns the counter of changes to the revoked tokens, for tying cached
+ * verdicts to the revocations they were computed under. Always 0 when not
+ * preloaded.
+ */
+static uint64
+hessra_revocation_changes(void)
+{
+    if (hessra_shared == NULL)
+        return 0;
+
+    return pg_atomic_read_u64(&hessra_shared->revocation_changes);
+}
+
+/*
+ * hessra_revocation_key
+ *
+ * Computes the revocation set key of a revocation id in the current
+ * database.
+ */
+static void
+hessra_revocation_key(HessraRevocationKey *key, const uint8 *id, size_t len)
+{
+    // Zero the padding as well, the key is compared bytewise
+    memset(key, 0, sizeof(*key));
+    key->dboid = MyDatabaseId;
+    key->hash[0] = hash_bytes_extended(id, (int) len, HESSRA_REVOCATION_HASH_SEED_1);
+    key->hash[1] = hash_bytes_extended(id, (int) len, HESSRA_REVOCATION_HASH_SEED_2);
+}
+
+/*
+ * hessra_revocation_marker_key
+ *
+ * Computes the key of the current database's marker entry.
+ */
+static void
+hessra_revocation_marker_key(HessraRevocationKey *key)
+{
+    memset(key, 0, sizeof(*key));
+    key->dboid = MyDatabaseId;
+    key->is_marker = 1;
+}
+
+/*
+ * hessra_revocation_filter_bit
+ *
+ * Returns the Bloom filter bit for one probe of a revocation id, by double
+ * hashing over the key's two hashes.
+ */
+static inline uint64
+hessra_revocation_filter_bit(const HessraRevocationKey *key, int probe)
+{
+    uint64 h1 = key->hash[0] ^ ((uint64) key->dboid * UINT64CONST(0x9E3779B97F4A7C15));
+    uint64 h2 = key->hash[1] | 1;
+
+    return (h1 + (uint64) probe * h2) & (hessra_revocation_filter_bits() - 1);
+}
+
+/*
+ * hessra_revocation_filter_set
+ *
+ * Sets the Bloom filter bits of a revocation id. Caller must hold the
+ * revocation lock exclusively.
+ */
+static void
+hessra_revocation_filter_set(const HessraRevocationKey *key)
+{
+    int i;
+
+    for (i = 0; i < HESSRA_REVOCATION_FILTER_PROBES; i++) {
+        uint64 bit = hessra_revocation_filter_bit(key, i);
+
+        hessra_revocation_filter[bit / 64] |= UINT64CONST(1) << (bit % 64);
+    }
+}
+
+/*
+ * hessra_revocation_filter_test
+ *
+ * Returns false if a revocation id is certainly not in the set. Caller must
+ * hold the revocation lock.
+ */
+static bool
+hessra_revocation_filter_test(const HessraRevocationKey *key)
+{
+    int i;
+
+    for (i = 0; i < HESSRA_REVOCATION_FILTER_PROBES; i++) {
+        uint64 bit = hessra_revocation_filter_bit(key, i);
+
+        if ((hessra_revocation_filter[bit / 64] & (UINT64CONST(1) << (bit % 64))) == 0)
+            return false;
+    }
+
+    return true;
+}
+
+/*
+ * hessra_revocation_add
+ *
+ * Adds a revocation id to the set and the filter. Returns false if the set
+ * is full and the id could not be added. Caller must hold the revocation
+ * lock exclusively.
+ */
+static bool
+hessra_revocation_add(const HessraRevocationKey *key)
+{
+    HessraRevocationEntry *entry;
+    bool found;
+
+    if (hessra_shared->revocation_count >= (uint64) hessra_revocation_capacity)
+        return hash_search(hessra_revocation_set, key, HASH_FIND, NULL) != NULL;
+
+    entry = (HessraRevocationEntry *) hash_search(hessra_revocation_set, key, HASH_ENTER_NULL, &found);
+    if (entry == NULL)
+        return false;
+
+    if (!found) {
+        entry->generation = 0;
+        entry->complete = false;
+        hessra_shared->revocation_count++;
+        hessra_revocation_filter_set(key);
+    }
+
+    return true;
+}
+
+/*
+ * hessra_revocation_set_load
+ *
+ * Replaces the current database's ids in the revocation set with the rows of
+ * hessra_revoked_tokens. The table is read with the latest snapshot, so rows
+ * committed by any transaction are seen whatever the isolation level.
+ */
+static void
+hessra_revocation_set_load(FunctionCallInfo fcinfo)
+{
+    uint64 generation = pg_atomic_read_u64(&hessra_shared->revocation_generation);
+    char *table;
+    Oid relid;
+    volatile bool complete = true;
+
+    table = hessra_config_table(fcinfo, HESSRA_REVOKED_TOKENS_TABLE, &relid);
+
+    ereport(DEBUG1,
+            (errmsg("Loading Hessra revoked tokens from %s", HESSRA_REVOKED_TOKENS_TABLE)));
+
+    // Lets transactions inserting ids concurrently tell that the load may have missed them
+    pg_atomic_fetch_add_u64(&hessra_shared->revocation_reloads_started, 1);
+
+    PG_TRY();
+    {
+        SPIPlanPtr plan;
+        HessraRevocationKey *keys;
+        HessraRevocationKey marker_key;
+        HessraRevocationEntry *marker;
+        HessraRevocationEntry *entry;
+        HASH_SEQ_STATUS hash_seq;
+        uint64 nkeys;
+        uint64 i;
+        int ret;
+        bool found;
+
+        if ((ret = SPI_connect()) != SPI_OK_CONNECT)
+            elog(ERROR, "SPI_connect failed: %s", SPI_result_code_string(ret));
+
+        plan = SPI_prepare(psprintf("SELECT decode(revocation_id, 'hex') FROM %s", table), 0, NULL);
+        if (plan == NULL)
+            elog(ERROR, "SPI_prepare failed: %s", SPI_result_code_string(SPI_result));
+
+        if ((ret = SPI_execute_snapshot(plan, NULL, NULL, GetLatestSnapshot(), InvalidSnapshot,
+                                        true, false, 0)) != SPI_OK_SELECT)
+            elog(ERROR, "SPI_execute_snapshot failed: %s", SPI_result_code_string(ret));
+
+        // Hash the ids before taking the lock
+        nkeys = SPI_processed;
+        keys = palloc(Max(nkeys, 1) * sizeof(HessraRevocationKey));
+        for (i = 0; i < nkeys; i++) {
+            bool isnull;
+            bytea *id = DatumGetByteaPP(SPI_getbinval(SPI_tuptable->vals[i], SPI_tuptable->tupdesc,
+                                                      1, &isnull));
+
+            hessra_revocation_key(&keys[i], (const uint8 *) VARDATA_ANY(id), VARSIZE_ANY_EXHDR(id));
+        }
+
+        hessra_revocation_marker_key(&marker_key);
+
+        LWLockAcquire(hessra_shared->revocation_lock, LW_EXCLUSIVE);
+
+        // Enter the marker first: without one, the ids could never be used
+        marker = (HessraRevocationEntry *) hash_search(hessra_revocation_set, &marker_key,
+                                                       HASH_ENTER_NULL, &found);
+        if (marker == NULL) {
+            hessra_revocation_untracked = true;
+        } else if (!found || marker->generation != generation) {
+            // Not visible to readers as loaded until the end
+            marker->generation = 0;
+            marker->complete = false;
+
+            // Drop the database's ids and rebuild the filter from the others'
+            memset(hessra_revocation_filter, 0, hessra_revocation_filter_bits() / 8);
+
+            hash_seq_init(&hash_seq, hessra_revocation_set);
+            while ((entry = hash_seq_search(&hash_seq)) != NULL) {
+                if (entry->key.is_marker)
+                    continue;
+                if (entry->key.dboid == MyDatabaseId) {
+                    hash_search(hessra_revocation_set, &entry->key, HASH_REMOVE, NULL);
+                    hessra_shared->revocation_count--;
+                } else {
+                    hessra_revocation_filter_set(&entry->key);
+                }
+            }
+
+            for (i = 0; i < nkeys; i++)
+                if (!hessra_revocation_add(&keys[i]))
+                    complete = false;
+
+            marker->generation = generation;
+            marker->complete = complete;
+        }
+
+        LWLockRelease(hessra_shared->revocation_lock);
+
+        SPI_finish();
+    }
+    PG_FINALLY();
+    {
+        pg_atomic_fetch_add_u64(&hessra_shared->revocation_reloads_done, 1);
+    }
+    PG_END_TRY();
+
+    if (hessra_revocation_untracked)
+        ereport(WARNING,
+                (errmsg("Hessra revocation set has no room for database %u", MyDatabaseId),
+                 errdetail("More than %d databases use hessra_authz; %s is queried on every verification.",
+                           HESSRA_REVOCATION_MAX_DATABASES, HESSRA_REVOKED_TOKENS_TABLE)));
+    else if (!complete)
+        ereport(WARNING,
+                (errmsg("hessra.revocation_capacity (%d) is too small to hold all revoked tokens",
+                        hessra_revocation_capacity),
+                 errdetail("%s is queried on every verification until it is increased.",
+                           HESSRA_REVOKED_TOKENS_TABLE)));
+}
+
+/*
+ * hessra_revoked_in_table
+ *
+ * Looks up the revocation ids in hessra_revoked_tokens with a query. The
+ * query is prepared once per backend and again only after the table changed.
+ */
+static bool
+hessra_revoked_in_table(FunctionCallInfo fcinfo, const HessraRevocationIds *ids)
+{
+    uintptr_t nids = hessra_revocation_ids_len(ids);
+    Datum *elems;
+    Oid argtypes[1] = {TEXTARRAYOID};
+    Datum values[1];
+    uintptr_t i;
+    int ret;
+    bool revoked;
+
+    if (nids == 0)
+        return false;
+
+    elems = palloc(nids * sizeof(Datum));
+    for (i = 0; i < nids; i++) {
+        uintptr_t len;
+        const uint8 *id = hessra_revocation_ids_get(ids, i, &len);
+        char *hex = palloc(len * 2 + 1);
+
+        hex[hex_encode((const char *) id, len, hex)] = '\0';
+        elems[i] = CStringGetTextDatum(hex);
+    }
+    values[0] = PointerGetDatum(construct_array(elems, (int) nids, TEXTOID, -1, false, TYPALIGN_INT));
+
+    if ((ret = SPI_connect()) != SPI_OK_CONNECT)
+        elog(ERROR, "SPI_connect failed: %s", SPI_result_code_string(ret));
+
+    if (!hessra_revoked_tokens_plan_valid || hessra_revoked_tokens_plan == NULL) {
+        char *table;
+        SPIPlanPtr plan;
+
+        if (hessra_revoked_tokens_plan != NULL) {
+            SPI_freeplan(hessra_revoked_tokens_plan);
+            hessra_revoked_tokens_plan = NULL;
+        }
+
+        // Set before the catalog lookups, so an invalidation arriving meanwhile is not lost
+        hessra_revoked_tokens_plan_valid = true;
+        table = hessra_config_table(fcinfo, HESSRA_REVOKED_TOKENS_TABLE, &hessra_revoked_tokens_relid);
+
+        plan = SPI_prepare(psprintf("SELECT 1 FROM %s WHERE revocation_id = ANY($1)", table), 1, argtypes);
+        if (plan == NULL)
+            elog(ERROR, "SPI_prepare failed: %s", SPI_result_code_string(SPI_result));
+        if ((ret = SPI_keepplan(plan)) != 0)
+            elog(ERROR, "SPI_keepplan failed: %s", SPI_result_code_string(ret));
+        hessra_revoked_tokens_plan = plan;
+    }
+
+    if ((ret = SPI_execute_plan(hessra_revoked_tokens_plan, values, NULL, true, 1)) != SPI_OK_SELECT)
+        elog(ERROR, "SPI_execute_plan failed: %s", SPI_result_code_string(ret));
+
+    revoked = SPI_processed > 0;
+
+    SPI_finish();
+
+    return revoked;
+}
+
+/*
+ * hessra_ids_are_revoked
+ *
+ * Returns true if any of the revocation ids is in hessra_revoked_tokens.
+ * Uses the shared revocation set, loading the current database's ids first
+ * if they are missing or stale. Falls back to querying the table when the
+ * set is not available or could not hold all revoked ids, and in parallel
+ * mode when the set would have to be loaded: the load reads the table with
+ * the latest snapshot, which parallel workers cannot take.
+ */
+static bool
+hessra_ids_are_revoked(FunctionCallInfo fcinfo, const HessraRevocationIds *ids)
+{
+    uintptr_t nids = hessra_revocation_ids_len(ids);
+    HessraRevocationKey marker_key;
+    HessraRevocationEntry *marker;
+    bool loaded = false;
+    bool complete;
+    bool revoked = false;
+    uintptr_t i;
+
+    if (hessra_revocation_set == NULL || hessra_revocation_untracked)
+        return hessra_revoked_in_table(fcinfo, ids);
+
+    hessra_revocation_marker_key(&marker_key);
+
+    for (;;) {
+        LWLockAcquire(hessra_shared->revocation_lock, LW_SHARED);
+
+        marker = (HessraRevocationEntry *) hash_search(hessra_revocation_set, &marker_key, HASH_FIND, NULL);
+        if (loaded ||
+            (marker != NULL &&
+             marker->generation == pg_atomic_read_u64(&hessra_shared->revocation_generation)))
+            break;
+
+        LWLockRelease(hessra_shared->revocation_lock);
+
+        if (IsInParallelMode())
+            return hessra_revoked_in_table(fcinfo, ids);
+
+        hessra_revocation_set_load(fcinfo);
+        loaded = true;
+    }
+
+    complete = marker != NULL && marker->complete;
+
+    if (complete && hessra_shared->revocation_count > 0) {
+        for (i = 0; i < nids && !revoked; i++) {
+            HessraRevocationKey key;
+            uintptr_t len;
+            const uint8 *id = hessra_revocation_ids_get(ids, i, &len);
+
+            hessra_revocation_key(&key, id, len);
+            revoked = hessra_revocation_filter_test(&key) &&
+                hash_search(hessra_revocation_set, &key, HASH_FIND, NULL) != NULL;
+        }
+    }
+
+    LWLockRelease(hessra_shared->revocation_lock);
+
+    if (!complete)
+        return hessra_revoked_in_table(fcinfo, ids);
+
+    return revoked;
+}
+
+/*
+ * hessra_token_is_revoked
+ *
+ * Returns true if any revocation id of the token is in hessra_revoked_tokens.
+ * For the token parsed by hessra_get_parsed_token, the verdict is kept in
+ * the statement-level cache and reused until the statement or command
+ * changes, so revocation is checked once per token rather than per row.
+ */
+static bool
+hessra_token_is_revoked(FunctionCallInfo fcinfo, const HessraToken *token)
+{
+    HessraTokenCache *cache = (HessraTokenCache *) fcinfo->flinfo->fn_extra;
+    TimestampTz statement = GetCurrentStatementStartTimestamp();
+    CommandId command = GetCurrentCommandId(false);
+    bool revoked;
+
+    if (cache == NULL || cache->parsed != token)
+        return hessra_ids_are_revoked(fcinfo, hessra_token_revocation_ids(token));
+
+    if (cache->revoked_known &&
+        cache->revoked_statement == statement &&
+        cache->revoked_command == command)
+        return cache->revoked;
+
+    revoked = hessra_ids_are_revoked(fcinfo, hessra_token_revocation_ids(token));
+
+    cache->revoked = revoked;
+    cache->revoked_statement = statement;
+    cache->revoked_command = command;
+    cache->revoked_known = true;
+
+    return revoked;
+}
+
+/*
+ * hessra_revocation_xact_callback
+ *
+ * Makes the next verification in every database reload its revoked ids
+ * after a transaction changed hessra_revoked_tokens in a way the trigger
+ * could not apply to the set right away: updated, deleted or truncated
+ * rows, rolled back inserts, and inserts a concurrent load may have missed
+ * because they were not committed yet.
+ */
+static void
+hessra_revocation_xact_callback(XactEvent event, void *arg)
+{
+    bool reload;
+
+    switch (event) {
+        case XACT_EVENT_COMMIT:
+        case XACT_EVENT_PREPARE:
+            reload = hessra_revocations_changed;
+            if (hessra_revocations_inserted && !reload) {
+                uint64 done = pg_atomic_read_u64(&hessra_shared->revocation_reloads_done);
+
+                pg_memory_barrier();
+                reload = pg_atomic_read_u64(&hessra_shared->revocation_reloads_started) != done ||
+                    done != hessra_revocation_reloads_seen;
+            }
+            break;
+        case XACT_EVENT_ABORT:
+            reload = hessra_revocations_inserted;
+            break;
+        default:
+            return;
+    }
+
+    if (reload && hessra_shared != NULL) {
+        pg_atomic_fetch_add_u64(&hessra_shared->revocation_generation, 1);
+        pg_atomic_fetch_add_u64(&hessra_shared->revocation_changes, 1);
+    }
+
+    hessra_revocations_inserted = false;
+    hessra_revocations_changed = false;
+}
+
+/*
+ * hessra_revocation_subxact_callback
+ *
+ * Ids inserted by a rolled back subtransaction must be removed from the set
+ * as well, once the transaction ends.
+ */
+static void
+hessra_revocation_subxact_callback(SubXactEvent event, SubTransactionId subid,
+                                   SubTransactionId parent_subid, void *arg)
+{
+    if (event == SUBXACT_EVENT_ABORT_SUB && hessra_revocations_inserted)
+        hessra_revocations_changed = true;
+}
+
+// --- Statistics ---
+
+/*
+ * hessra_stats_begin
+ *
+ * Starts timing a call of one of the SQL-callable functions. A no-op unless
+ * the shared statistics are available.
+ */
+static void
+hessra_stats_begin(HessraStatFunction function)
+{
+    if (hessra_shared == NULL) {
+        hessra_current_call.function = -1;
+        return;
+    }
+
+    hessra_current_call.function = function;
+    INSTR_TIME_SET_CURRENT(hessra_current_call.start);
+    hessra_current_call.key_loaded = hessra_current_call.start;
+}
+
+/*
+ * hessra_stats_key_loaded
+ *
+ * Marks the end of key and configuration loading for the current call.
+ */
+static void
+hessra_stats_key_loaded(void)
+{
+    if (hessra_current_call.function < 0)
+        return;
+
+    INSTR_TIME_SET_CURRENT(hessra_current_call.key_loaded);
+}
+
+/*
+ * hessra_stats_result
+ *
+ * Counts the outcome of one verification of the current call; bulk
+ * functions count one per element.
+ */
+static void
+hessra_stats_result(HessraResult result)
+{
+    int index = HESSRA_STAT_RESULT_UNKNOWN;
+
+    if (hessra_current_call.function < 0)
+        return;
+
+    if (result >= SUCCESS && result < HESSRA_STAT_RESULT_UNKNOWN)
+        index = (int) result;
+
+    hessra_pending_stats[hessra_current_call.function].results[index]++;
+}
+
+/*
+ * hessra_stats_cache
+ *
+ * Counts a shared result cache lookup of the current call.
+ */
+static void
+hessra_stats_cache(bool hit)
+{
+    if (hessra_current_call.function < 0)
+        return;
+
+    if (hit)
+        hessra_pending_stats[hessra_current_call.function].cache_hits++;
+    else
+        hessra_pending_stats[hessra_current_call.function].cache_misses++;
+}
+
+/*
+ * hessra_stats_end
+ *
+ * Counts the current call and its timings.
+ */
+static void
+hessra_stats_end(void)
+{
+    HessraFunctionCounters *counters;
+    instr_time now;
+    instr_time key_load_time;
+    instr_time verify_time;
+    uint64 total_us;
+    int bucket = 0;
+
+    if (hessra_current_call.function < 0)
+        return;
+
+    INSTR_TIME_SET_CURRENT(now);
+    verify_time = now;
+    INSTR_TIME_SUBTRACT(verify_time, hessra_current_call.key_loaded);
+    key_load_time = hessra_current_call.key_loaded;
+    INSTR_TIME_SUBTRACT(key_load_time, hessra_current_call.start);
+
+    counters = &hessra_pending_stats[hessra_current_call.function];
+    counters->calls++;
+    counters->key_load_time_us += INSTR_TIME_GET_MICROSEC(key_load_time);
+    counters->verify_time_us += INSTR_TIME_GET_MICROSEC(verify_time);
+
+    total_us = INSTR_TIME_GET_MICROSEC(key_load_time) + INSTR_TIME_GET_MICROSEC(verify_time);
+    if (total_us >= 2)
+        bucket = Min(pg_leftmost_one_pos64(total_us), HESSRA_STAT_HISTOGRAM_BUCKETS - 1);
+    counters->latency_histogram[bucket]++;
+
+    hessra_current_call.function = -1;
+
+    if (++hessra_pending_calls >= HESSRA_STATS_FLUSH_CALLS)
+        hessra_stats_flush();
+}
+
+/*
+ * hessra_stats_abort
+ *
+ * Ends the current call early with result, e.g. before raising an ERROR
+ * because the public key could not be loaded.
+ */
+static void
+hessra_stats_abort(HessraResult result)
+{
+    hessra_stats_result(result);
+    hessra_stats_end();
+}
+
+/*
+ * hessra_stats_flush
+ *
+ * Adds this backend's pending counts to the shared counters. Must not
+ * throw, it runs from the transaction callback.
+ */
+static void
+hessra_stats_flush(void)
+{
+    int f;
+    int c;
+
+    if (hessra_shared == NULL || hessra_pending_calls == 0)
+        return;
+
+    for (f = 0; f < HESSRA_STAT_NUM_FUNCTIONS; f++) {
+        const uint64 *pending = (const uint64 *) &hessra_pending_stats[f];
+
+        for (c = 0; c < HESSRA_STAT_NUM_COUNTERS; c++) {
+            if (pending[c] != 0)
+                pg_atomic_fetch_add_u64(&hessra_shared->function_stats[f][c], (int64) pending[c]);
+        }
+    }
+
+    memset(hessra_pending_stats, 0, sizeof(hessra_pending_stats));
+    hessra_pending_calls = 0;
+}
+
+/*
+ * hessra_stats_xact_callback
+ *
+ * Flushes the pending statistics when a transaction ends, whether it
+ * commits or aborts; parallel workers flush their own counts.
+ */
+static void
+hessra_stats_xact_callback(XactEvent event, void *arg)
+{
+    switch (event) {
+        case XACT_EVENT_COMMIT:
+        case XACT_EVENT_ABORT:
+        case XACT_EVENT_PARALLEL_COMMIT:
+        case XACT_EVENT_PARALLEL_ABORT:
+        case XACT_EVENT_PREPARE:
+            hessra_stats_flush();
+            break;
+        default:
+            break;
+    }
+}
+
+// --- Session Token ---
+
+/*
+ * hessra_session_token_reset
+ *
+ * Releases the session token, if any.
+ */
+static void
+hessra_session_token_reset(void)
+{
+    if (hessra_session_token.parsed != NULL) {
+        hessra_token_free(hessra_session_token.parsed);
+        hessra_session_token.parsed = NULL;
+    }
+    if (hessra_session_token.subject != NULL) {
+        pfree(hessra_session_token.subject);
+        hessra_session_token.subject = NULL;
+    }
+    hessra_session_token.id[0] = '\0';
+}
+
+/*
+ * hessra_session_token_id_assign
+ *
+ * Assign hook for hessra.session_token_id. Any value other than the id of
+ * the current session token releases it. Must not throw.
+ */
+static void
+hessra_session_token_id_assign(const char *newval, void *extra)
+{
+    if (hessra_session_token.parsed == NULL)
+        return;
+
+    if (newval == NULL || strcmp(newval, hessra_session_token.id) != 0)
+        hessra_session_token_reset();
+}
+
+/*
+ * hessra_authorizer_cache_size_assign
+ *
+ * Assign hook for hessra.authorizer_cache_size, resizing the token library's
+ * authorizer template cache. Must not throw.
+ */
+static void
+hessra_authorizer_cache_size_assign(int newval, void *extra)
+{
+    hessra_authorizer_cache_configure((uintptr_t) newval);
+}
+
+// --- Arrays ---
+
+/*
+ * hessra_build_bool_array
+ *
+ * Builds a boolean array with the same dimensions and lower bounds as
+ * source, one element per source element.
+ */
+static ArrayType *
+hessra_build_bool_array(ArrayType *source, Datum *values, bool *nulls, int nelems)
+{
+    if (nelems == 0)
+        return construct_empty_array(BOOLOID);
+
+    return construct_md_array(values, nulls, ARR_NDIM(source), ARR_DIMS(source),
+                              ARR_LBOUND(source), BOOLOID, 1, true, TYPALIGN_CHAR);
+}
+
+// --- Verification ---
+
+/*
+ * hessra_verify_token_with_key
+ *
+ * Verifies a token against public_key and authorizes subject/resource.
+ * key_fingerprint identifies the key in the shared result cache. With
+ * binary_token, the token is a hessra_token rather than base64 text.
+ */
+static bool
+hessra_verify_token_with_key(FunctionCallInfo fcinfo, HessraKey *public_key,
+                             const uint8 *key_fingerprint, text *token_text, bool binary_token,
+                             text *subject_text, text *resource_text)
+{
+    HessraToken *parsed_token = NULL;
+    HessraResult verify_result;
+    bool is_valid = false;
+    text *cache_args[] = {token_text, subject_text, resource_text};
+    HessraResultCacheKey cache_key;
+    uint64 revocation_changes = hessra_revocation_changes();
+
+    // 1. Reuse a verdict computed by any backend, if the shared cache has one
+    if (hessra_result_cache != NULL) {
+        hessra_result_cache_key(&cache_key,
+                                binary_token ? HESSRA_CACHE_KIND_BINARY_TOKEN : HESSRA_CACHE_KIND_TOKEN,
+                                key_fingerprint, cache_args, lengthof(cache_args));
+        if (hessra_result_cache_lookup(&cache_key, &verify_result)) {
+            hessra_stats_result(verify_result);
+            return verify_result == SUCCESS;
+        }
+    }
+
+    // 2. Parse the token (once per statement) and authorize this subject/resource
+    verify_result = hessra_get_parsed_token(fcinfo, token_text, binary_token, public_key, &parsed_token);
+    if (verify_result == SUCCESS && hessra_token_is_revoked(fcinfo, parsed_token))
+        verify_result = ERROR_INVALID_TOKEN;
+    if (verify_result == SUCCESS)
+        verify_result = hessra_token_authorize_slice(parsed_token,
+                                                     VARDATA_ANY(subject_text), VARSIZE_ANY_EXHDR(subject_text),
+                                                     VARDATA_ANY(resource_text), VARSIZE_ANY_EXHDR(resource_text));
+
+    // 3. Process the result
+    if (verify_result == SUCCESS) {
+        is_valid = true;
+    } else {
+        is_valid = false;
+        // Optional: Log specific verification failures as NOTICE or WARNING instead of ERROR?
+        // char *err_msg = hessra_error_message(verify_result);
+        // char *safe_err_msg = (err_msg != NULL) ? err_msg : "Unknown verification error";
+        // ereport(NOTICE, (errmsg("Hessra token verification failed: %s", safe_err_msg)));
+        // if (err_msg != NULL) {
+        //     hessra_string_free(err_msg);
+        // }
+    }
+    hessra_stats_result(verify_result);
+
+    if (hessra_result_cache != NULL)
+        hessra_result_cache_store(&cache_key, verify_result, parsed_token, revocation_changes);
+
+    return is_valid;
+}
+
+/*
+ * hessra_verify_service_chain_with_key
+ *
+ * Verifies a token against public_key and authorizes subject/resource along
+ * the service chain up to component. The chain is given either as JSON text
+ * or, with service_nodes_json_text NULL, already parsed; in the latter case
+ * key_fingerprint must identify the chain as well as the key for the shared
+ * result cache. With binary_token, the token is a hessra_token rather than
+ * base64 text.
+ */
+static bool
+hessra_verify_service_chain_with_key(FunctionCallInfo fcinfo, HessraKey *public_key,
+                                     const uint8 *key_fingerprint, text *token_text, bool binary_token,
+                                     text *subject_text, text *resource_text,
+                                     text *service_nodes_json_text,
+                                     const HessraServiceChain *service_chain,
+                                     text *component_text)
+{
+    HessraToken *parsed_token = NULL;
+    HessraResult verify_result;
+    bool is_valid = false;
+    char *err_msg = NULL;
+    char *safe_err_msg = NULL;
+    text *json_cache_args[] = {token_text, subject_text, resource_text, service_nodes_json_text, component_text};
+    text *parsed_cache_args[] = {token_text, subject_text, resource_text, component_text};
+    HessraResultCacheKey cache_key;
+    uint64 revocation_changes = hessra_revocation_changes();
+
+    // 1. Reuse a verdict computed by any backend, if the shared cache has one
+    if (hessra_result_cache != NULL) {
+        if (service_nodes_json_text != NULL)
+            hessra_result_cache_key(&cache_key,
+                                    binary_token ? HESSRA_CACHE_KIND_BINARY_SERVICE_CHAIN
+                                                 : HESSRA_CACHE_KIND_SERVICE_CHAIN,
+                                    key_fingerprint, json_cache_args, lengthof(json_cache_args));
+        else
+            hessra_result_cache_key(&cache_key,
+                                    binary_token ? HESSRA_CACHE_KIND_BINARY_NAMED_SERVICE_CHAIN
+                                                 : HESSRA_CACHE_KIND_NAMED_SERVICE_CHAIN,
+                                    key_fingerprint, parsed_cache_args, lengthof(parsed_cache_args));
+        if (hessra_result_cache_lookup(&cache_key, &verify_result)) {
+            hessra_stats_result(verify_result);
+            return verify_result == SUCCESS;
+        }
+    }
+
+    // 2. Parse the token (once per statement) and authorize it for the service chain
+    verify_result = hessra_get_parsed_token(fcinfo, token_text, binary_token, public_key, &parsed_token);
+    if (verify_result == SUCCESS && hessra_token_is_revoked(fcinfo, parsed_token))
+        verify_result = ERROR_INVALID_TOKEN;
+    if (verify_result == SUCCESS && service_nodes_json_text != NULL) {
+        verify_result = hessra_token_authorize_service_chain_slice(
+            parsed_token,
+            VARDATA_ANY(subject_text), VARSIZE_ANY_EXHDR(subject_text),
+            VARDATA_ANY(resource_text), VARSIZE_ANY_EXHDR(resource_text),
+            VARDATA_ANY(service_nodes_json_text), VARSIZE_ANY_EXHDR(service_nodes_json_text),
+            VARDATA_ANY(component_text), VARSIZE_ANY_EXHDR(component_text)
+        );
+    } else if (verify_result == SUCCESS) {
+        verify_result = hessra_token_authorize_with_chain_slice(
+            parsed_token,
+            VARDATA_ANY(subject_text), VARSIZE_ANY_EXHDR(subject_text),
+            VARDATA_ANY(resource_text), VARSIZE_ANY_EXHDR(resource_text),
+            service_chain,
+            VARDATA_ANY(component_text), VARSIZE_ANY_EXHDR(component_text)
+        );
+    }
+
+    // 3. Process the result
+    if (verify_result == SUCCESS) {
+        is_valid = true;
+    } else {
+        is_valid = false;
+        // Log specific verification failures for debugging
+        err_msg = hessra_error_message(verify_result);
+        safe_err_msg = (err_msg != NULL) ? err_msg : "Unknown verification error";
+
+        // Only log at DEBUG level in production; can use NOTICE during development
+        ereport(DEBUG1,
+                (errmsg("Hessra service chain verification failed: %s", safe_err_msg)));
+
+        if (err_msg != NULL) {
+            hessra_string_free(err_msg);
+        }
+    }
+    hessra_stats_result(verify_result);
+
+    if (hessra_result_cache != NULL)
+        hessra_result_cache_store(&cache_key, verify_result, parsed_token, revocation_changes);
+
+    return is_valid;
+}
+
+// --- Function Definitions ---
+
+/**
+ * SQL-callable function to verify a Hessra token.
+ *
+ * Args:
+ *   PG_GETARG_TEXT_PP(0): The Hessra token string, or the decoded token
+ *     bytes of a hessra_token when binary_token is set.
+ *   PG_GETARG_TEXT_PP(1): The required subject string.
+ *   PG_GETARG_TEXT_PP(2): The required resource string.
+ *
+ * Returns:
+ *   Boolean indicating if the token is valid and grants the permission.
+ */
+static Datum
+hessra_verify_token(FunctionCallInfo fcinfo, bool binary_token)
+{
+    text *token_text = PG_GETARG_TEXT_PP(0);
+    text *subject_text = PG_GETARG_TEXT_PP(1);
+    text *resource_text = PG_GETARG_TEXT_PP(2);
+    HessraKey *public_key;
+    bool is_valid;
+
+    hessra_stats_begin(HESSRA_STAT_VERIFY_TOKEN);
+
+    // Resolve the key path and fetch the (cached) public key
+    public_key = hessra_get_public_key();
+    hessra_stats_key_loaded();
+
+    is_valid = hessra_verify_token_with_key(fcinfo, public_key, hessra_key_cache.fingerprint,
+                                            token_text, binary_token, subject_text, resource_text);
+
+    hessra_stats_end();
+    PG_RETURN_BOOL(is_valid);
+}
+
+/*
+ * The verify_hessra_token entry points for text and hessra_token tokens.
+ */
+Datum
+pg_verify_hessra_token(PG_FUNCTION_ARGS)
+{
+    return hessra_verify_token(fcinfo, false);
+}
+
+Datum
+pg_verify_hessra_token_binary(PG_FUNCTION_ARGS)
+{
+    return hessra_verify_token(fcinfo, true);
+}
+
+/**
+ * SQL-callable function to verify a Hessra token with the keys from the
+ * hessra_public_keys table: the key whose key_id matches the token's root
+ * key id, or else the key marked as default. Falls back to the key file when
+ * no key is marked as default or has a key_id.
+ *
+ * Args:
+ *   PG_GETARG_TEXT_PP(0): The Hessra token string, or the decoded token
+ *     bytes of a hessra_token when binary_token is set.
+ *   PG_GETARG_TEXT_PP(1): The required subject string.
+ *   PG_GETARG_TEXT_PP(2): The required resource string.
+ *
+ * Returns:
+ *   Boolean indicating if the token is valid and grants the permission.
+ */
+static Datum
+hessra_verify_token_default(FunctionCallInfo fcinfo, bool binary_token)
+{
+    text *token_text = PG_GETARG_TEXT_PP(0);
+    text *subject_text = PG_GETARG_TEXT_PP(1);
+    text *resource_text = PG_GETARG_TEXT_PP(2);
+    HessraKey *public_key;
+    const uint8 *key_fingerprint;
+    bool is_valid;
+
+    hessra_stats_begin(HESSRA_STAT_VERIFY_TOKEN_DEFAULT);
+
+    public_key = hessra_get_default_key(fcinfo);
+    key_fingerprint = hessra_default_key_cache.fingerprint;
+    if (public_key == NULL) {
+        public_key = hessra_get_public_key();
+        key_fingerprint = hessra_key_cache.fingerprint;
+    }
+    hessra_stats_key_loaded();
+
+    is_valid = hessra_verify_token_with_key(fcinfo, public_key, key_fingerprint,
+                                            token_text, binary_token, subject_text, resource_text);
+
+    hessra_stats_end();
+    PG_RETURN_BOOL(is_valid);
+}
+
+/*
+ * The verify_hessra_token_default entry points for text and hessra_token tokens.
+ */
+Datum
+pg_verify_hessra_token_default(PG_FUNCTION_ARGS)
+{
+    return hessra_verify_token_default(fcinfo, false);
+}
+
+Datum
+pg_verify_hessra_token_default_binary(PG_FUNCTION_ARGS)
+{
+    return hessra_verify_token_default(fcinfo, true);
+}
+
+/**
+ * SQL-callable function to verify a Hessra service chain token.
+ *
+ * Args:
+ *   PG_GETARG_TEXT_PP(0): The Hessra token string, or the decoded token
+ *     bytes of a hessra_token when binary_token is set.
+ *   PG_GETARG_TEXT_PP(1): The required subject string.
+ *   PG_GETARG_TEXT_PP(2): The required resource string.
+ *   PG_GETARG_TEXT_PP(3): JSON array of service node objects with component and public_key fields.
+ *   PG_GETARG_TEXT_PP(4): The component name to check in the service chain.
+ *
+ * Returns:
+ *   Boolean indicating if the token is valid and grants the permission for the service chain.
+ */
+static Datum
+hessra_verify_service_chain(FunctionCallInfo fcinfo, bool binary_token)
+{
+    text *token_text = PG_GETARG_TEXT_PP(0);
+    text *subject_text = PG_GETARG_TEXT_PP(1);
+    text *resource_text = PG_GETARG_TEXT_PP(2);
+    text *service_nodes_json_text = PG_GETARG_TEXT_PP(3);
+    text *component_text = PG_GETARG_TEXT_PP(4);
+    HessraKey *public_key;
+    bool is_valid;
+
+    hessra_stats_begin(HESSRA_STAT_VERIFY_SERVICE_CHAIN);
+
+    // Resolve the key path and fetch the (cached) public key
+    public_key = hessra_get_public_key();
+    hessra_stats_key_loaded();
+
+    is_valid = hessra_verify_service_chain_with_key(fcinfo, public_key, hessra_key_cache.fingerprint,
+                                                    token_text, binary_token, subject_text, resource_text,
+                                                    service_nodes_json_text, NULL, component_text);
+
+    hessra_stats_end();
+    PG_RETURN_BOOL(is_valid);
+}
+
+/*
+ * The verify_hessra_service_chain entry points for text and hessra_token tokens.
+ */
+Datum
+pg_verify_hessra_service_chain(PG_FUNCTION_ARGS)
+{
+    return hessra_verify_service_chain(fcinfo, false);
+}
+
+Datum
+pg_verify_hessra_service_chain_binary(PG_FUNCTION_ARGS)
+{
+    return hessra_verify_service_chain(fcinfo, true);
+}
+
+/**
+ * SQL-callable function to verify a Hessra service chain token using the
+ * service chain stored for the resource in hessra_service_chains.
+ *
+ * Args:
+ *   PG_GETARG_TEXT_PP(0): The Hessra token string, or the decoded token
+ *     bytes of a hessra_token when binary_token is set.
+ *   PG_GETARG_TEXT_PP(1): The required subject string.
+ *   PG_GETARG_TEXT_PP(2): The required resource string, also the service name.
+ *   PG_GETARG_TEXT_PP(3): The component name to check in the service chain.
+ *
+ * Returns:
+ *   Boolean indicating if the token is valid and grants the permission for the service chain.
+ */
+static Datum
+hessra_verify_service_chain_by_name(FunctionCallInfo fcinfo, bool binary_token)
+{
+    text *token_text = PG_GETARG_TEXT_PP(0);
+    text *subject_text = PG_GETARG_TEXT_PP(1);
+    text *resource_text = PG_GETARG_TEXT_PP(2);
+    text *component_text = PG_GETARG_TEXT_PP(3);
+    HessraServiceChainEntry *service_chain;
+    HessraKey *public_key;
+    uint8 fingerprint[PG_SHA256_DIGEST_LENGTH];
+    pg_cryptohash_ctx *ctx;
+    bool is_valid;
+
+    hessra_stats_begin(HESSRA_STAT_VERIFY_SERVICE_CHAIN_BY_NAME);
+
+    // 1. Look up the (cached) service chain configuration for the resource
+    service_chain = hessra_get_service_chain(fcinfo, resource_text);
+
+    if (!service_chain->found) {
+        ereport(WARNING,
+                (errmsg("No service chain configuration found for service: %s",
+                        text_to_cstring(resource_text))));
+        hessra_stats_abort(ERROR_CONFIG_INVALID);
+        PG_RETURN_BOOL(false);
+    }
+
+    if (service_chain->parse_result != SUCCESS) {
+        char *err_msg = hessra_error_message(service_chain->parse_result);
+
+        ereport(DEBUG1,
+                (errmsg("Hessra service chain verification failed: %s",
+                        (err_msg != NULL) ? err_msg : "Unknown verification error")));
+        if (err_msg != NULL) {
+            hessra_string_free(err_msg);
+        }
+        hessra_stats_abort(service_chain->parse_result);
+        PG_RETURN_BOOL(false);
+    }
+
+    // 2. Resolve the key path and fetch the (cached) public key
+    public_key = hessra_get_public_key();
+    hessra_stats_key_loaded();
+
+    // 3. Verdicts depend on both the key and the stored chain
+    ctx = hessra_digest_begin();
+    hessra_digest_update(ctx, hessra_key_cache.fingerprint, PG_SHA256_DIGEST_LENGTH);
+    hessra_digest_update(ctx, service_chain->fingerprint, PG_SHA256_DIGEST_LENGTH);
+    hessra_digest_finish(ctx, fingerprint);
+
+    is_valid = hessra_verify_service_chain_with_key(fcinfo, public_key, fingerprint,
+                                                    token_text, binary_token, subject_text, resource_text,
+                                                    NULL, service_chain->chain, component_text);
+
+    hessra_stats_end();
+    PG_RETURN_BOOL(is_valid);
+}
+
+/*
+ * The verify_hessra_service_chain_by_name entry points for text and hessra_token tokens.
+ */
+Datum
+pg_verify_hessra_service_chain_by_name(PG_FUNCTION_ARGS)
+{
+    return hessra_verify_service_chain_by_name(fcinfo, false);
+}
+
+Datum
+pg_verify_hessra_service_chain_by_name_binary(PG_FUNCTION_ARGS)
+{
+    return hessra_verify_service_chain_by_name(fcinfo, true);
+}
+
+/**
+ * SQL-callable function verifying a Hessra token, its authorization and
+ * optionally a service chain in one pass, reporting each verdict separately.
+ *
+ * The token is parsed once per statement, and one authorizer run yields both
+ * the authorization and the service chain verdicts, so a caller falling back
+ * from verify_hessra_service_chain to verify_hessra_token no longer verifies
+ * the token twice. Results are not kept in the shared result cache, which
+ * holds single verdicts.
+ *
+ * Args:
+ *   PG_GETARG_TEXT_PP(0): The Hessra token string, or the decoded token
+ *     bytes of a hessra_token when binary_token is set.
+ *   PG_GETARG_TEXT_PP(1): The required subject string.
+ *   PG_GETARG_TEXT_PP(2): The required resource string.
+ *   PG_GETARG_TEXT_PP(3): JSON array of service nodes, or NULL to skip the
+ *     service chain check.
+ *   PG_GETARG_TEXT_PP(4): The component to verify the chain up to, or NULL
+ *     for the whole chain.
+ *
+ * Returns:
+ *   Record of signature_valid, authorized, chain_valid (NULL without a
+ *   chain), failing_component, error_code (result code of the first failed
+ *   step, 0 if none) and expires_at; NULL if the token, subject or resource
+ *   is NULL.
+ */
+static Datum
+hessra_verify_detailed(FunctionCallInfo fcinfo, bool binary_token)
+{
+    TupleDesc tupdesc;
+    Datum values[6];
+    bool nulls[6] = {false, false, false, true, false, true};
+    text *token_text;
+    text *subject_text;
+    text *resource_text;
+    bool has_chain = !PG_ARGISNULL(3);
+    HessraKey *public_key;
+    HessraToken *parsed_token = NULL;
+    HessraHandleGuard *chain = NULL;
+    HessraDetailedResult detailed = {ERROR_VERIFICATION_FAILED, ERROR_VERIFICATION_FAILED, NULL};
+    HessraResult verify_result;
+    HessraResult chain_parse_result = SUCCESS;
+    int64 expiration = 0;
+
+    if (PG_ARGISNULL(0) || PG_ARGISNULL(1) || PG_ARGISNULL(2))
+        PG_RETURN_NULL();
+
+    if (get_call_result_type(fcinfo, NULL, &tupdesc) != TYPEFUNC_COMPOSITE)
+        elog(ERROR, "return type must be a row type");
+
+    token_text = PG_GETARG_TEXT_PP(0);
+    subject_text = PG_GETARG_TEXT_PP(1);
+    resource_text = PG_GETARG_TEXT_PP(2);
+
+    hessra_stats_begin(HESSRA_STAT_VERIFY_DETAILED);
+
+    public_key = hessra_get_public_key();
+    hessra_stats_key_loaded();
+
+    // 1. Parse the token (once per statement) and check its signatures
+    verify_result = hessra_get_parsed_token(fcinfo, token_text, binary_token, public_key, &parsed_token);
+    values[0] = BoolGetDatum(verify_result == SUCCESS);
+
+    if (verify_result == SUCCESS) {
+        if (hessra_token_expires_at(parsed_token, &expiration) == SUCCESS && expiration != 0) {
+            values[5] = TimestampTzGetDatum(time_t_to_timestamptz((pg_time_t) expiration));
+            nulls[5] = false;
+        }
+        if (hessra_token_is_revoked(fcinfo, parsed_token))
+            verify_result = ERROR_INVALID_TOKEN;
+    }
+
+    // 2. Parse the service chain configuration, if any; authorization is still checked without it
+    if (verify_result == SUCCESS && has_chain) {
+        text *service_nodes_json_text = PG_GETARG_TEXT_PP(3);
+
+        chain = hessra_handle_guard(HESSRA_HANDLE_SERVICE_CHAIN);
+        chain_parse_result = hessra_service_chain_parse_slice(VARDATA_ANY(service_nodes_json_text),
+                                                              VARSIZE_ANY_EXHDR(service_nodes_json_text),
+                                                              (HessraServiceChain **) &chain->handle);
+    }
+
+    // 3. Authorize subject/resource and check the chain in one authorizer run
+    if (verify_result == SUCCESS) {
+        text *component_text = PG_ARGISNULL(4) ? NULL : PG_GETARG_TEXT_PP(4);
+        HessraHandleGuard *failing_component = hessra_handle_guard(HESSRA_HANDLE_STRING);
+
+        verify_result = hessra_token_authorize_detailed(
+            parsed_token,
+            VARDATA_ANY(subject_text), VARSIZE_ANY_EXHDR(subject_text),
+            VARDATA_ANY(resource_text), VARSIZE_ANY_EXHDR(resource_text),
+            (chain != NULL) ? chain->handle : NULL,
+            (component_text != NULL) ? VARDATA_ANY(component_text) : NULL,
+            (component_text != NULL) ? VARSIZE_ANY_EXHDR(component_text) : 0,
+            &detailed
+        );
+        failing_component->handle = detailed.failing_component;
+        if (chain != NULL)
+            hessra_handle_release(chain);
+
+        if (chain_parse_result != SUCCESS)
+            detailed.chain_result = chain_parse_result;
+
+        if (detailed.failing_component != NULL) {
+            values[3] = CStringGetTextDatum(detailed.failing_component);
+            nulls[3] = false;
+        }
+        hessra_handle_release(failing_component);
+
+        if (verify_result == SUCCESS)
+            verify_result = (detailed.authorize_result != SUCCESS) ? detailed.authorize_result
+                                                                   : detailed.chain_result;
+    }
+
+    values[1] = BoolGetDatum(detailed.authorize_result == SUCCESS);
+    values[2] = BoolGetDatum(detailed.chain_result == SUCCESS);
+    nulls[2] = !has_chain;
+    values[4] = Int32GetDatum((int32) verify_result);
+
+    hessra_stats_result(verify_result);
+    hessra_stats_end();
+
+    PG_RETURN_DATUM(HeapTupleGetDatum(heap_form_tuple(BlessTupleDesc(tupdesc), values, nulls)));
+}
+
+/*
+ * The hessra_verify_detailed entry points for text and hessra_token tokens.
+ */
+Datum
+pg_hessra_verify_detailed(PG_FUNCTION_ARGS)
+{
+    return hessra_verify_detailed(fcinfo, false);
+}
+
+Datum
+pg_hessra_verify_detailed_binary(PG_FUNCTION_ARGS)
+{
+    return hessra_verify_detailed(fcinfo, true);
+}
+
+/**
+ * SQL-callable function to verify one Hessra token against many resources.
+ *
+ * The token is parsed and its signatures verified once; only authorization
+ * runs per resource.
+ *
+ * Args:
+ *   PG_GETARG_TEXT_PP(0): The Hessra token string.
+ *   PG_GETARG_TEXT_PP(1): The required subject string.
+ *   PG_GETARG_ARRAYTYPE_P(2): Array of resource strings.
+ *
+ * Returns:
+ *   Boolean array with one element per resource, NULL where the resource is
+ *   NULL.
+ */
+Datum
+pg_verify_hessra_token_many(PG_FUNCTION_ARGS)
+{
+    text *token_text = PG_GETARG_TEXT_PP(0);
+    text *subject_text = PG_GETARG_TEXT_PP(1);
+    ArrayType *resources = PG_GETARG_ARRAYTYPE_P(2);
+    HessraKey *public_key;
+    Datum *resource_datums;
+    bool *resource_nulls;
+    Datum *values;
+    bool *nulls;
+    int nelems;
+    int i;
+
+    hessra_stats_begin(HESSRA_STAT_VERIFY_TOKEN_MANY);
+
+    public_key = hessra_get_public_key();
+    hessra_stats_key_loaded();
+
+    deconstruct_array(resources, TEXTOID, -1, false, TYPALIGN_INT,
+                      &resource_datums, &resource_nulls, &nelems);
+
+    values = palloc(nelems * sizeof(Datum));
+    nulls = palloc(nelems * sizeof(bool));
+
+    for (i = 0; i < nelems; i++) {
+        CHECK_FOR_INTERRUPTS();
+
+        nulls[i] = resource_nulls[i];
+        if (resource_nulls[i]) {
+            values[i] = (Datum) 0;
+            continue;
+        }
+
+        values[i] = BoolGetDatum(hessra_verify_token_with_key(fcinfo, public_key,
+                                                              hessra_key_cache.fingerprint,
+                                                              token_text, false, subject_text,
+                                                              DatumGetTextPP(resource_datums[i])));
+    }
+
+    hessra_stats_end();
+    PG_RETURN_ARRAYTYPE_P(hessra_build_bool_array(resources, values, nulls, nelems));
+}
+
+/**
+ * SQL-callable function to verify one Hessra service chain token against
+ * many resources.
+ *
+ * The token is parsed and its signatures verified once, and the service
+ * chain JSON is parsed once; only authorization runs per resource.
+ *
+ * Args:
+ *   PG_GETARG_TEXT_PP(0): The Hessra token string.
+ *   PG_GETARG_TEXT_PP(1): The required subject string.
+ *   PG_GETARG_ARRAYTYPE_P(2): Array of resource strings.
+ *   PG_GETARG_TEXT_PP(3): JSON array of service node objects with component and public_key fields.
+ *   PG_GETARG_TEXT_PP(4): The component name to check in the service chain.
+ *
+ * Returns:
+ *   Boolean array with one element per resource, NULL where the resource is
+ *   NULL.
+ */
+Datum
+pg_verify_hessra_service_chain_many(PG_FUNCTION_ARGS)
+{
+    text *token_text = PG_GETARG_TEXT_PP(0);
+    text *subject_text = PG_GETARG_TEXT_PP(1);
+    ArrayType *resources = PG_GETARG_ARRAYTYPE_P(2);
+    text *service_nodes_json_text = PG_GETARG_TEXT_PP(3);
+    text *component_text = PG_GETARG_TEXT_PP(4);
+    HessraKey *public_key;
+    HessraHandleGuard *service_chain;
+    HessraResult parse_result;
+    uint8 fingerprint[PG_SHA256_DIGEST_LENGTH];
+    pg_cryptohash_ctx *ctx;
+    Datum *resource_datums;
+    bool *resource_nulls;
+    Datum *values;
+    bool *nulls;
+    int nelems;
+    int i;
+
+    hessra_stats_begin(HESSRA_STAT_VERIFY_SERVICE_CHAIN_MANY);
+
+    public_key = hessra_get_public_key();
+
+    deconstruct_array(resources, TEXTOID, -1, false, TYPALIGN_INT,
+                      &resource_datums, &resource_nulls, &nelems);
+
+    values = palloc(nelems * sizeof(Datum));
+    nulls = palloc(nelems * sizeof(bool));
+
+    // Parse the chain once; the guard frees it even if a later call errors out
+    service_chain = hessra_handle_guard(HESSRA_HANDLE_SERVICE_CHAIN);
+    parse_result = hessra_service_chain_parse_slice(VARDATA_ANY(service_nodes_json_text),
+                                                    VARSIZE_ANY_EXHDR(service_nodes_json_text),
+                                                    (HessraServiceChain **) &service_chain->handle);
+
+    if (parse_result != SUCCESS) {
+        char *err_msg = hessra_error_message(parse_result);
+
+        ereport(DEBUG1,
+                (errmsg("Hessra service chain verification failed: %s",
+                        (err_msg != NULL) ? err_msg : "Unknown verification error")));
+        if (err_msg != NULL) {
+            hessra_string_free(err_msg);
+        }
+    } else {
+        // Verdicts depend on both the key and the chain
+        ctx = hessra_digest_begin();
+        hessra_digest_update(ctx, VARDATA_ANY(service_nodes_json_text), VARSIZE_ANY_EXHDR(service_nodes_json_text));
+        hessra_digest_finish(ctx, fingerprint);
+
+        ctx = hessra_digest_begin();
+        hessra_digest_update(ctx, hessra_key_cache.fingerprint, PG_SHA256_DIGEST_LENGTH);
+        hessra_digest_update(ctx, fingerprint, PG_SHA256_DIGEST_LENGTH);
+        hessra_digest_finish(ctx, fingerprint);
+    }
+    hessra_stats_key_loaded();
+
+    for (i = 0; i < nelems; i++) {
+        CHECK_FOR_INTERRUPTS();
+
+        nulls[i] = resource_nulls[i];
+        if (resource_nulls[i]) {
+            values[i] = (Datum) 0;
+            continue;
+        }
+
+        if (parse_result != SUCCESS) {
+            hessra_stats_result(parse_result);
+            values[i] = BoolGetDatum(false);
+            continue;
+        }
+
+        values[i] = BoolGetDatum(hessra_verify_service_chain_with_key(fcinfo, public_key, fingerprint,
+                                                                      token_text, false, subject_text,
+                                                                      DatumGetTextPP(resource_datums[i]),
+                                                                      NULL, service_chain->handle,
+                                                                      component_text));
+    }
+
+    hessra_handle_release(service_chain);
+
+    hessra_stats_end();
+    PG_RETURN_ARRAYTYPE_P(hessra_build_bool_array(resources, values, nulls, nelems));
+}
+
+/**
+ * SQL-callable function to verify many Hessra tokens at once, each against
+ * its own subject and resource.
+ *
+ * Tokens are handed to the token library in chunks and verified on up to
+ * hessra.bulk_workers threads. The shared result cache is bypassed, since
+ * bulk jobs rarely verify the same token twice.
+ *
+ * Args:
+ *   PG_GETARG_ARRAYTYPE_P(0): Array of Hessra token strings.
+ *   PG_GETARG_ARRAYTYPE_P(1): Array of required subject strings.
+ *   PG_GETARG_ARRAYTYPE_P(2): Array of required resource strings.
+ *
+ * Returns:
+ *   Boolean array with one element per token, NULL where the token, subject
+ *   or resource is NULL.
+ */
+Datum
+pg_verify_hessra_tokens(PG_FUNCTION_ARGS)
+{
+    ArrayType *tokens = PG_GETARG_ARRAYTYPE_P(0);
+    ArrayType *subjects = PG_GETARG_ARRAYTYPE_P(1);
+    ArrayType *resources = PG_GETARG_ARRAYTYPE_P(2);
+    HessraKey *public_key;
+    Datum *token_datums, *subject_datums, *resource_datums;
+    bool *token_nulls, *subject_nulls, *resource_nulls;
+    int ntokens, nsubjects, nresources;
+    const char **token_ptrs, **subject_ptrs, **resource_ptrs;
+    uintptr_t *token_lens, *subject_lens, *resource_lens;
+    int *codes;
+    Datum *values;
+    bool *nulls;
+    int start;
+    int i;
+
+    hessra_stats_begin(HESSRA_STAT_VERIFY_TOKENS);
+
+    public_key = hessra_get_public_key();
+    hessra_stats_key_loaded();
+
+    deconstruct_array(tokens, TEXTOID, -1, false, TYPALIGN_INT,
+                      &token_datums, &token_nulls, &ntokens);
+    deconstruct_array(subjects, TEXTOID, -1, false, TYPALIGN_INT,
+                      &subject_datums, &subject_nulls, &nsubjects);
+    deconstruct_array(resources, TEXTOID, -1, false, TYPALIGN_INT,
+                      &resource_datums, &resource_nulls, &nresources);
+
+    if (ntokens != nsubjects || ntokens != nresources)
+        ereport(ERROR,
+                (errcode(ERRCODE_ARRAY_SUBSCRIPT_ERROR),
+                 errmsg("tokens, subjects and resources must have the same number of elements")));
+
+    token_ptrs = palloc0(ntokens * sizeof(char *));
+    subject_ptrs = palloc0(ntokens * sizeof(char *));
+    resource_ptrs = palloc0(ntokens * sizeof(char *));
+    token_lens = palloc0(ntokens * sizeof(uintptr_t));
+    subject_lens = palloc0(ntokens * sizeof(uintptr_t));
+    resource_lens = palloc0(ntokens * sizeof(uintptr_t));
+    codes = palloc(ntokens * sizeof(int));
+    values = palloc(ntokens * sizeof(Datum));
+    nulls = palloc(ntokens * sizeof(bool));
+
+    // Detoast everything up front; the worker threads must not touch PostgreSQL memory APIs
+    for (i = 0; i < ntokens; i++) {
+        text *token_text;
+        text *subject_text;
+        text *resource_text;
+
+        nulls[i] = token_nulls[i] || subject_nulls[i] || resource_nulls[i];
+        if (nulls[i])
+            continue;
+
+        token_text = DatumGetTextPP(token_datums[i]);
+        subject_text = DatumGetTextPP(subject_datums[i]);
+        resource_text = DatumGetTextPP(resource_datums[i]);
+
+        token_ptrs[i] = VARDATA_ANY(token_text);
+        token_lens[i] = VARSIZE_ANY_EXHDR(token_text);
+        subject_ptrs[i] = VARDATA_ANY(subject_text);
+        subject_lens[i] = VARSIZE_ANY_EXHDR(subject_text);
+        resource_ptrs[i] = VARDATA_ANY(resource_text);
+        resource_lens[i] = VARSIZE_ANY_EXHDR(resource_text);
+    }
+
+    for (start = 0; start < ntokens; start += HESSRA_BULK_CHUNK_SIZE) {
+        int count = Min(HESSRA_BULK_CHUNK_SIZE, ntokens - start);
+        sigset_t block_all;
+        sigset_t saved_mask;
+        HessraResult batch_result;
+        HessraHandleGuard *ids;
+
+        CHECK_FOR_INTERRUPTS();
+
+        ids = hessra_handle_guard_array(HESSRA_HANDLE_REVOCATION_IDS, count);
+
+        // Worker threads inherit the signal mask; keep PostgreSQL's handlers on this thread
+        sigfillset(&block_all);
+        sigprocmask(SIG_SETMASK, &block_all, &saved_mask);
+        batch_result = hessra_verify_batch_slices(token_ptrs + start, token_lens + start,
+                                                  subject_ptrs + start, subject_lens + start,
+                                                  resource_ptrs + start, resource_lens + start,
+                                                  count, public_key, hessra_bulk_workers, codes + start,
+                                                  (HessraRevocationIds **) ids->handles);
+        sigprocmask(SIG_SETMASK, &saved_mask, NULL);
+
+        if (batch_result != SUCCESS)
+            ereport(ERROR,
+                    (errcode(ERRCODE_EXTERNAL_ROUTINE_INVOCATION_EXCEPTION),
+                     errmsg("Hessra bulk verification failed")));
+
+        // The worker threads only verify; revocation is checked here, on the backend's thread
+        for (i = 0; i < count; i++) {
+            if (ids->handles[i] != NULL &&
+                hessra_ids_are_revoked(fcinfo, (HessraRevocationIds *) ids->handles[i]))
+                codes[start + i] = ERROR_INVALID_TOKEN;
+        }
+        hessra_handle_release(ids);
+    }
+
+    for (i = 0; i < ntokens; i++) {
+        values[i] = BoolGetDatum(!nulls[i] && codes[i] == SUCCESS);
+        if (!nulls[i])
+            hessra_stats_result((HessraResult) codes[i]);
+    }
+
+    hessra_stats_end();
+    PG_RETURN_ARRAYTYPE_P(hessra_build_bool_array(tokens, values, nulls, ntokens));
+}
+
+/**
+ * SQL-callable function setting the token used by hessra_authorized for the
+ * rest of the session.
+ *
+ * The token is deserialized and its signatures are verified here, once.
+ * The previous session token is released in any case.
+ *
+ * Args:
+ *   PG_GETARG_TEXT_PP(0): The Hessra token string.
+ *   PG_GETARG_TEXT_PP(1): The subject the token is used for.
+ *   PG_GETARG_BOOL(2): If true, the token is cleared at the end of the
+ *                      current transaction, like SET LOCAL.
+ *
+ * Returns:
+ *   Boolean indicating if the token's signatures are valid and it was set.
+ */
+Datum
+pg_hessra_set_session_token(PG_FUNCTION_ARGS)
+{
+    text *token_text = PG_GETARG_TEXT_PP(0);
+    text *subject_text = PG_GETARG_TEXT_PP(1);
+    GucAction action = PG_GETARG_BOOL(2) ? GUC_ACTION_LOCAL : GUC_ACTION_SET;
+    HessraKey *public_key;
+    HessraHandleGuard *parsed;
+    HessraResult parse_result;
+    char id[32];
+
+    hessra_stats_begin(HESSRA_STAT_SET_SESSION_TOKEN);
+
+    public_key = hessra_get_public_key();
+    hessra_stats_key_loaded();
+
+    // The guard frees the token if anything below errors out before it is installed
+    parsed = hessra_handle_guard(HESSRA_HANDLE_TOKEN);
+    parse_result = hessra_token_parse_slice(VARDATA_ANY(token_text), VARSIZE_ANY_EXHDR(token_text),
+                                            public_key, (HessraToken **) &parsed->handle);
+
+    if (parse_result == SUCCESS && hessra_token_is_revoked(fcinfo, parsed->handle)) {
+        hessra_handle_release(parsed);
+        parse_result = ERROR_INVALID_TOKEN;
+    }
+
+    hessra_stats_result(parse_result);
+    hessra_stats_end();
+
+    hessra_session_token_reset();
+
+    if (parse_result != SUCCESS) {
+        set_config_option("hessra.session_token_id", "", PGC_USERSET, PGC_S_SESSION,
+                          action, true, 0, false);
+        PG_RETURN_BOOL(false);
+    }
+
+    snprintf(id, sizeof(id), UINT64_FORMAT, ++hessra_session_token_counter);
+
+    // Install the state before the setting, so the assign hook keeps it
+    hessra_session_token.subject = MemoryContextStrdup(TopMemoryContext, text_to_cstring(subject_text));
+    hessra_session_token.parsed = parsed->handle;
+    parsed->handle = NULL;
+    strlcpy(hessra_session_token.id, id, sizeof(hessra_session_token.id));
+
+    set_config_option("hessra.session_token_id", id, PGC_USERSET, PGC_S_SESSION,
+                      action, true, 0, false);
+
+    PG_RETURN_BOOL(true);
+}
+
+/**
+ * SQL-callable function clearing the session token.
+ */
+Datum
+pg_hessra_clear_session_token(PG_FUNCTION_ARGS)
+{
+    hessra_session_token_reset();
+    set_config_option("hessra.session_token_id", "", PGC_USERSET, PGC_S_SESSION,
+                      GUC_ACTION_SET, true, 0, false);
+
+    PG_RETURN_VOID();
+}
+
+/**
+ * SQL-callable function checking whether the session token grants its
+ * subject access to a resource. Only the revocation check and the
+ * authorization step run; the token's signatures were verified by
+ * hessra_set_session_token.
+ *
+ * Args:
+ *   PG_GETARG_TEXT_PP(0): The required resource string.
+ *
+ * Returns:
+ *   Boolean indicating if the session token grants the permission; false
+ *   if no session token is set.
+ */
+Datum
+pg_hessra_authorized(PG_FUNCTION_ARGS)
+{
+    text *resource_text = PG_GETARG_TEXT_PP(0);
+    HessraResult verify_result;
+
+    hessra_stats_begin(HESSRA_STAT_AUTHORIZED);
+
+    // Without a session token there is nothing to authorize with
+    if (hessra_session_token.parsed == NULL) {
+        hessra_stats_abort(ERROR_INVALID_TOKEN);
+        PG_RETURN_BOOL(false);
+    }
+
+    // Revocations apply to tokens set before them as well
+    if (hessra_token_is_revoked(fcinfo, hessra_session_token.parsed)) {
+        hessra_stats_abort(ERROR_INVALID_TOKEN);
+        PG_RETURN_BOOL(false);
+    }
+
+    verify_result = hessra_token_authorize_slice(hessra_session_token.parsed,
+                                                 hessra_session_token.subject,
+                                                 strlen(hessra_session_token.subject),
+                                                 VARDATA_ANY(resource_text),
+                                                 VARSIZE_ANY_EXHDR(resource_text));
+
+    hessra_stats_result(verify_result);
+    hessra_stats_end();
+    PG_RETURN_BOOL(verify_result == SUCCESS);
+}
+
+/*
+ * hessra_is_row_independent
+ *
+ * True if an argument expression evaluates to the same value for every row
+ * of a scan: no Vars and no volatile functions (e.g. a constant, a bound
+ * parameter or current_setting('app.current_token')).
+ */
+static bool
+hessra_is_row_independent(Node *arg)
+{
+    return !contain_var_clause(arg) && !contain_volatile_functions(arg);
+}
+
+/**
+ * Planner support function for the verification functions.
+ *
+ * SupportRequestCost: when the token argument is the same for every row,
+ * the token is deserialized and its signatures are checked once per
+ * statement, so only the declared COST's authorization share is charged
+ * per row and the rest once as startup cost.
+ *
+ * Selectivity is left to the planner's default: how many resources a token
+ * grants is not known without verifying it.
+ */
+Datum
+pg_hessra_verify_support(PG_FUNCTION_ARGS)
+{
+    Node *rawreq = (Node *) PG_GETARG_POINTER(0);
+
+    if (IsA(rawreq, SupportRequestCost)) {
+        SupportRequestCost *req = (SupportRequestCost *) rawreq;
+        FuncExpr *expr = (FuncExpr *) req->node;
+        double full_cost = get_func_cost(req->funcid) * cpu_operator_cost;
+
+        if (expr == NULL || !IsA(expr, FuncExpr) || list_length(expr->args) == 0)
+            PG_RETURN_POINTER(NULL);
+
+        if (hessra_is_row_independent((Node *) linitial(expr->args))) {
+            req->startup = full_cost * (1.0 - HESSRA_AUTHORIZE_COST_FRACTION);
+            req->per_tuple = full_cost * HESSRA_AUTHORIZE_COST_FRACTION;
+        } else {
+            req->startup = 0;
+            req->per_tuple = full_cost;
+        }
+        PG_RETURN_POINTER(req);
+    }
+
+    PG_RETURN_POINTER(NULL);
+}
+
+/**
+ * Trigger function invalidating the cached Hessra configuration.
+ *
+ * Installed as a statement-level AFTER trigger on the hessra_public_keys and
+ * hessra_service_chains tables. Registers a relcache invalidation for the
+ * table, which every backend receives once the transaction commits and
+ * answers by reloading the table on its next use.
+ */
+Datum
+pg_hessra_config_changed(PG_FUNCTION_ARGS)
+{
+    TriggerData *trigdata = (TriggerData *) fcinfo->context;
+
+    if (!CALLED_AS_TRIGGER(fcinfo))
+        ereport(ERROR,
+                (errcode(ERRCODE_E_R_I_E_TRIGGER_PROTOCOL_VIOLATED),
+                 errmsg("hessra_config_changed: not called by trigger manager")));
+
+    CacheInvalidateRelcacheByRelid(RelationGetRelid(trigdata->tg_relation));
+
+    PG_RETURN_NULL();
+}
+
+/**
+ * Trigger function applying changes of hessra_revoked_tokens to the shared
+ * revocation set.
+ *
+ * As a row-level AFTER INSERT OR UPDATE trigger, adds the new revocation id
+ * to the set at once, so the revocation is in effect for every backend
+ * before the transaction even commits. As a statement-level AFTER UPDATE,
+ * DELETE or TRUNCATE trigger, has the set reloaded from the table once the
+ * transaction ends.
+ */
+Datum
+pg_hessra_revocations_changed(PG_FUNCTION_ARGS)
+{
+    TriggerData *trigdata = (TriggerData *) fcinfo->context;
+    HeapTuple tuple;
+    TupleDesc tupdesc;
+    HessraRevocationKey key;
+    HessraRevocationKey marker_key;
+    HessraRevocationEntry *marker;
+    int attnum;
+    bool isnull;
+    text *id_text;
+    char *id;
+    uint64 id_len;
+
+    if (!CALLED_AS_TRIGGER(fcinfo))
+        ereport(ERROR,
+                (errcode(ERRCODE_E_R_I_E_TRIGGER_PROTOCOL_VIOLATED),
+                 errmsg("hessra_revocations_changed: not called by trigger manager")));
+
+    // Without the shared set, every check queries the table
+    if (hessra_revocation_set == NULL)
+        PG_RETURN_NULL();
+
+    if (!TRIGGER_FIRED_FOR_ROW(trigdata->tg_event)) {
+        hessra_revocations_changed = true;
+        PG_RETURN_NULL();
+    }
+
+    tuple = TRIGGER_FIRED_BY_UPDATE(trigdata->tg_event) ? trigdata->tg_newtuple : trigdata->tg_trigtuple;
+    tupdesc = RelationGetDescr(trigdata->tg_relation);
+
+    attnum = SPI_fnumber(tupdesc, "revocation_id");
+    if (attnum <= 0)
+        elog(ERROR, "hessra_revocations_changed: no revocation_id column");
+
+    id_text = DatumGetTextPP(SPI_getbinval(tuple, tupdesc, attnum, &isnull));
+    if (isnull)
+        PG_RETURN_NULL();
+
+    id = palloc(VARSIZE_ANY_EXHDR(id_text) / 2 + 1);
+    id_len = hex_decode(VARDATA_ANY(id_text), VARSIZE_ANY_EXHDR(id_text), id);
+    hessra_revocation_key(&key, (const uint8 *) id, id_len);
+
+    if (!hessra_revocations_inserted) {
+        hessra_revocations_inserted = true;
+        hessra_revocation_reloads_seen = pg_atomic_read_u64(&hessra_shared->revocation_reloads_done);
+    }
+
+    hessra_revocation_marker_key(&marker_key);
+
+    LWLockAcquire(hessra_shared->revocation_lock, LW_EXCLUSIVE);
+
+    // A full set no longer has all ids, so the database falls back to the table
+    if (!hessra_revocation_add(&key)) {
+        marker = (HessraRevocationEntry *) hash_search(hessra_revocation_set, &marker_key, HASH_FIND, NULL);
+        if (marker != NULL)
+            marker->complete = false;
+    }
+
+    LWLockRelease(hessra_shared->revocation_lock);
+
+    // Cached verdicts predating the revocation must not be used
+    pg_atomic_fetch_add_u64(&hessra_shared->revocation_changes, 1);
+
+    PG_RETURN_NULL();
+}
+
+/**
+ * SQL-callable function returning the revocation ids of a token as hex
+ * strings, one per block. The token's signatures are not verified.
+ *
+ * Args:
+ *   PG_GETARG_TEXT_PP(0): The Hessra token string.
+ *
+ * Returns:
+ *   Text array of revocation ids, the authority block's first.
+ */
+Datum
+pg_hessra_token_revocation_ids(PG_FUNCTION_ARGS)
+{
+    char *token_cstr = text_to_cstring(PG_GETARG_TEXT_PP(0));
+    HessraHandleGuard *guard = hessra_handle_guard(HESSRA_HANDLE_REVOCATION_IDS);
+    HessraRevocationIds *ids = NULL;
+    HessraResult result;
+    Datum *elems;
+    uintptr_t nids;
+    uintptr_t i;
+
+    result = hessra_revocation_ids_from_string(token_cstr, &ids);
+    guard->handle = ids;
+    pfree(token_cstr);
+
+    if (result != SUCCESS)
+        ereport(ERROR,
+                (errcode(ERRCODE_INVALID_PARAMETER_VALUE),
+                 errmsg("invalid Hessra token")));
+
+    nids = hessra_revocation_ids_len(ids);
+    elems = palloc(Max(nids, 1) * sizeof(Datum));
+    for (i = 0; i < nids; i++) {
+        uintptr_t len;
+        const uint8 *id = hessra_revocation_ids_get(ids, i, &len);
+        char *hex = palloc(len * 2 + 1);
+
+        hex[hex_encode((const char *) id, len, hex)] = '\0';
+        elems[i] = CStringGetTextDatum(hex);
+    }
+
+    hessra_handle_release(guard);
+
+    PG_RETURN_ARRAYTYPE_P(construct_array(elems, (int) nids, TEXTOID, -1, false, TYPALIGN_INT));
+}
+
+/**
+ * SQL-callable function reporting the state of the shared result cache.
+ *
+ * Returns:
+ *   A record (entries, hits, misses, hit_rate). hit_rate is NULL until the
+ *   cache has been consulted at least once.
+ */
+Datum
+pg_hessra_result_cache_stats(PG_FUNCTION_ARGS)
+{
+    TupleDesc tupdesc;
+    Datum values[4];
+    bool nulls[4] = {false, false, false, false};
+    int64 entries = 0;
+    uint64 hits = 0;
+    uint64 misses = 0;
+
+    if (get_call_result_type(fcinfo, NULL, &tupdesc) != TYPEFUNC_COMPOSITE)
+        elog(ERROR, "return type must be a row type");
+
+    if (hessra_shared != NULL) {
+        hits = pg_atomic_read_u64(&hessra_shared->cache_hits);
+        misses = pg_atomic_read_u64(&hessra_shared->cache_misses);
+    }
+
+    if (hessra_result_cache != NULL) {
+        LWLockAcquire(hessra_shared->lock, LW_SHARED);
+        entries = hash_get_num_entries(hessra_result_cache);
+        LWLockRelease(hessra_shared->lock);
+    }
+
+    values[0] = Int64GetDatum(entries);
+    values[1] = Int64GetDatum((int64) hits);
+    values[2] = Int64GetDatum((int64) misses);
+    if (hits + misses > 0)
+        values[3] = Float8GetDatum((double) hits / (double) (hits + misses));
+    else
+        nulls[3] = true;
+
+    PG_RETURN_DATUM(HeapTupleGetDatum(heap_form_tuple(BlessTupleDesc(tupdesc), values, nulls)));
+}
+
+/**
+ * SQL-callable function reporting the state of this backend's authorizer
+ * template cache.
+ *
+ * Returns:
+ *   A record (entries, capacity, hits, misses, hit_rate). hit_rate is NULL
+ *   until the cache has been consulted at least once.
+ */
+Datum
+pg_hessra_authorizer_cache_stats(PG_FUNCTION_ARGS)
+{
+    TupleDesc tupdesc;
+    Datum values[5];
+    bool nulls[5] = {false, false, false, false, false};
+    HessraAuthorizerCacheStats stats;
+
+    if (get_call_result_type(fcinfo, NULL, &tupdesc) != TYPEFUNC_COMPOSITE)
+        elog(ERROR, "return type must be a row type");
+
+    if (hessra_authorizer_cache_stats(&stats) != SUCCESS)
+        ereport(ERROR,
+                (errcode(ERRCODE_EXTERNAL_ROUTINE_INVOCATION_EXCEPTION),
+                 errmsg("Failed to read the Hessra authorizer cache statistics")));
+
+    values[0] = Int64GetDatum((int64) stats.entries);
+    values[1] = Int64GetDatum((int64) stats.capacity);
+    values[2] = Int64GetDatum((int64) stats.hits);
+    values[3] = Int64GetDatum((int64) stats.misses);
+    if (stats.hits + stats.misses > 0)
+        values[4] = Float8GetDatum((double) stats.hits / (double) (stats.hits + stats.misses));
+    else
+        nulls[4] = true;
+
+    PG_RETURN_DATUM(HeapTupleGetDatum(heap_form_tuple(BlessTupleDesc(tupdesc), values, nulls)));
+}
+
+/**
+ * SQL-callable function removing all entries from the shared result cache.
+ *
+ * Returns:
+ *   The number of entries removed.
+ */
+Datum
+pg_hessra_result_cache_flush(PG_FUNCTION_ARGS)
+{
+    HASH_SEQ_STATUS hash_seq;
+    HessraResultCacheEntry *entry;
+    int64 removed = 0;
+
+    if (hessra_result_cache == NULL)
+        PG_RETURN_INT64(0);
+
+    LWLockAcquire(hessra_shared->lock, LW_EXCLUSIVE);
+
+    hash_seq_init(&hash_seq, hessra_result_cache);
+    while ((entry = hash_seq_search(&hash_seq)) != NULL) {
+        hash_search(hessra_result_cache, &entry->key, HASH_REMOVE, NULL);
+        removed++;
+    }
+
+    LWLockRelease(hessra_shared->lock);
+
+    PG_RETURN_INT64(removed);
+}
+
+/**
+ * SQL-callable function returning the verification statistics behind the
+ * pg_stat_hessra view, one row per function.
+ *
+ * Returns:
+ *   A set of records (function, calls, one count per HessraResult code,
+ *   cache_hits, cache_misses, total_time, key_load_time, verify_time,
+ *   latency_histogram, stats_reset). Times are in milliseconds. Empty unless
+ *   hessra_authz is listed in shared_preload_libraries.
+ */
+Datum
+pg_hessra_stat_functions(PG_FUNCTION_ARGS)
+{
+    ReturnSetInfo *rsinfo = (ReturnSetInfo *) fcinfo->resultinfo;
+    TupleDesc tupdesc;
+    Tuplestorestate *tupstore;
+    MemoryContext oldcontext;
+    TimestampTz stats_reset;
+    int f;
+
+    if (rsinfo == NULL || !IsA(rsinfo, ReturnSetInfo) ||
+        (rsinfo->allowedModes & SFRM_Materialize) == 0)
+        ereport(ERROR,
+                (errcode(ERRCODE_FEATURE_NOT_SUPPORTED),
+                 errmsg("set-valued function called in context that cannot accept a set")));
+
+    oldcontext = MemoryContextSwitchTo(rsinfo->econtext->ecxt_per_query_memory);
+
+    if (get_call_result_type(fcinfo, NULL, &tupdesc) != TYPEFUNC_COMPOSITE)
+        elog(ERROR, "return type must be a row type");
+
+    tupstore = tuplestore_begin_heap(true, false, work_mem);
+    rsinfo->returnMode = SFRM_Materialize;
+    rsinfo->setResult = tupstore;
+    rsinfo->setDesc = tupdesc;
+
+    MemoryContextSwitchTo(oldcontext);
+
+    if (hessra_shared == NULL)
+        return (Datum) 0;
+
+    // Include this backend's own calls
+    hessra_stats_flush();
+
+    stats_reset = (TimestampTz) pg_atomic_read_u64(&hessra_shared->stats_reset);
+
+    for (f = 0; f < HESSRA_STAT_NUM_FUNCTIONS; f++) {
+        HessraFunctionCounters counters;
+        uint64 *counter_array = (uint64 *) &counters;
+        Datum histogram[HESSRA_STAT_HISTOGRAM_BUCKETS];
+        Datum values[HESSRA_STAT_COLUMNS];
+        bool nulls[HESSRA_STAT_COLUMNS];
+        int c;
+        int col = 0;
+
+        for (c = 0; c < HESSRA_STAT_NUM_COUNTERS; c++)
+            counter_array[c] = pg_atomic_read_u64(&hessra_shared->function_stats[f][c]);
+
+        for (c = 0; c < HESSRA_STAT_HISTOGRAM_BUCKETS; c++)
+            histogram[c] = Int64GetDatum((int64) counters.latency_histogram[c]);
+
+        memset(nulls, 0, sizeof(nulls));
+        values[col++] = CStringGetTextDatum(hessra_stat_function_names[f]);
+        values[col++] = Int64GetDatum((int64) counters.calls);
+        for (c = 0; c < HESSRA_STAT_NUM_RESULTS; c++)
+            values[col++] = Int64GetDatum((int64) counters.results[c]);
+        values[col++] = Int64GetDatum((int64) counters.cache_hits);
+        values[col++] = Int64GetDatum((int64) counters.cache_misses);
+        values[col++] = Float8GetDatum((counters.key_load_time_us + counters.verify_time_us) / 1000.0);
+        values[col++] = Float8GetDatum(counters.key_load_time_us / 1000.0);
+        values[col++] = Float8GetDatum(counters.verify_time_us / 1000.0);
+        values[col++] = PointerGetDatum(construct_array(histogram, HESSRA_STAT_HISTOGRAM_BUCKETS,
+                                                        INT8OID, sizeof(int64), FLOAT8PASSBYVAL,
+                                                        TYPALIGN_DOUBLE));
+        values[col++] = TimestampTzGetDatum(stats_reset);
+
+        tuplestore_putvalues(tupstore, tupdesc, values, nulls);
+    }
+
+    return (Datum) 0;
+}
+
+/**
+ * SQL-callable function resetting the statistics shown by pg_stat_hessra.
+ */
+Datum
+pg_hessra_stat_reset(PG_FUNCTION_ARGS)
+{
+    int f;
+    int c;
+
+    // Pending counts of this backend predate the reset
+    memset(hessra_pending_stats, 0, sizeof(hessra_pending_stats));
+    hessra_pending_calls = 0;
+
+    if (hessra_shared == NULL)
+        PG_RETURN_VOID();
+
+    for (f = 0; f < HESSRA_STAT_NUM_FUNCTIONS; f++)
+        for (c = 0; c < HESSRA_STAT_NUM_COUNTERS; c++)
+            pg_atomic_write_u64(&hessra_shared->function_stats[f][c], 0);
+    pg_atomic_write_u64(&hessra_shared->stats_reset, (uint64) GetCurrentTimestamp());
+
+    PG_RETURN_VOID();
+}
+
+// --- Token Type ---
+
+/**
+ * Input function of the hessra_token type.
+ *
+ * Decodes the base64 token and stores the raw token bytes, which are about
+ * a quarter smaller and are handed to the FFI without being decoded again.
+ * The token's structure is checked, its signatures are not: those depend
+ * on the key used at verification time.
+ */
+Datum
+pg_hessra_token_in(PG_FUNCTION_ARGS)
+{
+    char *token_str = PG_GETARG_CSTRING(0);
+    size_t capacity = strlen(token_str);
+    bytea *result = palloc(VARHDRSZ + capacity);
+    uintptr_t len;
+
+    if (hessra_token_decode(token_str, (uint8 *) VARDATA(result), capacity, &len) != SUCCESS) {
+#if PG_VERSION_NUM >= 160000
+        ereturn(fcinfo->context, (Datum) 0,
+                (errcode(ERRCODE_INVALID_TEXT_REPRESENTATION),
+                 errmsg("invalid input syntax for type %s", "hessra_token")));
+#else
+        ereport(ERROR,
+                (errcode(ERRCODE_INVALID_TEXT_REPRESENTATION),
+                 errmsg("invalid input syntax for type %s", "hessra_token")));
+#endif
+    }
+
+    SET_VARSIZE(result, VARHDRSZ + len);
+    PG_RETURN_BYTEA_P(result);
+}
+
+/**
+ * Output function of the hessra_token type, producing standard base64.
+ */
+Datum
+pg_hessra_token_out(PG_FUNCTION_ARGS)
+{
+    bytea *token = PG_GETARG_BYTEA_PP(0);
+    int len = VARSIZE_ANY_EXHDR(token);
+    int enc_len = pg_b64_enc_len(len);
+    char *result = palloc(enc_len + 1);
+
+    enc_len = pg_b64_encode(VARDATA_ANY(token), len, result, enc_len);
+    if (enc_len < 0)
+        elog(ERROR, "could not encode hessra_token");
+    result[enc_len] = '\0';
+
+    PG_RETURN_CSTRING(result);
+}
+
+/**
+ * Binary input function of the hessra_token type: the raw token bytes.
+ */
+Datum
+pg_hessra_token_recv(PG_FUNCTION_ARGS)
+{
+    StringInfo buf = (StringInfo) PG_GETARG_POINTER(0);
+    int len = buf->len - buf->cursor;
+    bytea *result = palloc(VARHDRSZ + len);
+
+    SET_VARSIZE(result, VARHDRSZ + len);
+    pq_copymsgbytes(buf, VARDATA(result), len);
+
+    if (hessra_token_check_bytes((const uint8 *) VARDATA(result), len) != SUCCESS)
+        ereport(ERROR,
+                (errcode(ERRCODE_INVALID_BINARY_REPRESENTATION),
+                 errmsg("invalid external hessra_token value")));
+
+    PG_RETURN_BYTEA_P(result);
+}
+
+/**
+ * Binary output function of the hessra_token type.
+ */
+Datum
+pg_hessra_token_send(PG_FUNCTION_ARGS)
+{
+    PG_RETURN_BYTEA_P(PG_GETARG_BYTEA_P_COPY(0));
+}
@@ -2,7 +2,8 @@
 CREATE FUNCTION verify_hessra_service_chain(token TEXT, subject TEXT, resource TEXT, service_nodes_json TEXT, component TEXT)
 RETURNS BOOLEAN
 AS '$libdir/hessra_authz', 'pg_verify_hessra_service_chain'
-LANGUAGE C STRICT IMMUTABLE;
+LANGUAGE C STRICT STABLE PARALLEL SAFE
+COST 2000;
 
 -- Helper function to verify service chain token in a more user-friendly way
 CREATE OR REPLACE FUNCTION verify_hessra_service_chain_access(
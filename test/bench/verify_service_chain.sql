@@ -0,0 +1,4 @@
+-- pgbench script: service chain verification with the chain given as JSON
+-- Run with -M prepared and -D token=... -D subject=... -D resource=...
+-- -D service_nodes=... -D component=...
+SELECT verify_hessra_service_chain(:token, :subject, :resource, :service_nodes, :component);
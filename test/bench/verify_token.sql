@@ -0,0 +1,3 @@
+-- pgbench script: full verification of one token per transaction
+-- Run with -M prepared and -D token=... -D subject=... -D resource=...
+SELECT verify_hessra_token(:token, :subject, :resource);
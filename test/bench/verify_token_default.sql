@@ -0,0 +1,3 @@
+-- pgbench script: verification with the default key from hessra_public_keys
+-- Run with -M prepared and -D token=... -D subject=... -D resource=...
+SELECT verify_hessra_token_default(:token, :subject, :resource);
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for Hessra token verification in PostgreSQL
+
+Measures verifications/s and p50/p99 latency of verify_hessra_token,
+verify_hessra_service_chain for each chain length in service_chain_tokens.json,
+verify_hessra_token_default, and of a scan of an RLS-protected table. The
+single-call scenarios run the pgbench scripts in bench/; the RLS scans are
+timed from Python, with and without the policy applied.
+
+Results can be written to a JSON file and compared against a previous run:
+
+    python bench_verification.py --output baseline.json
+    python bench_verification.py --baseline baseline.json
+
+A scenario regresses when its throughput drops, or its p99 latency grows, by
+more than --tolerance relative to the baseline. The exit status is 1 if any
+scenario regressed.
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from test_token_verification import (
+    load_test_tokens, get_db_connection,
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+)
+from test_service_chain import load_service_chain_tokens
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench")
+KEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hessra_key.pem")
+
+BENCH_ROLE = "hessra_bench_reader"
+BENCH_KEY_NAME = "hessra_bench_default"
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies_ms, verifications, elapsed):
+    """Throughput and latency percentiles of one scenario"""
+    latencies_ms = sorted(latencies_ms)
+    return {
+        "verifications_per_sec": verifications / elapsed if elapsed > 0 else None,
+        "p50_ms": percentile(latencies_ms, 0.50),
+        "p99_ms": percentile(latencies_ms, 0.99),
+        "samples": len(latencies_ms),
+    }
+
+
+def run_pgbench(args, script, variables):
+    """Run a pgbench script and summarize its per-transaction log"""
+    command = [
+        args.pgbench, "-n", "-M", "prepared",
+        "-h", DB_HOST, "-p", str(DB_PORT), "-U", DB_USER,
+        "-c", str(args.clients), "-j", str(args.clients),
+        "-T", str(args.duration),
+        "-f", os.path.join(BENCH_DIR, script),
+    ]
+    for name, value in variables.items():
+        command += ["-D", f"{name}={value}"]
+
+    log_dir = tempfile.mkdtemp(prefix="hessra_bench_")
+    try:
+        command += ["-l", "--log-prefix", os.path.join(log_dir, "pgbench_log"), DB_NAME]
+        environment = dict(os.environ, PGPASSWORD=DB_PASSWORD)
+        result = subprocess.run(command, capture_output=True, text=True, env=environment)
+        if result.returncode != 0:
+            raise RuntimeError(f"pgbench failed for {script}: {result.stderr.strip()}")
+
+        # Each line: client_id transaction_no time_us script_no epoch epoch_us
+        latencies_ms = []
+        for path in glob.glob(os.path.join(log_dir, "pgbench_log*")):
+            with open(path, "r") as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 3:
+                        latencies_ms.append(int(fields[2]) / 1000.0)
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+    summary = summarize(latencies_ms, len(latencies_ms), args.duration)
+    match = re.search(r"tps = ([0-9.]+)", result.stdout)
+    if match:
+        summary["verifications_per_sec"] = float(match.group(1))
+    return summary
+
+
+def bench_single_calls(args, cur):
+    """verify_hessra_token, verify_hessra_token_default and service chains of each length"""
+    results = {}
+    token = next(t for t in load_test_tokens() if t.expected_result)
+    token_variables = {"token": token.token, "subject": token.subject, "resource": token.resource}
+
+    print("Benchmarking verify_hessra_token...")
+    results["verify_hessra_token"] = run_pgbench(args, "verify_token.sql", token_variables)
+
+    # Use the bundled key as the default key, unless one is configured already
+    cur.execute("SELECT count(*) FROM hessra_public_keys WHERE is_default")
+    insert_default = cur.fetchone()[0] == 0
+    if insert_default:
+        with open(KEY_FILE, "r") as f:
+            cur.execute(
+                "INSERT INTO hessra_public_keys (key_name, public_key, is_default) VALUES (%s, %s, TRUE)",
+                (BENCH_KEY_NAME, f.read())
+            )
+    try:
+        print("Benchmarking verify_hessra_token_default...")
+        results["verify_hessra_token_default"] = run_pgbench(args, "verify_token_default.sql", token_variables)
+    finally:
+        if insert_default:
+            cur.execute("DELETE FROM hessra_public_keys WHERE key_name = %s", (BENCH_KEY_NAME,))
+
+    for chain_token in load_service_chain_tokens():
+        if not chain_token.service_nodes:
+            continue
+        length = len(chain_token.service_nodes)
+        print(f"Benchmarking verify_hessra_service_chain with {length} node(s)...")
+        results[f"verify_hessra_service_chain_{length}"] = run_pgbench(args, "verify_service_chain.sql", {
+            "token": chain_token.token,
+            "subject": chain_token.subject,
+            "resource": chain_token.resource,
+            "service_nodes": json.dumps({"service_nodes": chain_token.service_nodes}),
+            "component": chain_token.service_nodes[-1]["component"],
+        })
+
+    return results
+
+
+def setup_rls_table(cur, rows, resources):
+    """Create an RLS-protected table with the given number of rows"""
+    table = f"hessra_bench_documents_{rows}"
+    cur.execute(f"DROP TABLE IF EXISTS {table}")
+    cur.execute(f"CREATE TABLE {table} (id BIGINT PRIMARY KEY, resource_id TEXT, body TEXT)")
+    cur.execute(
+        f"""
+        INSERT INTO {table}
+        SELECT g, (%s::text[])[1 + g %% %s], md5(g::text)
+        FROM generate_series(1, %s) AS g
+        """,
+        (resources, len(resources), rows)
+    )
+    cur.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY")
+    cur.execute(
+        f"""
+        CREATE POLICY hessra_bench_access ON {table}
+        USING (verify_hessra_token(current_setting('app.current_token'),
+                                   current_setting('app.current_subject'),
+                                   resource_id))
+        """
+    )
+    cur.execute(f"GRANT SELECT ON {table} TO {BENCH_ROLE}")
+    cur.execute(f"ANALYZE {table}")
+    return table
+
+
+def time_scan(cur, table, iterations):
+    """Latencies in ms of repeated full scans of table"""
+    latencies_ms = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        cur.execute(f"SELECT count(*) FROM {table}")
+        cur.fetchone()
+        latencies_ms.append((time.perf_counter() - start) * 1000.0)
+    return latencies_ms
+
+
+def bench_rls_scans(args, conn):
+    """Scans of RLS-protected tables, compared with the same scan bypassing RLS"""
+    results = {}
+    tokens = load_test_tokens()
+    token = next(t for t in tokens if t.expected_result)
+    resources = sorted({t.resource for t in tokens})
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_roles WHERE rolname = %s", (BENCH_ROLE,))
+        if cur.fetchone() is None:
+            cur.execute(f"CREATE ROLE {BENCH_ROLE} NOLOGIN")
+
+        for rows in args.rls_rows:
+            print(f"Benchmarking an RLS-protected scan of {rows} rows...")
+            table = setup_rls_table(cur, rows, resources)
+            try:
+                cur.execute("SELECT set_config('app.current_token', %s, false)", (token.token,))
+                cur.execute("SELECT set_config('app.current_subject', %s, false)", (token.subject,))
+
+                # The table owner (a superuser here) bypasses the policy
+                plain = time_scan(cur, table, args.rls_iterations)
+
+                cur.execute(f"SET ROLE {BENCH_ROLE}")
+                protected = time_scan(cur, table, args.rls_iterations)
+                cur.execute("RESET ROLE")
+
+                summary = summarize(protected, rows * len(protected), sum(protected) / 1000.0)
+                summary["rows"] = rows
+                summary["plain_p50_ms"] = percentile(sorted(plain), 0.50)
+                summary["overhead"] = summary["p50_ms"] / summary["plain_p50_ms"]
+                results[f"rls_scan_{rows}"] = summary
+            finally:
+                cur.execute("RESET ROLE")
+                cur.execute(f"DROP TABLE IF EXISTS {table}")
+
+        cur.execute(f"DROP ROLE IF EXISTS {BENCH_ROLE}")
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the list of regressions of results against baseline"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+
+        if previous.get("verifications_per_sec") and current.get("verifications_per_sec") is not None:
+            floor = previous["verifications_per_sec"] * (1.0 - tolerance)
+            if current["verifications_per_sec"] < floor:
+                regressions.append(
+                    f"{name}: {current['verifications_per_sec']:,.0f} verifications/s, "
+                    f"baseline {previous['verifications_per_sec']:,.0f}"
+                )
+
+        if previous.get("p99_ms") and current.get("p99_ms") is not None:
+            ceiling = previous["p99_ms"] * (1.0 + tolerance)
+            if current["p99_ms"] > ceiling:
+                regressions.append(
+                    f"{name}: p99 {current['p99_ms']:.3f} ms, baseline {previous['p99_ms']:.3f} ms"
+                )
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=int, default=10, help="seconds per pgbench scenario")
+    parser.add_argument("--clients", type=int, default=4, help="pgbench clients (and threads)")
+    parser.add_argument("--rls-rows", type=lambda s: [int(n) for n in s.split(",")],
+                        default=[10000, 1000000], help="comma-separated row counts of the RLS scans")
+    parser.add_argument("--rls-iterations", type=int, default=5, help="scans per RLS table")
+    parser.add_argument("--result-cache", action="store_true",
+                        help="keep the shared result cache enabled (disabled by default)")
+    parser.add_argument("--pgbench", default=os.environ.get("PGBENCH", "pgbench"), help="pgbench executable")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed relative slowdown before a scenario counts as a regression")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if shutil.which(args.pgbench) is None:
+        print(f"ERROR: {args.pgbench} not found; set --pgbench or PGBENCH")
+        sys.exit(1)
+
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version")
+            server_version = cur.fetchone()[0]
+
+            if not args.result_cache:
+                # Measure verification itself, not the shared result cache
+                cur.execute("ALTER SYSTEM SET hessra.result_cache_ttl = 0")
+                cur.execute("SELECT pg_reload_conf()")
+                time.sleep(1)
+
+            try:
+                results = bench_single_calls(args, cur)
+                results.update(bench_rls_scans(args, conn))
+            finally:
+                if not args.result_cache:
+                    cur.execute("ALTER SYSTEM RESET hessra.result_cache_ttl")
+                    cur.execute("SELECT pg_reload_conf()")
+    finally:
+        conn.close()
+
+    report = {
+        "metadata": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "server_version": server_version,
+            "duration": args.duration,
+            "clients": args.clients,
+            "result_cache": args.result_cache,
+        },
+        "results": results,
+    }
+
+    print("\nScenario                               verifications/s      p50 ms      p99 ms")
+    for name, summary in results.items():
+        print(f"{name:<38} {summary['verifications_per_sec']:>16,.0f} {summary['p50_ms']:>11.3f} {summary['p99_ms']:>11.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n‼️ {len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\n✓ No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -91,6 +91,72 @@ echo ""
 echo "Running basic token verification tests..."
 docker-compose -f docker-compose.test.yml run --rm test-runner
 
+# Run the shared result cache tests
+echo ""
+echo "Running Result Cache Tests..."
+echo "-----------------------------"
+docker-compose -f docker-compose.test.yml run --rm --entrypoint python test-runner test_result_cache.py
+
+# Run the default key tests (keys stored in hessra_public_keys)
+echo ""
+echo "Running Default Key Tests..."
+echo "----------------------------"
+docker-compose -f docker-compose.test.yml run --rm --entrypoint python test-runner test_default_key.py
+
+# Run the parallel query tests
+echo ""
+echo "Running Parallel Query Tests..."
+echo "-------------------------------"
+docker-compose -f docker-compose.test.yml run --rm --entrypoint python test-runner test_parallel_verification.py
+
+# Run the session token tests
+echo ""
+echo "Running Session Token Tests..."
+echo "------------------------------"
+docker-compose -f docker-compose.test.yml run --rm --entrypoint python test-runner test_session_token.py
+
+# Run the planner support tests
+echo ""
+echo "Running Planner Support Tests..."
+echo "--------------------------------"
+docker-compose -f docker-compose.test.yml run --rm --entrypoint python test-runner test_planner_support.py
+
+# Run the verification statistics tests
+echo ""
+echo "Running Statistics Tests..."
+echo "---------------------------"
+docker-compose -f docker-compose.test.yml run --rm --entrypoint python test-runner test_stat_hessra.py
+
+# Run the hessra_token type tests
+echo ""
+echo "Running Token Type Tests..."
+echo "---------------------------"
+docker-compose -f docker-compose.test.yml run --rm --entrypoint python test-runner test_token_type.py
+
+# Run the token revocation tests
+echo ""
+echo "Running Revocation Tests..."
+echo "---------------------------"
+docker-compose -f docker-compose.test.yml run --rm --entrypoint python test-runner test_revocation.py
+
+# Run the key watcher tests
+echo ""
+echo "Running Key Watcher Tests..."
+echo "----------------------------"
+docker-compose -f docker-compose.test.yml run --rm --entrypoint python test-runner test_key_watcher.py
+
+# Run the Python client tests
+echo ""
+echo "Running Client Tests..."
+echo "-----------------------"
+docker-compose -f docker-compose.test.yml run --rm --entrypoint python test-runner test_client.py
+
+# Run the authorizer cache tests
+echo ""
+echo "Running Authorizer Cache Tests..."
+echo "---------------------------------"
+docker-compose -f docker-compose.test.yml run --rm --entrypoint python test-runner test_authorizer_cache.py
+
 # If we want to run service chain tests specifically
 if [ "$RUN_SERVICE_CHAIN_TESTS" = true ]; then
     echo ""
@@ -20,7 +20,7 @@ CREATE OR REPLACE FUNCTION access_service_with_chain_from_db(
     chain_verified BOOLEAN
 ) AS $$
 DECLARE
-    chain_valid BOOLEAN;
+    verification RECORD;
     service_nodes_json TEXT;
 BEGIN
     -- First try to get the service chain from the database if the tables exist
@@ -41,8 +41,9 @@ BEGIN
         service_nodes_json := p_service_chain_json;
     END IF;
     
-    -- Call the C function with the JSON data we have
-    chain_valid := verify_hessra_service_chain(
+    -- Verify the token, its authorization and the chain in one pass
+    SELECT * INTO verification
+    FROM hessra_verify_detailed(
         p_token, 
         p_subject, 
         p_service_id, 
@@ -50,27 +51,18 @@ BEGIN
         p_component
     );
     
-    IF chain_valid THEN
-        -- If chain verification passes, return full service information
+    IF verification.authorized THEN
+        -- Full service information, whether or not the chain is complete
         RETURN QUERY
-            SELECT s.id, s.service_id, s.description, s.access_level, TRUE, TRUE
+            SELECT s.id, s.service_id, s.description, s.access_level, TRUE, COALESCE(verification.chain_valid, FALSE)
             FROM services s
             WHERE s.service_id = p_service_id;
     ELSE
-        -- If chain verification fails, try basic verification
-        IF verify_hessra_token(p_token, p_subject, p_service_id) THEN
-            -- Basic verification passed, but chain verification failed
-            RETURN QUERY
-                SELECT s.id, s.service_id, s.description, s.access_level, TRUE, FALSE
-                FROM services s
-                WHERE s.service_id = p_service_id;
-        ELSE
-            -- Both verifications failed
-            RETURN QUERY
-                SELECT s.id, s.service_id, s.description, NULL::TEXT, FALSE, FALSE
-                FROM services s
-                WHERE s.service_id = p_service_id;
-        END IF;
+        -- Authorization failed
+        RETURN QUERY
+            SELECT s.id, s.service_id, s.description, NULL::TEXT, FALSE, FALSE
+            FROM services s
+            WHERE s.service_id = p_service_id;
     END IF;
 END;
 $$ LANGUAGE plpgsql;
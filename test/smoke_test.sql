@@ -34,6 +34,8 @@ SELECT 'verify_hessra_service_chain_by_name' AS function_name,
        EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'verify_hessra_service_chain_by_name') AS exists;
 SELECT 'get_service_chain_json' AS function_name, 
        EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'get_service_chain_json') AS exists;
+SELECT 'verify_hessra_token_default' AS function_name, 
+       EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'verify_hessra_token_default' AND prolang = (SELECT oid FROM pg_language WHERE lanname = 'c')) AS exists;
 
 -- Verify the tables have the expected structure
 SELECT 'Checking hessra_public_keys table structure...' AS operation;
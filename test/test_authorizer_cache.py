@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-backend authorizer template cache
+"""
+import json
+import sys
+import time
+
+from test_token_verification import load_test_tokens, get_db_connection
+from test_service_chain import load_service_chain_tokens
+
+REPEATS = 20
+
+
+def get_cache_stats(cur):
+    """Return (entries, capacity, hits, misses, hit_rate) from hessra_authorizer_cache_stats()"""
+    cur.execute("SELECT entries, capacity, hits, misses, hit_rate FROM hessra_authorizer_cache_stats()")
+    return cur.fetchone()
+
+
+def disable_result_cache(cur):
+    """Make every call reach the authorizer instead of the shared result cache"""
+    cur.execute("ALTER SYSTEM SET hessra.result_cache_ttl = 0")
+    cur.execute("SELECT pg_reload_conf()")
+    time.sleep(1)
+
+
+def restore_result_cache(cur):
+    cur.execute("ALTER SYSTEM RESET hessra.result_cache_ttl")
+    cur.execute("SELECT pg_reload_conf()")
+
+
+def test_templates_are_reused():
+    """Repeated checks of a resource must hit the cache and give the same verdicts as without it"""
+    tokens = load_test_tokens()
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            disable_result_cache(cur)
+
+            def verify_all():
+                results = []
+                for token in tokens:
+                    cur.execute(
+                        "SELECT verify_hessra_token(%s, %s, %s)",
+                        (token.token, token.subject, token.resource)
+                    )
+                    results.append(cur.fetchone()[0])
+                return results
+
+            cur.execute("SET hessra.authorizer_cache_size = 0")
+            uncached = verify_all()
+            entries, capacity, _, _, _ = get_cache_stats(cur)
+            assert entries == 0 and capacity == 0, "A size of 0 should disable the cache"
+
+            cur.execute("RESET hessra.authorizer_cache_size")
+            _, _, hits_before, misses_before, _ = get_cache_stats(cur)
+            for _ in range(REPEATS):
+                assert verify_all() == uncached, "Cached templates should not change any verdict"
+            entries, capacity, hits, misses, hit_rate = get_cache_stats(cur)
+            print(f"entries={entries}, capacity={capacity}, hits={hits}, misses={misses}, hit_rate={hit_rate}")
+
+            resources = {token.resource for token in tokens}
+            assert misses - misses_before <= len(resources), \
+                f"Expected at most one miss per resource, got {misses - misses_before}"
+            # Tokens with invalid signatures never reach the authorizer
+            assert hits - hits_before >= (REPEATS - 1) * (misses - misses_before), \
+                "Expected repeated checks to hit the cache"
+            assert hits > hits_before, "Expected repeated checks to hit the cache"
+            print("✓ Authorizer templates are reused across checks")
+
+            cur.execute("SET hessra.authorizer_cache_size = 1")
+            entries, capacity, _, _, _ = get_cache_stats(cur)
+            assert capacity == 1 and entries <= 1, "Shrinking the cache should evict templates"
+            print("✓ Shrinking the cache evicts templates")
+    finally:
+        with conn.cursor() as cur:
+            restore_result_cache(cur)
+        conn.close()
+
+
+def test_service_chain_templates():
+    """Service chain checks must give the same verdicts with and without cached templates"""
+    tokens = load_service_chain_tokens()
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            disable_result_cache(cur)
+
+            for token in tokens:
+                service_nodes_json = json.dumps({"service_nodes": token.service_nodes})
+                components = [node["component"] for node in token.service_nodes] + ["nonexistent_service"]
+
+                for component in components:
+                    results = []
+                    for size in (0, 1000, 1000):
+                        cur.execute("SET hessra.authorizer_cache_size = %s", (size,))
+                        cur.execute(
+                            "SELECT verify_hessra_service_chain(%s, %s, %s, %s, %s)",
+                            (token.token, token.subject, token.resource, service_nodes_json, component)
+                        )
+                        results.append(cur.fetchone()[0])
+                    assert len(set(results)) == 1, \
+                        f"Token {token.name}, component {component}: verdicts differ: {results}"
+            print("✓ Service chain verdicts do not depend on the template cache")
+    finally:
+        with conn.cursor() as cur:
+            restore_result_cache(cur)
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("Running Hessra authorizer cache tests...")
+
+    try:
+        test_templates_are_reused()
+        test_service_chain_templates()
+        print("\nAuthorizer cache tests completed - check output for failures.")
+    except Exception as e:
+        print(f"\nError running tests: {e}")
+        sys.exit(1)
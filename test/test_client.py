@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Test script for the asyncio client in client/hessra_client.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+from test_token_verification import (
+    load_test_tokens, get_db_connection,
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+
+from hessra_client import HessraClient  # noqa: E402
+
+CONNINFO = f"host={DB_HOST} port={DB_PORT} dbname={DB_NAME} user={DB_USER} password={DB_PASSWORD}"
+
+# Each test token is repeated this many times in the throughput check
+COPIES = 500
+
+
+def expected_results(tokens):
+    """verify_hessra_token for every (token, subject, resource), one call at a time"""
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            results = []
+            for token in tokens:
+                cur.execute(
+                    "SELECT verify_hessra_token(%s, %s, %s)",
+                    (token.token, token.subject, token.resource)
+                )
+                results.append(cur.fetchone()[0])
+            return results
+    finally:
+        conn.close()
+
+
+async def check_bulk_verification():
+    tokens = load_test_tokens()
+    requests = [(t.token, t.subject, t.resource) for t in tokens]
+    expected = expected_results(tokens)
+
+    async with HessraClient(CONNINFO, batch_size=3, max_size=4) as client:
+        results = await client.verify_many(requests)
+        assert results == expected, f"verify_many returned {results}, expected {expected}"
+        print("✓ verify_many matches verify_hessra_token across batches")
+
+        results = await client.verify_pipelined(requests)
+        assert results == expected, f"verify_pipelined returned {results}, expected {expected}"
+        print("✓ verify_pipelined matches verify_hessra_token")
+
+        results = await client.verify_many(requests + [(None, tokens[0].subject, tokens[0].resource)])
+        assert results == expected + [None], "A request with a NULL token should yield None"
+        print("✓ verify_many yields None for incomplete requests")
+
+        start = time.monotonic()
+        results = await client.verify_many(requests * COPIES)
+        elapsed = time.monotonic() - start
+        assert results == expected * COPIES, "verify_many should agree for repeated tokens"
+        print(f"verify_many: {len(results) / elapsed:,.0f} verifications/s")
+
+
+async def check_session_tokens():
+    token = next(t for t in load_test_tokens() if t.expected_result)
+
+    async with HessraClient(CONNINFO, min_size=1, max_size=1,
+                            settings={"hessra.bulk_workers": "2"}) as client:
+        async with client.session(token.token, token.subject) as session:
+            assert await session.authorized(token.resource), "Expected the session token to grant access"
+            results = await session.authorized_many([token.resource, "no_such_resource"])
+            assert results == [True, False], f"authorized_many returned {results}"
+        print("✓ Sessions authorize with the session token")
+
+        # With a single pooled connection, the next checkout gets the same backend
+        async with client._pool.connection() as conn:
+            cur = await conn.execute("SELECT hessra_authorized(%s), current_setting('hessra.bulk_workers')",
+                                     (token.resource,))
+            authorized, bulk_workers = await cur.fetchone()
+            assert not authorized, "The session token should be cleared when the connection is returned"
+            assert bulk_workers == "2", "Settings should apply to pooled connections"
+        print("✓ Session tokens are cleared when the connection returns to the pool")
+
+        try:
+            async with client.session("invalid", token.subject):
+                assert False, "An invalid token should not open a session"
+        except PermissionError:
+            pass
+        print("✓ Invalid tokens are rejected")
+
+
+async def check_revoked_tokens():
+    token = next(t for t in load_test_tokens() if t.expected_result)
+    request = (token.token, token.subject, token.resource)
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT hessra_revoke_token(%s, 'test')", (token.token,))
+
+        async with HessraClient(CONNINFO, batch_size=3, max_size=2) as client:
+            assert await client.verify(*request) is False, "verify should reject a revoked token"
+            assert await client.verify_many([request] * 5) == [False] * 5, \
+                "verify_many should reject a revoked token"
+            assert await client.verify_pipelined([request] * 5) == [False] * 5, \
+                "verify_pipelined should reject a revoked token"
+            assert await client.verify_resources(token.token, token.subject, [token.resource]) == [False], \
+                "verify_resources should reject a revoked token"
+            try:
+                async with client.session(token.token, token.subject):
+                    assert False, "A revoked token should not open a session"
+            except PermissionError:
+                pass
+        print("✓ Every client method rejects a revoked token")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM hessra_revoked_tokens WHERE revocation_id = ANY(hessra_token_revocation_ids(%s))",
+                (token.token,)
+            )
+        conn.close()
+
+
+def test_bulk_verification():
+    """Bulk and pipelined verification must agree with verify_hessra_token"""
+    asyncio.run(check_bulk_verification())
+
+
+def test_session_tokens():
+    """Sessions must set the token and the pool must clear it on return"""
+    asyncio.run(check_session_tokens())
+
+
+def test_revoked_tokens():
+    """A revoked token must be rejected by every client method"""
+    asyncio.run(check_revoked_tokens())
+
+
+if __name__ == "__main__":
+    print("Running Hessra client tests...")
+
+    try:
+        test_bulk_verification()
+        test_session_tokens()
+        test_revoked_tokens()
+        print("\nClient tests completed - check output for failures.")
+    except Exception as e:
+        print(f"\nError running tests: {e}")
+        sys.exit(1)
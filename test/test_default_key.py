@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script for verify_hessra_token_default with keys stored in hessra_public_keys
+"""
+import sys
+
+from test_token_verification import load_test_tokens, get_db_connection
+
+KEY_FILE = "hessra_key.pem"
+
+# A well-formed key that did not sign any of the test tokens
+OTHER_KEY = "ed25519/e57618058b1d2e0381a9813c1405830d5ed7d603717384ef555d9cc0cfa65d83"
+
+
+def verify_all_default(cur, tokens):
+    """Return {token name: verify_hessra_token_default result}"""
+    results = {}
+    for token in tokens:
+        cur.execute(
+            "SELECT verify_hessra_token_default(%s, %s, %s)",
+            (token.token, token.subject, token.resource)
+        )
+        results[token.name] = cur.fetchone()[0]
+    return results
+
+
+def test_default_key_from_table():
+    """Tokens verify against the default key in the table, and key changes take effect immediately"""
+    tokens = load_test_tokens()
+    with open(KEY_FILE, "r") as f:
+        pem_key = f.read()
+
+    conn = get_db_connection()
+    conn.autocommit = False
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM hessra_public_keys")
+            cur.execute(
+                "INSERT INTO hessra_public_keys (key_name, public_key, is_default) VALUES (%s, %s, TRUE)",
+                ("test_default_key", pem_key)
+            )
+
+            results = verify_all_default(cur, tokens)
+            for token in tokens:
+                print(f"{token.name}: {results[token.name]} (expected: {token.expected_result})")
+                assert results[token.name] == token.expected_result, \
+                    f"Token {token.name}: expected {token.expected_result}, got {results[token.name]}"
+            print("✓ Tokens verify against the default key from hessra_public_keys")
+
+            # Replacing the key must invalidate the cached one
+            cur.execute("UPDATE hessra_public_keys SET public_key = %s WHERE is_default", (OTHER_KEY,))
+            results = verify_all_default(cur, tokens)
+            assert not any(results.values()), \
+                f"Expected all tokens to fail with a different default key, got {results}"
+            print("✓ Updating the default key takes effect on the next call")
+
+            # Without a default key, the configured key file is used
+            cur.execute("UPDATE hessra_public_keys SET is_default = FALSE")
+            results = verify_all_default(cur, tokens)
+            for token in tokens:
+                assert results[token.name] == token.expected_result, \
+                    f"Token {token.name}: expected {token.expected_result} from the key file, got {results[token.name]}"
+            print("✓ Falls back to the key file when no default key is set")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def test_keyring_from_table():
+    """Keys with a key_id form a keyring; tokens without a known root key id use the default key"""
+    tokens = load_test_tokens()
+    with open(KEY_FILE, "r") as f:
+        pem_key = f.read()
+
+    conn = get_db_connection()
+    conn.autocommit = False
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM hessra_public_keys")
+            cur.execute(
+                "INSERT INTO hessra_public_keys (key_name, public_key, key_id) VALUES (%s, %s, 7)",
+                ("test_other_key", OTHER_KEY)
+            )
+            cur.execute(
+                "INSERT INTO hessra_public_keys (key_name, public_key, is_default) VALUES (%s, %s, TRUE)",
+                ("test_default_key", pem_key)
+            )
+
+            results = verify_all_default(cur, tokens)
+            for token in tokens:
+                assert results[token.name] == token.expected_result, \
+                    f"Token {token.name}: expected {token.expected_result}, got {results[token.name]}"
+            print("✓ Tokens without a matching root key id verify against the default key")
+
+            # With key ids but no default key, the key file is no longer used
+            cur.execute("UPDATE hessra_public_keys SET is_default = FALSE")
+            results = verify_all_default(cur, tokens)
+            assert not any(results.values()), \
+                f"Expected all tokens to fail without a default key in the keyring, got {results}"
+            print("✓ A keyring without a default key does not fall back to the key file")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("Running Hessra default key tests...")
+
+    try:
+        test_default_key_from_table()
+        test_keyring_from_table()
+        print("\nDefault key tests completed - check output for failures.")
+    except Exception as e:
+        print(f"\nError running tests: {e}")
+        sys.exit(1)
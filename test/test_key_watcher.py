@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for the key watcher background worker, which picks up rotated
+key files without backends checking the file on every call
+"""
+import sys
+import time
+
+import psycopg2
+
+from test_token_verification import load_test_tokens, get_db_connection
+
+SERVER_KEY_PATH = "/etc/postgresql/hessra_key.pem"
+# Written by the server itself, since the test runner cannot write its files
+WATCHED_KEY_PATH = "/tmp/hessra_watched_key.pem"
+
+# Longer than the default hessra.key_check_interval of one second
+WAIT_SECONDS = 3
+
+
+def write_server_file(cur, lines):
+    """Write lines to WATCHED_KEY_PATH on the database server"""
+    cur.execute(
+        f"COPY (SELECT unnest(%s::text[])) TO '{WATCHED_KEY_PATH}'",
+        (lines,)
+    )
+
+
+def verify(token):
+    """Verify a token in a new session, which uses the server-wide key path"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT verify_hessra_token(%s, %s, %s)",
+                (token.token, token.subject, token.resource)
+            )
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_key_watcher_running():
+    """The key watcher must run when hessra_authz is preloaded"""
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT current_setting('shared_preload_libraries')")
+            if "hessra_authz" not in cur.fetchone()[0]:
+                print("! hessra_authz is not in shared_preload_libraries, the key watcher is disabled")
+                return False
+
+            cur.execute("SELECT count(*) FROM pg_stat_activity WHERE backend_type = 'hessra key watcher'")
+            assert cur.fetchone()[0] == 1, "Expected one key watcher process"
+            print("✓ The key watcher is running")
+            return True
+    finally:
+        conn.close()
+
+
+def test_rotated_key_file():
+    """Replacing the watched key file must take effect within the check interval"""
+    token = next(t for t in load_test_tokens() if t.expected_result)
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_read_file(%s)", (SERVER_KEY_PATH,))
+            key_lines = cur.fetchone()[0].strip().split("\n")
+
+            write_server_file(cur, key_lines)
+            cur.execute("ALTER SYSTEM SET hessra.public_key_path = %s", (WATCHED_KEY_PATH,))
+            cur.execute("SELECT pg_reload_conf()")
+            time.sleep(WAIT_SECONDS)
+
+            assert verify(token), f"Token {token.name} should verify with the watched key file"
+            print("✓ The watched key file is used")
+
+            write_server_file(cur, ["not a key"])
+            time.sleep(WAIT_SECONDS)
+            try:
+                verify(token)
+                assert False, "Expected verification to fail once the key file holds no key"
+            except psycopg2.errors.ExternalRoutineInvocationException:
+                pass
+            print("✓ A broken key file is picked up")
+
+            write_server_file(cur, key_lines)
+            time.sleep(WAIT_SECONDS)
+            assert verify(token), f"Token {token.name} should verify again once the key is restored"
+            print("✓ A restored key file is picked up")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("ALTER SYSTEM RESET hessra.public_key_path")
+            cur.execute("SELECT pg_reload_conf()")
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("Running Hessra key watcher tests...")
+
+    try:
+        if test_key_watcher_running():
+            test_rotated_key_file()
+        print("\nKey watcher tests completed - check output for failures.")
+    except Exception as e:
+        print(f"\nError running tests: {e}")
+        sys.exit(1)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script for parallel query support of the Hessra verification functions
+
+Checks that the functions are declared PARALLEL SAFE, that a scan calling them
+gets a Gather plan, that parallel and serial plans agree, and reports how
+verification throughput scales with the number of workers.
+"""
+import json
+import sys
+import time
+
+from test_token_verification import load_test_tokens, get_db_connection
+
+# Each test token is repeated this many times
+COPIES = 2000
+
+# Parallel plans run first, so the workers start with cold caches
+WORKER_COUNTS = (4, 2, 0)
+
+PARALLEL_FUNCTIONS = (
+    "verify_hessra_token",
+    "verify_hessra_service_chain",
+    "verify_hessra_service_chain_by_name",
+    "verify_hessra_token_default",
+    "verify_hessra_token_many",
+    "verify_hessra_service_chain_many",
+    "verify_hessra_tokens",
+)
+
+COUNT_QUERY = """
+    SELECT count(*) FILTER (WHERE verify_hessra_token(token, subject, resource))
+    FROM hessra_parallel_tokens
+"""
+
+
+def set_parallel_workers(cur, workers):
+    """Make the planner choose a parallel plan with the given number of workers"""
+    cur.execute("SET max_parallel_workers_per_gather = %s", (workers,))
+    cur.execute("SET parallel_setup_cost = 0")
+    cur.execute("SET parallel_tuple_cost = 0")
+    cur.execute("SET min_parallel_table_scan_size = 0")
+
+
+def test_functions_are_parallel_safe():
+    """Every overload of the verification functions must be STABLE and PARALLEL SAFE"""
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT proname, oid::regprocedure::text, provolatile, proparallel
+                FROM pg_proc WHERE proname = ANY(%s)
+                """,
+                (list(PARALLEL_FUNCTIONS),)
+            )
+            rows = cur.fetchall()
+            missing = set(PARALLEL_FUNCTIONS) - {row[0] for row in rows}
+            assert not missing, f"Functions not found: {missing}"
+
+            for _, signature, volatility, parallel in rows:
+                print(f"{signature}: volatility={volatility}, parallel={parallel}")
+                assert volatility == "s", f"{signature} should be STABLE"
+                assert parallel == "s", f"{signature} should be PARALLEL SAFE"
+            print(f"✓ All {len(rows)} verification function overloads are STABLE PARALLEL SAFE")
+    finally:
+        conn.close()
+
+
+def test_parallel_scan_scales():
+    """A parallel scan must match the serial result; report throughput per worker count"""
+    tokens = load_test_tokens()
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            # Measure verification itself, not the shared result cache
+            cur.execute("ALTER SYSTEM SET hessra.result_cache_ttl = 0")
+            cur.execute("SELECT pg_reload_conf()")
+            time.sleep(1)
+
+            cur.execute("DROP TABLE IF EXISTS hessra_parallel_tokens")
+            cur.execute("CREATE TABLE hessra_parallel_tokens (token TEXT, subject TEXT, resource TEXT)")
+            # Interleave the tokens so consecutive rows never share a parsed token
+            cur.execute(
+                """
+                INSERT INTO hessra_parallel_tokens
+                SELECT t.token, t.subject, t.resource
+                FROM generate_series(1, %s) AS g,
+                     json_to_recordset(%s::json) AS t(token TEXT, subject TEXT, resource TEXT)
+                """,
+                (COPIES, json.dumps([
+                    {"token": t.token, "subject": t.subject, "resource": t.resource} for t in tokens
+                ]))
+            )
+            cur.execute("ANALYZE hessra_parallel_tokens")
+
+            expected = COPIES * sum(1 for t in tokens if t.expected_result)
+            rates = {}
+
+            for workers in WORKER_COUNTS:
+                set_parallel_workers(cur, workers)
+
+                cur.execute("EXPLAIN (FORMAT JSON) " + COUNT_QUERY)
+                plan = json.dumps(cur.fetchone()[0])
+                if workers > 0:
+                    assert "Gather" in plan, f"Expected a Gather plan with {workers} workers, got {plan}"
+
+                start = time.monotonic()
+                cur.execute(COUNT_QUERY)
+                allowed = cur.fetchone()[0]
+                elapsed = time.monotonic() - start
+
+                assert allowed == expected, \
+                    f"{workers} workers: {allowed} rows allowed, expected {expected}"
+
+                rates[workers] = COPIES * len(tokens) / elapsed
+
+            for workers in sorted(rates):
+                rate = rates[workers]
+                print(f"{workers} workers: {rate:,.0f} verifications/s ({rate / rates[0]:.2f}x)")
+
+            print("✓ Parallel plans return the same result as the serial plan")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS hessra_parallel_tokens")
+            cur.execute("ALTER SYSTEM RESET hessra.result_cache_ttl")
+            cur.execute("SELECT pg_reload_conf()")
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("Running Hessra parallel query tests...")
+
+    try:
+        test_functions_are_parallel_safe()
+        test_parallel_scan_scales()
+        print("\nParallel query tests completed - check output for failures.")
+    except Exception as e:
+        print(f"\nError running tests: {e}")
+        sys.exit(1)
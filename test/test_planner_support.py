@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for the cost and selectivity declarations of the Hessra
+verification functions
+"""
+import sys
+
+from test_token_verification import load_test_tokens, get_db_connection
+
+
+def explain(cur, query, params):
+    """Return the top plan node of EXPLAIN (VERBOSE, FORMAT JSON)"""
+    cur.execute("EXPLAIN (VERBOSE, FORMAT JSON) " + query, params)
+    return cur.fetchone()[0][0]["Plan"]
+
+
+def test_catalog_declarations():
+    """The verification functions must declare a realistic cost and the support function, and not LEAKPROOF"""
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT procost, prosupport::regproc::text, proleakproof
+                FROM pg_proc WHERE proname = 'verify_hessra_token'
+                """
+            )
+            cost, support, leakproof = cur.fetchone()
+            print(f"verify_hessra_token: cost={cost}, support={support}, leakproof={leakproof}")
+            assert cost >= 100, "verify_hessra_token should not be declared as cheap"
+            assert support == "hessra_verify_support", "verify_hessra_token should use hessra_verify_support"
+            assert not leakproof, "verify_hessra_token should not be LEAKPROOF"
+            print("✓ verify_hessra_token has cost and support function")
+
+            cur.execute(
+                """
+                SELECT proname FROM pg_proc
+                WHERE proleakproof AND (proname LIKE '%%hessra%%')
+                """
+            )
+            leakproof = [row[0] for row in cur.fetchall()]
+            assert not leakproof, f"No Hessra function should be LEAKPROOF, found {leakproof}"
+            print("✓ No Hessra function is LEAKPROOF")
+    finally:
+        conn.close()
+
+
+def test_cheap_quals_run_first():
+    """A cheap, selective predicate must be evaluated before the token check"""
+    token = load_test_tokens()[0]
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            plan = explain(
+                cur,
+                """
+                SELECT * FROM resources
+                WHERE verify_hessra_token(%s, %s, resource_id) AND owner_id = 'nobody'
+                """,
+                (token.token, token.subject)
+            )
+            qual = plan["Filter"]
+            print(f"Filter: {qual}")
+            assert qual.index("owner_id") < qual.index("verify_hessra_token"), \
+                "Expected the owner_id comparison to run before verify_hessra_token"
+            print("✓ Cheap predicates are evaluated before the token check")
+    finally:
+        conn.close()
+
+
+def test_selectivity_estimate():
+    """The estimate must not assume how many resources a token grants"""
+    token = load_test_tokens()[0]
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TEMP TABLE hessra_planner_rows AS
+                SELECT g AS id, 'resource' || (g %% 10) AS resource_id
+                FROM generate_series(1, 1000) AS g
+                """
+            )
+            cur.execute("ANALYZE hessra_planner_rows")
+
+            plan = explain(
+                cur,
+                "SELECT * FROM hessra_planner_rows WHERE verify_hessra_token(%s, %s, resource_id)",
+                (token.token, token.subject)
+            )
+            rows = plan["Plan Rows"]
+            print(f"Estimated rows: {rows} of 1000")
+            assert rows == 333, f"Expected the planner's default estimate of 1000 / 3 = 333 rows, got {rows}"
+            print("✓ Selectivity is the planner's default")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("Running Hessra planner support tests...")
+
+    try:
+        test_catalog_declarations()
+        test_cheap_quals_run_first()
+        test_selectivity_estimate()
+        print("\nPlanner support tests completed - check output for failures.")
+    except Exception as e:
+        print(f"\nError running tests: {e}")
+        sys.exit(1)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test script for the Hessra shared verification result cache in PostgreSQL
+"""
+import sys
+
+from test_token_verification import load_test_tokens, get_db_connection
+
+
+def get_cache_stats(cur):
+    """Return (entries, hits, misses, hit_rate) from hessra_result_cache_stats()"""
+    cur.execute("SELECT entries, hits, misses, hit_rate FROM hessra_result_cache_stats()")
+    return cur.fetchone()
+
+
+def test_cached_results_match_uncached():
+    """Repeated verifications must return the same verdict as the first, uncached call"""
+    tokens = load_test_tokens()
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT current_setting('shared_preload_libraries')")
+            preloaded = "hessra_authz" in cur.fetchone()[0]
+            if not preloaded:
+                print("! hessra_authz is not in shared_preload_libraries, the result cache is disabled")
+
+            cur.execute("SELECT hessra_result_cache_flush()")
+            _, hits_before, _, _ = get_cache_stats(cur)
+
+            for token in tokens:
+                results = []
+                for _ in range(3):
+                    cur.execute(
+                        "SELECT verify_hessra_token(%s, %s, %s)",
+                        (token.token, token.subject, token.resource)
+                    )
+                    results.append(cur.fetchone()[0])
+
+                print(f"{token.name}: {results} (expected: {token.expected_result})")
+                assert len(set(results)) == 1, \
+                    f"Token {token.name}: cached verdicts differ from the first call: {results}"
+                assert results[0] == token.expected_result, \
+                    f"Token {token.name}: expected {token.expected_result}, got {results[0]}"
+
+            entries, hits_after, misses, hit_rate = get_cache_stats(cur)
+            print(f"Cache stats: entries={entries}, hits={hits_after}, misses={misses}, hit_rate={hit_rate}")
+
+            if preloaded:
+                # Every token was verified three times, only the first call may miss
+                assert hits_after - hits_before >= 2 * len(tokens), \
+                    "Expected repeated verifications to be served from the result cache"
+                print("✓ Repeated verifications were served from the result cache")
+    finally:
+        conn.close()
+
+
+def test_flush_empties_cache():
+    """hessra_result_cache_flush() must remove all cached entries"""
+    tokens = load_test_tokens()
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            token = tokens[0]
+            cur.execute(
+                "SELECT verify_hessra_token(%s, %s, %s)",
+                (token.token, token.subject, token.resource)
+            )
+            cur.execute("SELECT hessra_result_cache_flush()")
+            removed = cur.fetchone()[0]
+            print(f"Flushed {removed} entries")
+
+            entries, _, _, _ = get_cache_stats(cur)
+            assert entries == 0, f"Expected an empty cache after flush, found {entries} entries"
+            print("✓ Result cache is empty after flush")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("Running Hessra result cache tests...")
+
+    try:
+        test_cached_results_match_uncached()
+        test_flush_empties_cache()
+        print("\nResult cache tests completed - check output for failures.")
+    except Exception as e:
+        print(f"\nError running tests: {e}")
+        sys.exit(1)
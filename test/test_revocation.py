@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Test script for token revocation (hessra_revoked_tokens / hessra_revoke_token)
+"""
+import json
+import sys
+import time
+
+import psycopg2
+
+from test_token_verification import (
+    load_test_tokens, get_db_connection,
+    DB_HOST, DB_PORT, DB_USER, DB_PASSWORD
+)
+
+OTHER_DB_NAME = "hessra_test_revocation"
+
+
+def verify(cur, token):
+    cur.execute(
+        "SELECT verify_hessra_token(%s, %s, %s)",
+        (token.token, token.subject, token.resource)
+    )
+    return cur.fetchone()[0]
+
+
+def test_revocation_ids():
+    """Every token must have one revocation id per block, as lowercase hex"""
+    tokens = load_test_tokens()
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            for token in tokens:
+                cur.execute("SELECT hessra_token_revocation_ids(%s)", (token.token,))
+                ids = cur.fetchone()[0]
+                assert ids, f"Token {token.name}: expected at least one revocation id"
+                for revocation_id in ids:
+                    int(revocation_id, 16)
+                    assert revocation_id == revocation_id.lower(), \
+                        f"Token {token.name}: revocation id {revocation_id} is not lowercase"
+            print("✓ Revocation ids are returned for every token")
+    finally:
+        conn.close()
+
+
+def test_revoked_token_rejected():
+    """A revoked token must fail verification until its revocation is removed"""
+    token = next(t for t in load_test_tokens() if t.expected_result)
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            assert verify(cur, token), f"Token {token.name} should be valid before it is revoked"
+
+            cur.execute("SELECT hessra_revoke_token(%s, 'test')", (token.token,))
+            revoked = cur.fetchone()[0]
+            assert revoked > 0, "Expected hessra_revoke_token to insert revocation ids"
+            assert not verify(cur, token), f"Token {token.name} should be rejected once revoked"
+            print("✓ A revoked token is rejected")
+
+            cur.execute("SELECT hessra_set_session_token(%s, %s)", (token.token, token.subject))
+            assert cur.fetchone()[0] is False, "A revoked token should not be accepted as session token"
+            print("✓ A revoked token cannot be set as session token")
+
+            cur.execute(
+                "DELETE FROM hessra_revoked_tokens WHERE revocation_id = ANY(hessra_token_revocation_ids(%s))",
+                (token.token,)
+            )
+            assert verify(cur, token), f"Token {token.name} should be valid again once the revocation is removed"
+            print("✓ Removing the revocation restores the token")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM hessra_revoked_tokens WHERE revocation_id = ANY(hessra_token_revocation_ids(%s))",
+                (token.token,)
+            )
+        conn.close()
+
+
+def test_rolled_back_revocation():
+    """A revocation that is rolled back must not affect verification"""
+    token = next(t for t in load_test_tokens() if t.expected_result)
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("BEGIN")
+            cur.execute("SELECT hessra_revoke_token(%s)", (token.token,))
+            assert not verify(cur, token), "The revoking transaction should see the token as revoked"
+            cur.execute("ROLLBACK")
+
+            assert verify(cur, token), f"Token {token.name} should be valid after the revocation rolled back"
+            print("✓ A rolled back revocation has no effect")
+    finally:
+        conn.close()
+
+
+def test_revocation_within_statement():
+    """A revocation must take effect for the next command even where the verdict is kept for the statement"""
+    token = next(t for t in load_test_tokens() if t.expected_result)
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            # The loop reuses one call site, and with it the parsed token and its revocation verdict
+            cur.execute(
+                """
+                CREATE FUNCTION pg_temp.verify_around_revocation(t TEXT, s TEXT, r TEXT)
+                RETURNS BOOLEAN[] AS $$
+                DECLARE
+                    results BOOLEAN[] := '{}';
+                BEGIN
+                    FOR i IN 1..2 LOOP
+                        results := results || verify_hessra_token(t, s, r);
+                        IF i = 1 THEN
+                            PERFORM hessra_revoke_token(t);
+                        END IF;
+                    END LOOP;
+                    RETURN results;
+                END;
+                $$ LANGUAGE plpgsql
+                """
+            )
+            cur.execute(
+                "SELECT pg_temp.verify_around_revocation(%s, %s, %s)",
+                (token.token, token.subject, token.resource)
+            )
+            results = cur.fetchone()[0]
+            assert results == [True, False], f"Expected [True, False] around the revocation, got {results}"
+            print("✓ A revocation takes effect for the next command of the same statement")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM hessra_revoked_tokens WHERE revocation_id = ANY(hessra_token_revocation_ids(%s))",
+                (token.token,)
+            )
+        conn.close()
+
+
+def test_bulk_revocation():
+    """verify_hessra_tokens must reject revoked tokens and keep accepting the others"""
+    tokens = load_test_tokens()
+    token = next(t for t in tokens if t.expected_result)
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    def verify_bulk(cur):
+        cur.execute(
+            "SELECT verify_hessra_tokens(%s::text[], %s::text[], %s::text[])",
+            ([t.token for t in tokens], [t.subject for t in tokens], [t.resource for t in tokens])
+        )
+        return cur.fetchone()[0]
+
+    try:
+        with conn.cursor() as cur:
+            before = verify_bulk(cur)
+
+            cur.execute("SELECT hessra_revoke_token(%s, 'test')", (token.token,))
+            cur.execute("SELECT hessra_token_revocation_ids(%s)", (token.token,))
+            revoked_ids = set(cur.fetchone()[0])
+            expected = []
+            for t, result in zip(tokens, before):
+                cur.execute("SELECT hessra_token_revocation_ids(%s)", (t.token,))
+                ids = cur.fetchone()[0] or []
+                expected.append(result and not revoked_ids.intersection(ids))
+
+            results = verify_bulk(cur)
+            assert results == expected, f"verify_hessra_tokens returned {results}, expected {expected}"
+            assert results[tokens.index(token)] is False, "A revoked token should be rejected in bulk"
+            print("✓ verify_hessra_tokens rejects revoked tokens")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM hessra_revoked_tokens WHERE revocation_id = ANY(hessra_token_revocation_ids(%s))",
+                (token.token,)
+            )
+        conn.close()
+
+
+def test_revocation_per_database():
+    """A token revoked in one database must stay rejected there after another database cached it as valid"""
+    token = next(t for t in load_test_tokens() if t.expected_result)
+    conn = get_db_connection()
+    conn.autocommit = True
+    other = None
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {OTHER_DB_NAME}")
+            cur.execute(f"CREATE DATABASE {OTHER_DB_NAME}")
+
+        other = psycopg2.connect(host=DB_HOST, port=DB_PORT, dbname=OTHER_DB_NAME,
+                                 user=DB_USER, password=DB_PASSWORD)
+        other.autocommit = True
+        with other.cursor() as other_cur, conn.cursor() as cur:
+            other_cur.execute("CREATE EXTENSION hessra_authz")
+            other_cur.execute("SELECT hessra_revoke_token(%s, 'test')", (token.token,))
+
+            # Cache a valid verdict in the database where the token is not revoked
+            assert verify(cur, token), f"Token {token.name} should be valid where it is not revoked"
+            assert verify(cur, token), f"Token {token.name} should be valid where it is not revoked"
+
+            assert not verify(other_cur, token), \
+                f"Token {token.name} should be rejected in the database that revoked it"
+            print("✓ Cached verdicts do not cross databases")
+    finally:
+        if other is not None:
+            other.close()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {OTHER_DB_NAME}")
+        conn.close()
+
+
+def test_parallel_reload():
+    """A Gather plan must work when it is the first check to find the revocation set stale"""
+    token = next(t for t in load_test_tokens() if t.expected_result)
+    conn = get_db_connection()
+    conn.autocommit = True
+    rows = 2000
+    query = """
+        SELECT count(*) FILTER (WHERE verify_hessra_token(token, subject, resource))
+        FROM hessra_revocation_parallel
+    """
+
+    try:
+        with conn.cursor() as cur:
+            # Every row must reach the revocation check, not the shared result cache
+            cur.execute("ALTER SYSTEM SET hessra.result_cache_ttl = 0")
+            cur.execute("SELECT pg_reload_conf()")
+            time.sleep(1)
+
+            cur.execute("DROP TABLE IF EXISTS hessra_revocation_parallel")
+            cur.execute("CREATE TABLE hessra_revocation_parallel (token TEXT, subject TEXT, resource TEXT)")
+            cur.execute(
+                """
+                INSERT INTO hessra_revocation_parallel
+                SELECT t.token, t.subject, t.resource
+                FROM generate_series(1, %s),
+                     json_to_record(%s::json) AS t(token TEXT, subject TEXT, resource TEXT)
+                """,
+                (rows, json.dumps({"token": token.token, "subject": token.subject, "resource": token.resource}))
+            )
+            cur.execute("ANALYZE hessra_revocation_parallel")
+
+            cur.execute("SET max_parallel_workers_per_gather = 2")
+            cur.execute("SET parallel_setup_cost = 0")
+            cur.execute("SET parallel_tuple_cost = 0")
+            cur.execute("SET min_parallel_table_scan_size = 0")
+            cur.execute("EXPLAIN (FORMAT JSON) " + query)
+            plan = json.dumps(cur.fetchone()[0])
+            assert "Gather" in plan, f"Expected a Gather plan, got {plan}"
+
+            # Revoke, then make the set stale before any serial check can reload it
+            cur.execute("SELECT hessra_revoke_token(%s, 'test')", (token.token,))
+            cur.execute(
+                "UPDATE hessra_revoked_tokens SET reason = 'parallel' "
+                "WHERE revocation_id = ANY(hessra_token_revocation_ids(%s))",
+                (token.token,)
+            )
+            cur.execute(query)
+            allowed = cur.fetchone()[0]
+            assert allowed == 0, f"A revoked token was allowed for {allowed} rows under a Gather plan"
+            print("✓ A Gather plan rejects a revoked token while the revocation set is stale")
+
+            cur.execute(
+                "DELETE FROM hessra_revoked_tokens WHERE revocation_id = ANY(hessra_token_revocation_ids(%s))",
+                (token.token,)
+            )
+            cur.execute(query)
+            allowed = cur.fetchone()[0]
+            assert allowed == rows, f"Expected {rows} rows allowed once the revocation is removed, got {allowed}"
+            print("✓ A Gather plan sees a removed revocation while the revocation set is stale")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM hessra_revoked_tokens WHERE revocation_id = ANY(hessra_token_revocation_ids(%s))",
+                (token.token,)
+            )
+            cur.execute("DROP TABLE IF EXISTS hessra_revocation_parallel")
+            cur.execute("ALTER SYSTEM RESET hessra.result_cache_ttl")
+            cur.execute("SELECT pg_reload_conf()")
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("Running Hessra token revocation tests...")
+
+    try:
+        test_revocation_ids()
+        test_revoked_token_rejected()
+        test_rolled_back_revocation()
+        test_revocation_within_statement()
+        test_bulk_revocation()
+        test_revocation_per_database()
+        test_parallel_reload()
+        print("\nRevocation tests completed - check output for failures.")
+    except Exception as e:
+        print(f"\nError running tests: {e}")
+        sys.exit(1)
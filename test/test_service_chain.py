@@ -218,6 +218,140 @@ def test_service_chain_verification():
     finally:
         conn.close()
 
+def test_service_chain_update_invalidates_cache():
+    """Changing a stored service chain must take effect on the next by-name verification"""
+    tokens = [t for t in load_service_chain_tokens() if len(t.service_nodes) >= 3]
+    if not tokens:
+        print("No complete service chain token found, skipping cache invalidation test")
+        return
+
+    token = tokens[0]
+    conn = get_db_connection()
+    conn.autocommit = False
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT verify_hessra_service_chain_by_name(%s, %s, %s, %s)",
+                (token.token, token.subject, token.resource, "order_service")
+            )
+            before = cur.fetchone()[0]
+            print(f"Verification with the stored chain: {before}")
+
+            # Swap the keys of the first two nodes, so their attestations no longer match
+            nodes = [dict(node) for node in token.service_nodes]
+            nodes[0]["public_key"], nodes[1]["public_key"] = nodes[1]["public_key"], nodes[0]["public_key"]
+            cur.execute(
+                "SELECT upsert_service_chain(%s, %s::jsonb)",
+                (token.resource, json.dumps({"service_nodes": nodes}))
+            )
+
+            cur.execute(
+                "SELECT verify_hessra_service_chain_by_name(%s, %s, %s, %s)",
+                (token.token, token.subject, token.resource, "order_service")
+            )
+            after = cur.fetchone()[0]
+            print(f"Verification after changing the stored chain: {after}")
+            assert after == False, "Expected verification to fail after the stored chain changed"
+            print("✓ Service chain changes invalidate the cached configuration")
+    finally:
+        conn.rollback()
+        conn.close()
+
+def test_service_chain_batch_verification():
+    """verify_hessra_service_chain_many must agree with one verify_hessra_service_chain call per resource"""
+    tokens = [t for t in load_service_chain_tokens() if t.service_nodes]
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            for token in tokens:
+                service_nodes_json = json.dumps({"service_nodes": token.service_nodes})
+                resources = [token.resource, "resource1", None]
+
+                cur.execute(
+                    "SELECT verify_hessra_service_chain_many(%s, %s, %s::text[], %s, %s)",
+                    (token.token, token.subject, resources, service_nodes_json, "order_service")
+                )
+                batch = cur.fetchone()[0]
+
+                expected = []
+                for resource in resources:
+                    if resource is None:
+                        expected.append(None)
+                        continue
+                    cur.execute(
+                        "SELECT verify_hessra_service_chain(%s, %s, %s, %s, %s)",
+                        (token.token, token.subject, resource, service_nodes_json, "order_service")
+                    )
+                    expected.append(cur.fetchone()[0])
+
+                print(f"{token.name}: {batch}")
+                assert batch == expected, \
+                    f"Token {token.name}: batch result {batch} differs from single calls {expected}"
+            print("✓ Batch service chain verification matches single verification")
+    finally:
+        conn.close()
+
+def test_detailed_verification():
+    """hessra_verify_detailed must agree with verify_hessra_token and verify_hessra_service_chain"""
+    tokens = [t for t in load_service_chain_tokens() if t.service_nodes]
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            for token in tokens:
+                service_nodes_json = json.dumps({"service_nodes": token.service_nodes})
+                components = [node["component"] for node in token.service_nodes] + ["nonexistent_service"]
+
+                cur.execute(
+                    "SELECT verify_hessra_token(%s, %s, %s)",
+                    (token.token, token.subject, token.resource)
+                )
+                expected_authorized = cur.fetchone()[0]
+
+                cur.execute(
+                    "SELECT signature_valid, authorized, chain_valid, error_code FROM hessra_verify_detailed(%s, %s, %s)",
+                    (token.token, token.subject, token.resource)
+                )
+                signature_valid, authorized, chain_valid, error_code = cur.fetchone()
+                assert signature_valid, f"Token {token.name}: signatures should be valid"
+                assert authorized == expected_authorized, \
+                    f"Token {token.name}: authorized={authorized}, verify_hessra_token returned {expected_authorized}"
+                assert chain_valid is None, "chain_valid should be NULL without a service chain"
+                assert (error_code == 0) == expected_authorized, \
+                    f"Token {token.name}: unexpected error code {error_code}"
+
+                for component in components:
+                    cur.execute(
+                        "SELECT verify_hessra_service_chain(%s, %s, %s, %s, %s)",
+                        (token.token, token.subject, token.resource, service_nodes_json, component)
+                    )
+                    expected_chain = cur.fetchone()[0]
+
+                    cur.execute(
+                        """
+                        SELECT authorized, chain_valid, failing_component, error_code
+                        FROM hessra_verify_detailed(%s, %s, %s, %s, %s)
+                        """,
+                        (token.token, token.subject, token.resource, service_nodes_json, component)
+                    )
+                    authorized, chain_valid, failing_component, error_code = cur.fetchone()
+                    print(f"{token.name} at {component}: authorized={authorized}, chain_valid={chain_valid}, "
+                          f"failing_component={failing_component}, error_code={error_code}")
+
+                    assert authorized == expected_authorized, \
+                        f"Token {token.name}, component {component}: authorized={authorized}, expected {expected_authorized}"
+                    assert (authorized and chain_valid) == expected_chain, \
+                        f"Token {token.name}, component {component}: verify_hessra_service_chain returned {expected_chain}"
+                    assert (failing_component is None) == chain_valid, \
+                        f"Token {token.name}, component {component}: failing_component={failing_component}"
+                    assert (error_code == 0) == expected_chain, \
+                        f"Token {token.name}, component {component}: unexpected error code {error_code}"
+            print("✓ hessra_verify_detailed matches the separate verification functions")
+    finally:
+        conn.close()
+
 def test_database_configuration():
     """Test that the database configuration is correctly set up"""
     conn = get_db_connection()
@@ -256,6 +390,9 @@ if __name__ == "__main__":
     try:
         test_database_configuration()
         test_service_chain_verification()
+        test_service_chain_update_invalidates_cache()
+        test_service_chain_batch_verification()
+        test_detailed_verification()
         print("\nService chain tests completed - check output for failures.")
     except Exception as e:
         print(f"\nError running tests: {e}") 
\ No newline at end of file
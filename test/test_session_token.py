@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test script for session tokens (hessra_set_session_token / hessra_authorized)
+"""
+import sys
+
+from test_token_verification import load_test_tokens, get_db_connection
+
+
+def authorized(cur, resource):
+    cur.execute("SELECT hessra_authorized(%s)", (resource,))
+    return cur.fetchone()[0]
+
+
+def test_session_token_matches_verify():
+    """hessra_authorized must agree with verify_hessra_token for the session token"""
+    tokens = load_test_tokens()
+    resources = sorted({token.resource for token in tokens})
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            for token in tokens:
+                cur.execute("SELECT hessra_set_session_token(%s, %s)", (token.token, token.subject))
+                assert cur.fetchone()[0], f"Token {token.name} should have valid signatures"
+
+                for resource in resources:
+                    cur.execute(
+                        "SELECT verify_hessra_token(%s, %s, %s)",
+                        (token.token, token.subject, resource)
+                    )
+                    expected = cur.fetchone()[0]
+                    actual = authorized(cur, resource)
+                    assert actual == expected, \
+                        f"Token {token.name}, resource {resource}: hessra_authorized returned {actual}, expected {expected}"
+            print("✓ hessra_authorized matches verify_hessra_token")
+    finally:
+        conn.close()
+
+
+def test_session_token_is_cleared():
+    """The session token must not survive RESET ALL, DISCARD ALL, rollback or an invalid token"""
+    token = next(t for t in load_test_tokens() if t.expected_result)
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    def set_token(cur):
+        cur.execute("SELECT hessra_set_session_token(%s, %s)", (token.token, token.subject))
+        assert authorized(cur, token.resource), "Expected the session token to be set"
+
+    try:
+        with conn.cursor() as cur:
+            assert not authorized(cur, token.resource), "No session token should be set initially"
+
+            set_token(cur)
+            cur.execute("DISCARD ALL")
+            assert not authorized(cur, token.resource), "DISCARD ALL should clear the session token"
+            print("✓ DISCARD ALL clears the session token")
+
+            set_token(cur)
+            cur.execute("RESET ALL")
+            assert not authorized(cur, token.resource), "RESET ALL should clear the session token"
+            print("✓ RESET ALL clears the session token")
+
+            set_token(cur)
+            cur.execute("SELECT hessra_clear_session_token()")
+            assert not authorized(cur, token.resource), "hessra_clear_session_token should clear the session token"
+            print("✓ hessra_clear_session_token clears the session token")
+
+            cur.execute("BEGIN")
+            cur.execute("SELECT hessra_set_session_token(%s, %s)", (token.token, token.subject))
+            cur.execute("ROLLBACK")
+            assert not authorized(cur, token.resource), "A rolled back token should not be kept"
+            print("✓ Rolling back clears the session token")
+
+            cur.execute("BEGIN")
+            cur.execute("SELECT hessra_set_session_token(%s, %s, true)", (token.token, token.subject))
+            assert authorized(cur, token.resource), "Expected the local session token to be set"
+            cur.execute("COMMIT")
+            assert not authorized(cur, token.resource), "A local session token should end with the transaction"
+            print("✓ Local session tokens are cleared at the end of the transaction")
+
+            set_token(cur)
+            cur.execute("SELECT hessra_set_session_token('invalid', %s)", (token.subject,))
+            assert cur.fetchone()[0] is False, "An invalid token should be rejected"
+            assert not authorized(cur, token.resource), "An invalid token should clear the previous one"
+            print("✓ An invalid token clears the session token")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("Running Hessra session token tests...")
+
+    try:
+        test_session_token_matches_verify()
+        test_session_token_is_cleared()
+        print("\nSession token tests completed - check output for failures.")
+    except Exception as e:
+        print(f"\nError running tests: {e}")
+        sys.exit(1)
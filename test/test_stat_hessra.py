@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test script for the pg_stat_hessra verification statistics
+"""
+import sys
+
+from test_token_verification import load_test_tokens, get_db_connection
+
+
+def get_function_stats(cur, function):
+    """Return the pg_stat_hessra row of a function as a dict"""
+    cur.execute("SELECT * FROM pg_stat_hessra WHERE function = %s", (function,))
+    columns = [column.name for column in cur.description]
+    row = cur.fetchone()
+    return dict(zip(columns, row)) if row is not None else None
+
+
+def test_counts_per_result():
+    """Calls, result codes and histogram counts must match the verifications performed"""
+    tokens = load_test_tokens()
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT current_setting('shared_preload_libraries')")
+            if "hessra_authz" not in cur.fetchone()[0]:
+                print("! hessra_authz is not in shared_preload_libraries, statistics are disabled")
+                return
+
+            cur.execute("SELECT hessra_stat_reset()")
+
+            for token in tokens:
+                cur.execute(
+                    "SELECT verify_hessra_token(%s, %s, %s)",
+                    (token.token, token.subject, token.resource)
+                )
+                cur.fetchone()
+
+            stats = get_function_stats(cur, "verify_hessra_token")
+            print(f"verify_hessra_token: {stats}")
+
+            valid = sum(1 for t in tokens if t.expected_result)
+            results = sum(stats[name] for name in (
+                "success", "invalid_token", "invalid_key", "verification_failed", "config_invalid",
+                "memory_error", "io_error", "invalid_parameter", "unknown_error"
+            ))
+
+            assert stats["calls"] == len(tokens), f"Expected {len(tokens)} calls, got {stats['calls']}"
+            assert stats["success"] == valid, f"Expected {valid} successful calls, got {stats['success']}"
+            assert results == len(tokens), "Every call should be counted under exactly one result"
+            assert sum(stats["latency_histogram"]) == len(tokens), \
+                "Every call should be counted in the latency histogram"
+            assert stats["cache_hits"] + stats["cache_misses"] == len(tokens), \
+                "Every call should consult the result cache once"
+            assert stats["total_time"] >= stats["key_load_time"], "Key loading is part of the total time"
+            print("✓ pg_stat_hessra counts calls per result code")
+
+            cur.execute("SELECT hessra_stat_reset()")
+            stats = get_function_stats(cur, "verify_hessra_token")
+            assert stats["calls"] == 0, "hessra_stat_reset should clear the statistics"
+            print("✓ hessra_stat_reset clears the statistics")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("Running Hessra statistics tests...")
+
+    try:
+        test_counts_per_result()
+        print("\nStatistics tests completed - check output for failures.")
+    except Exception as e:
+        print(f"\nError running tests: {e}")
+        sys.exit(1)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for the hessra_token data type
+"""
+import base64
+import sys
+
+import psycopg2
+
+from test_token_verification import load_test_tokens, get_db_connection
+
+
+def test_round_trip():
+    """A token must survive text -> hessra_token -> text and be stored smaller than its base64 text"""
+    tokens = load_test_tokens()
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            for token in tokens:
+                cur.execute(
+                    """
+                    SELECT t::text, t::bytea, octet_length(t::bytea), octet_length(%s::text)
+                    FROM (SELECT %s::hessra_token AS t) AS s
+                    """,
+                    (token.token, token.token)
+                )
+                text_value, raw, binary_len, text_len = cur.fetchone()
+                assert base64.b64decode(text_value) == bytes(raw), \
+                    f"Token {token.name}: output does not decode to the stored bytes"
+                assert binary_len < text_len, \
+                    f"Token {token.name}: {binary_len} bytes stored for {text_len} bytes of base64"
+            print("✓ Tokens round-trip through hessra_token and are stored as raw bytes")
+    finally:
+        conn.close()
+
+
+def test_overloads_match_text():
+    """Verification with a hessra_token must agree with verification of the same text token"""
+    tokens = load_test_tokens()
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            for token in tokens:
+                cur.execute(
+                    """
+                    SELECT verify_hessra_token(%s::text, %s, %s),
+                           verify_hessra_token(%s::hessra_token, %s, %s)
+                    """,
+                    (token.token, token.subject, token.resource) * 2
+                )
+                from_text, from_binary = cur.fetchone()
+                print(f"{token.name}: text={from_text}, hessra_token={from_binary} (expected: {token.expected_result})")
+                assert from_text == from_binary == token.expected_result, \
+                    f"Token {token.name}: expected {token.expected_result}, got {from_text} and {from_binary}"
+            print("✓ verify_hessra_token gives the same result for text and hessra_token")
+    finally:
+        conn.close()
+
+
+def test_detailed_overload_matches_text():
+    """hessra_verify_detailed with a hessra_token must agree with the same text token"""
+    tokens = load_test_tokens()
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            for token in tokens:
+                cur.execute(
+                    """
+                    SELECT (SELECT row(d.*)::text FROM hessra_verify_detailed(%s::text, %s, %s) AS d),
+                           (SELECT row(d.*)::text FROM hessra_verify_detailed(%s::hessra_token, %s, %s) AS d)
+                    """,
+                    (token.token, token.subject, token.resource) * 2
+                )
+                from_text, from_binary = cur.fetchone()
+                assert from_text == from_binary, \
+                    f"Token {token.name}: text gave {from_text}, hessra_token gave {from_binary}"
+            print("✓ hessra_verify_detailed gives the same result for text and hessra_token")
+    finally:
+        conn.close()
+
+
+def test_invalid_input_rejected():
+    """Input that is not a well-formed token must be rejected"""
+    conn = get_db_connection()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            for value in ("not a token", base64.b64encode(b"not a token").decode()):
+                try:
+                    cur.execute("SELECT %s::hessra_token", (value,))
+                    assert False, f"Expected {value!r} to be rejected"
+                except psycopg2.errors.InvalidTextRepresentation:
+                    pass
+            print("✓ Malformed tokens are rejected on input")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("Running Hessra token type tests...")
+
+    try:
+        test_round_trip()
+        test_overloads_match_text()
+        test_detailed_overload_matches_text()
+        test_invalid_input_rejected()
+        print("\nToken type tests completed - check output for failures.")
+    except Exception as e:
+        print(f"\nError running tests: {e}")
+        sys.exit(1)
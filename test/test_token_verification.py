@@ -269,6 +269,72 @@ def test_service_access():
     finally:
         conn.close()
 
+def test_batch_verification():
+    """verify_hessra_token_many must agree with one verify_hessra_token call per resource"""
+    tokens = load_test_tokens()
+    resources = sorted({token.resource for token in tokens}) + [None]
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            for token in tokens:
+                cur.execute(
+                    "SELECT verify_hessra_token_many(%s, %s, %s::text[])",
+                    (token.token, token.subject, resources)
+                )
+                batch = cur.fetchone()[0]
+
+                expected = []
+                for resource in resources:
+                    if resource is None:
+                        expected.append(None)
+                        continue
+                    cur.execute(
+                        "SELECT verify_hessra_token(%s, %s, %s)",
+                        (token.token, token.subject, resource)
+                    )
+                    expected.append(cur.fetchone()[0])
+
+                print(f"{token.name}: {dict(zip(resources, batch))}")
+                assert batch == expected, \
+                    f"Token {token.name}: batch result {batch} differs from single calls {expected}"
+            print("✓ Batch verification matches single verification")
+    finally:
+        conn.close()
+
+def test_bulk_verification():
+    """verify_hessra_tokens must return the expected result for every token, whatever the worker count"""
+    tokens = load_test_tokens()
+    # Repeat the tokens so that every worker gets a share of the batch
+    batch = tokens * 50
+    conn = get_db_connection()
+
+    try:
+        with conn.cursor() as cur:
+            for workers in (1, 4):
+                cur.execute("SET hessra.bulk_workers = %s", (workers,))
+                cur.execute(
+                    "SELECT verify_hessra_tokens(%s::text[], %s::text[], %s::text[])",
+                    ([t.token for t in batch] + [None],
+                     [t.subject for t in batch] + ["uri:urn:test:argo-cli1"],
+                     [t.resource for t in batch] + ["resource1"])
+                )
+                results = cur.fetchone()[0]
+
+                expected = [t.expected_result for t in batch] + [None]
+                assert results == expected, \
+                    f"Bulk verification with {workers} workers returned {results}, expected {expected}"
+                print(f"✓ Bulk verification of {len(batch)} tokens with {workers} workers matches expected results")
+
+            try:
+                cur.execute("SELECT verify_hessra_tokens(ARRAY['a', 'b'], ARRAY['a'], ARRAY['a', 'b'])")
+                assert False, "Expected an error for arrays of different lengths"
+            except psycopg2.Error:
+                conn.rollback()
+                print("✓ Arrays of different lengths are rejected")
+    finally:
+        conn.close()
+
 if __name__ == "__main__":
     print("Running Hessra token verification tests...")
     
@@ -279,6 +345,10 @@ if __name__ == "__main__":
         test_resource_access()
         print("\n--- Service Access Tests ---")
         test_service_access()
+        print("\n--- Batch Verification Tests ---")
+        test_batch_verification()
+        print("\n--- Bulk Verification Tests ---")
+        test_bulk_verification()
         print("\nTests completed - check output for failures.")
     except Exception as e:
         print(f"\nError running tests: {e}") 
\ No newline at end of file